@@ -0,0 +1,71 @@
+""" Import-time regression benchmark. It measures, in fresh interpreters, how long it takes to import each progress bar
+  module and to create a progress bar in mode 'auto', compared with plain tqdm. It fails if any of them imports a
+  database driver or if its overhead over plain tqdm is higher than the allowed one.
+
+  python benchmark/imports.py [--runs 15] [--max_overhead 20]
+"""
+from argparse import ArgumentParser
+from os.path import dirname, abspath
+from statistics import median
+from subprocess import run
+from sys import executable, exit
+from json import loads
+
+ROOT = dirname(dirname(abspath(__file__)))
+BASELINE = 'from tqdm.auto import tqdm; tqdm(range(0), disable=True).close()'
+CASES = {
+    'dbtqdm': 'from dbtqdm import tqdm; tqdm(range(0), disable=True).close()',
+    'dbtqdm.mongo': 'from dbtqdm.mongo import tqdm; tqdm(range(0), disable=True).close()',
+    'dbtqdm.sqlite': 'from dbtqdm.sqlite import tqdm; tqdm(range(0), disable=True).close()',
+    'dbtqdm.shm': 'from dbtqdm.shm import tqdm; tqdm(range(0), disable=True).close()',
+    'dbtqdm.http': 'from dbtqdm.http import tqdm; tqdm(range(0), disable=True).close()',
+    'dbtqdm.agent': 'from dbtqdm.agent import tqdm; tqdm(range(0), disable=True).close()'
+}
+DRIVERS = ['pymongo', 'bson', 'motor', 'flask', 'aiohttp']
+MEASURE = '''
+import sys, time, json
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ms': elapsed * 1000, 'drivers': [m for m in {drivers} if m in sys.modules]}}))
+'''
+
+
+def measure(code: str, runs: int) -> dict:
+    """ Measure the time to execute some code in fresh interpreters, with the environment variable TQDM_MODE='auto'.
+    :param code: The code to measure.
+    :param runs: The number of interpreters.
+    :return: A dict with the median milliseconds and the database drivers which have been imported.
+    """
+    times, drivers = [], set()
+    for _ in range(runs):
+        result = run([executable, '-c', MEASURE.format(code=code, drivers=DRIVERS)], cwd=ROOT, check=True,
+                     capture_output=True, text=True, env={'TQDM_MODE': 'auto', 'PYTHONPATH': ROOT})
+        data = loads(result.stdout.strip().splitlines()[-1])
+        times.append(data['ms'])
+        drivers.update(data['drivers'])
+    return {'ms': median(times), 'drivers': sorted(drivers)}
+
+
+def main() -> None:
+    """ The main function. """
+    parser = ArgumentParser(description='Measure the import time of the progress bar modules in mode auto.')
+    parser.add_argument('-r', '--runs', type=int, metavar='N', default=15,
+                        help='The number of fresh interpreters for each module. By default, 15.')
+    parser.add_argument('-m', '--max_overhead', type=float, metavar='MS', default=20,
+                        help='The maximum milliseconds over plain tqdm. By default, 20.')
+    args = parser.parse_args()
+
+    baseline, failed = measure(BASELINE, args.runs)['ms'], False
+    print(f'{"module":<16}{"ms":>10}{"overhead":>10}  drivers')
+    print(f'{"tqdm":<16}{baseline:>10.1f}{0:>10.1f}')
+    for name, code in CASES.items():
+        result = measure(code, args.runs)
+        overhead = result['ms'] - baseline
+        failed |= bool(result['drivers']) or overhead > args.max_overhead
+        print(f'{name:<16}{result["ms"]:>10.1f}{overhead:>10.1f}  {", ".join(result["drivers"]) or "-"}')
+    exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
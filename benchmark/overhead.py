@@ -0,0 +1,313 @@
+""" Client-side overhead benchmark. It measures what each progress bar backend costs per iteration compared with plain
+  tqdm, for several loop speeds and numbers of bars. It runs offline: MongoDB is replaced by an in-process stand-in
+  which only encodes the documents, and the other backends use temporary local files and sockets.
+
+  For each case it reports the nanoseconds per iteration and its overhead over plain tqdm, the writes per second, the
+  bytes per write and the p99 latency of display(), which is where the progress bars write their state. The results can
+  be saved as JSON and compared with the results of other version:
+
+  python benchmark/overhead.py --output new.json --compare old.json
+"""
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from datetime import datetime
+from json import dump, load
+from os import devnull, environ
+from os.path import join, dirname, abspath
+from platform import python_version, platform
+from socket import socket, AF_UNIX, SOCK_DGRAM, timeout as SocketTimeout
+from sys import path as sys_path, exit
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import perf_counter_ns
+from typing import Callable, Dict, Iterator, List, Any, Tuple
+
+sys_path.insert(0, dirname(dirname(abspath(__file__))))
+
+import tqdm as tqdm_module
+from tqdm.auto import tqdm as plain_tqdm
+
+BACKENDS = ['tqdm', 'auto', 'mongo', 'mongo-async', 'sqlite', 'sqlite-async', 'shm', 'agent']
+
+
+class Recorder(object):
+    """ Counter of the writes and their bytes. """
+
+    def __init__(self) -> None:
+        """ Constructor. """
+        self.writes, self.bytes = 0, 0
+
+    def record(self, size: int, writes: int = 1) -> None:
+        """ Record some writes.
+        :param size: The bytes of the writes.
+        :param writes: The number of writes.
+        """
+        self.writes += writes
+        self.bytes += size
+
+
+class MemoryCollection(object):
+    """ In-process stand-in of a MongoDB collection. It does not store anything, it only encodes the documents as BSON
+      to record their size, as the driver does before sending them.
+    """
+
+    def __init__(self, recorder: Recorder) -> None:
+        """ Constructor.
+        :param recorder: Where the writes are recorded.
+        """
+        from bson import encode
+        self._recorder, self._encode = recorder, encode
+
+    def replace_one(self, _filter: dict, document: dict, upsert: bool = False) -> bool:
+        self._recorder.record(len(self._encode(document)))
+        return True
+
+    def bulk_write(self, operations: List[Any], ordered: bool = True) -> bool:
+        self._recorder.record(sum(len(self._encode(operation._doc)) for operation in operations), len(operations))
+        return True
+
+    def delete_one(self, _filter: dict) -> Any:
+        self._recorder.record(len(self._encode(_filter)))
+
+    def find_one_and_update(self, _filter: dict, update: dict, **kwargs) -> dict:
+        self._recorder.record(len(self._encode(update)))
+        return {}
+
+
+class MemoryDatabase(dict):
+    """ In-process stand-in of a MongoDB database, whose collections are created on demand. """
+
+    def __init__(self, recorder: Recorder) -> None:
+        """ Constructor.
+        :param recorder: Where the writes are recorded.
+        """
+        super().__init__()
+        self._recorder = recorder
+
+    def __missing__(self, name: str) -> MemoryCollection:
+        self[name] = MemoryCollection(self._recorder)
+        return self[name]
+
+
+@contextmanager
+def patched(target: Any, name: str, value: Any) -> Iterator[None]:
+    """ Replace an attribute while the context is active.
+    :param target: The object or module.
+    :param name: The attribute name.
+    :param value: The new value.
+    """
+    old = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield
+    finally:
+        setattr(target, name, old)
+
+
+@contextmanager
+def backend(name: str, directory: str, recorder: Recorder) -> Iterator[Callable[..., Any]]:
+    """ Prepare a backend to record its writes.
+    :param name: The backend name.
+    :param directory: A temporary directory for the database files and sockets.
+    :param recorder: Where the writes are recorded.
+    :return: A function to create a progress bar of that backend, which receives the bar number and the file.
+    """
+    if name == 'tqdm':
+        yield lambda i, file: plain_tqdm(total=None, file=file)
+    elif name == 'auto':
+        from dbtqdm.mongo import tqdm
+        yield lambda i, file: tqdm(total=None, file=file, mode='auto')
+    elif name.startswith('mongo'):
+        import dbtqdm.mongo.utils as utils
+        from dbtqdm.mongo import tqdm
+        database = MemoryDatabase(recorder)
+        with patched(utils, 'connect_db', lambda *args, **kwargs: {'tqdm': database}), \
+                patched(utils, 'release_db', lambda *args, **kwargs: None), \
+                patched(utils, 'ensure_indexes', lambda *args, **kwargs: None):
+            yield lambda i, file: tqdm(total=None, file=file, mode='mongo', name=f'bar{i}',
+                                       asynchronous=name.endswith('async'))
+    elif name.startswith('sqlite'):
+        from dbtqdm.sqlite import tqdm, connect_db, release_db
+        db = connect_db(join(directory, 'tqdm.db'))
+        bulk_write = db.bulk_write
+
+        def recorded_bulk_write(statements: List[Tuple[str, tuple]], ordered: bool = False) -> int:
+            statements = list(statements)
+            recorder.record(sum(len(sql) + sum(len(str(param)) for param in params) for sql, params in statements),
+                            len(statements))
+            return bulk_write(statements, ordered)
+
+        db.bulk_write = recorded_bulk_write
+        yield lambda i, file: tqdm(total=None, file=file, mode='sqlite', name=f'bar{i}', path=db.path,
+                                   asynchronous=name.endswith('async'))
+        release_db(db, close=True)
+    elif name == 'shm':
+        from dbtqdm.shm import tqdm, open_table
+        from dbtqdm.shm.table import NUMBERS, TEXT
+        table = open_table(join(directory, 'tqdm.slots'), 1024)
+        write = table.write
+
+        def recorded_write(slot: int, sequence: int, numbers: tuple, text: tuple = None) -> int:
+            recorder.record(NUMBERS.size + (TEXT.size if text is not None else 0))
+            return write(slot, sequence, numbers, text)
+
+        table.write = recorded_write
+        yield lambda i, file: tqdm(total=None, file=file, mode='shm', name=f'bar{i}', path=table.path)
+    elif name == 'agent':
+        from dbtqdm.agent import tqdm
+        path, receiver, running = join(directory, 'agent.sock'), socket(AF_UNIX, SOCK_DGRAM), [True]
+        receiver.bind(path)
+        receiver.settimeout(0.1)
+
+        def receive() -> None:
+            while running[0]:
+                try:
+                    recorder.record(len(receiver.recv(65536)))
+                except SocketTimeout:
+                    pass
+
+        thread = Thread(target=receive, daemon=True)
+        thread.start()
+        yield lambda i, file: tqdm(total=None, file=file, mode='agent', name=f'bar{i}', path=path)
+        running[0] = False
+        thread.join()
+        receiver.close()
+    else:
+        raise ValueError(f'Unknown backend "{name}". Available backends: {BACKENDS}.')
+
+
+def busy_wait(ns: int) -> None:
+    """ Simulate the work of an iteration.
+    :param ns: The nanoseconds to wait.
+    """
+    end = perf_counter_ns() + ns
+    while perf_counter_ns() < end:
+        pass
+
+
+def percentile(values: List[int], p: float) -> float:
+    """ Calculate a percentile.
+    :param values: The values.
+    :param p: The percentile, between 0 and 100.
+    :return: The value of that percentile, or 0 if there are no values.
+    """
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def run_case(name: str, iterations: int, work: int, bars: int) -> Dict[str, Any]:
+    """ Run a benchmark case.
+    :param name: The backend name.
+    :param iterations: The number of iterations, which are shared round-robin among the bars.
+    :param work: The nanoseconds of work of each iteration.
+    :param bars: The number of bars.
+    :return: The case results.
+    """
+    recorder, latencies = Recorder(), []
+    with TemporaryDirectory() as directory, open(devnull, 'w') as file, \
+            backend(name, directory, recorder) as create:
+        start = perf_counter_ns()
+        progress_bars = [create(i, file) for i in range(bars)]
+        for bar in progress_bars:
+            display = bar.display
+
+            def timed_display(*args, display: Callable[..., Any] = display, **kwargs) -> Any:
+                before = perf_counter_ns()
+                result = display(*args, **kwargs)
+                latencies.append(perf_counter_ns() - before)
+                return result
+
+            bar.display = timed_display
+        for i in range(iterations):
+            if work:
+                busy_wait(work)
+            progress_bars[i % bars].update(1)
+        for bar in progress_bars:
+            bar.close()
+        if name.endswith('async'):
+            from dbtqdm.writer import get_writer
+            get_writer().flush(timeout=10)
+        elapsed = perf_counter_ns() - start
+    return {
+        'backend': name, 'work_ns': work, 'bars': bars, 'iterations': iterations,
+        'ns_per_iteration': elapsed / iterations, 'writes': recorder.writes,
+        'writes_per_second': recorder.writes / (elapsed / 1e9),
+        'bytes_per_write': recorder.bytes / recorder.writes if recorder.writes else 0,
+        'display_p99_us': percentile(latencies, 99) / 1000, 'displays': len(latencies)
+    }
+
+
+def compare(results: List[Dict[str, Any]], previous: List[Dict[str, Any]], tolerance: float) -> bool:
+    """ Compare the overhead of the results with the previous ones.
+    :param results: The current results.
+    :param previous: The previous results.
+    :param tolerance: The allowed relative increase of the overhead, for example, 0.2 for a 20%.
+    :return: True if any case has regressed.
+    """
+    old = {(case['backend'], case['work_ns'], case['bars']): case for case in previous}
+    regressed = False
+    print(f'\n{"backend":<14}{"work ns":>9}{"bars":>6}{"old ns":>10}{"new ns":>10}{"change":>9}')
+    for case in results:
+        key = (case['backend'], case['work_ns'], case['bars'])
+        if key not in old or case['backend'] == 'tqdm':
+            continue
+        before, after = old[key]['overhead_ns'], case['overhead_ns']
+        change = (after - before) / before if before > 0 else 0
+        regressed |= change > tolerance and after - before > 100
+        print(f'{key[0]:<14}{key[1]:>9}{key[2]:>6}{before:>10.0f}{after:>10.0f}{change:>8.0%}'
+              f'{"  REGRESSION" if change > tolerance and after - before > 100 else ""}')
+    return regressed
+
+
+def main() -> None:
+    """ The main function. """
+    parser = ArgumentParser(description='Measure the client-side overhead of the progress bar backends.')
+    parser.add_argument('-b', '--backends', type=str, metavar='NAMES', default=','.join(BACKENDS),
+                        help=f'The comma separated backends. By default, {",".join(BACKENDS)}.')
+    parser.add_argument('-n', '--iterations', type=int, metavar='N', default=20000,
+                        help='The iterations of each case. By default, 20000.')
+    parser.add_argument('-w', '--work', type=str, metavar='NS', default='0,1000,10000',
+                        help='The comma separated nanoseconds of work of each iteration. By default, 0,1000,10000.')
+    parser.add_argument('--bars', type=str, metavar='N', default='1,8',
+                        help='The comma separated numbers of bars updated round-robin. By default, 1,8.')
+    parser.add_argument('-r', '--repeat', type=int, metavar='N', default=3,
+                        help='The repetitions of each case, keeping the fastest one. By default, 3.')
+    parser.add_argument('-o', '--output', type=str, metavar='FILE', help='The JSON file to save the results.')
+    parser.add_argument('-c', '--compare', type=str, metavar='FILE',
+                        help='The JSON file with previous results to compare the overhead with.')
+    parser.add_argument('-t', '--tolerance', type=float, metavar='RATIO', default=0.2,
+                        help='The allowed relative increase of the overhead when comparing. By default, 0.2.')
+    args = parser.parse_args()
+    environ.pop('TQDM_MODE', None)
+    for name in args.backends.split(','):  # Warm up the imports and the connections
+        run_case(name, min(args.iterations, 1000), 0, 1)
+
+    results = []
+    print(f'{"backend":<14}{"work ns":>9}{"bars":>6}{"ns/it":>10}{"overhead":>10}{"writes/s":>10}{"B/write":>9}'
+          f'{"p99 us":>9}')
+    for bars in [int(value) for value in args.bars.split(',')]:
+        for work in [int(value) for value in args.work.split(',')]:
+            baseline = None
+            for name in ['tqdm'] + [name for name in args.backends.split(',') if name != 'tqdm']:
+                case = min((run_case(name, args.iterations, work, bars) for _ in range(args.repeat)),
+                           key=lambda result: result['ns_per_iteration'])
+                baseline = case['ns_per_iteration'] if baseline is None else baseline
+                case['overhead_ns'] = case['ns_per_iteration'] - baseline
+                results.append(case)
+                print(f'{name:<14}{work:>9}{bars:>6}{case["ns_per_iteration"]:>10.0f}{case["overhead_ns"]:>10.0f}'
+                      f'{case["writes_per_second"]:>10.0f}{case["bytes_per_write"]:>9.0f}'
+                      f'{case["display_p99_us"]:>9.1f}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            dump({'date': datetime.now().isoformat(), 'python': python_version(), 'platform': platform(),
+                  'tqdm': tqdm_module.__version__, 'iterations': args.iterations, 'repeat': args.repeat, 'results': results}, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            exit(1 if compare(results, load(file)['results'], args.tolerance) else 0)
+
+
+if __name__ == '__main__':
+    main()
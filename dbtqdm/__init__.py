@@ -1 +1,2 @@
 from .db import DatabaseTqdm
+from .backends import tqdm, register_backend, get_backend
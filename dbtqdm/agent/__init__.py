@@ -0,0 +1,9 @@
+from .agent import AgentTqdm as tqdm
+
+
+def __getattr__(name: str):
+    """ Import the client only when it is used. """
+    if name in ['AgentClient', 'connect']:
+        from . import client
+        return getattr(client, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,76 @@
+from json import dumps
+from os import getpid
+from socket import socket, AF_UNIX, SOCK_DGRAM
+from threading import Lock
+from time import sleep, monotonic
+from typing import Dict
+
+from dbtqdm.consts import DEF_SOCKET
+
+FINAL_TIMEOUT = 1.0
+
+
+class AgentClient(object):
+    """ Sender of progress bar updates to the agent of the host, through fire-and-forget datagrams of a Unix domain
+      socket. It does not open any connection, therefore, it does not wait for the agent, and the updates are lost
+      silently if the agent is not running or it is too busy to receive them.
+    """
+
+    @property
+    def path(self) -> str:
+        """
+        :return: The socket path of the agent.
+        """
+        return self._path
+
+    def __init__(self, path: str = DEF_SOCKET) -> None:
+        """ Constructor.
+        :param path: The socket path of the agent.
+        """
+        self._path = path
+        self._socket = socket(AF_UNIX, SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def send(self, update: dict, final: bool = False) -> bool:
+        """ Send a progress bar update in a single datagram.
+        :param update: The progress bar update with its basic fields.
+        :param final: If True, the update is the final state of the progress bar and, if the socket buffer is full,
+           it is retried for a second instead of being dropped.
+        :return: True if the datagram has been sent, otherwise False.
+        """
+        data, deadline = dumps(update, separators=(',', ':')).encode('utf-8'), monotonic() + FINAL_TIMEOUT
+        while True:
+            try:
+                self._socket.sendto(data, self._path)
+                return True
+            except BlockingIOError:
+                if not final or monotonic() > deadline:
+                    return False
+                sleep(0.001)
+            except OSError:
+                return False
+
+    def close(self) -> None:
+        """ Close the socket. """
+        self._socket.close()
+
+
+_clients: Dict[str, AgentClient] = {}
+_pid = getpid()
+_lock = Lock()
+
+
+def connect(path: str = DEF_SOCKET) -> AgentClient:
+    """ Get the client of an agent. The clients are shared in the same process by socket path.
+      After a fork, the child process creates its own clients.
+    :param path: The socket path of the agent.
+    :return: The agent client.
+    """
+    global _pid
+    with _lock:
+        if _pid != getpid():
+            _clients.clear()
+            _pid = getpid()
+        if path not in _clients:
+            _clients[path] = AgentClient(path)
+        return _clients[path]
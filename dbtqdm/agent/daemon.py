@@ -0,0 +1,205 @@
+from json import loads
+from logging import getLogger, basicConfig, INFO
+from os import unlink
+from os.path import exists
+from socket import socket, AF_UNIX, SOCK_DGRAM, SOL_SOCKET, SO_RCVBUF, timeout as SocketTimeout
+from time import monotonic
+from typing import Dict, List, Set, Union, Callable, Any
+
+from dbtqdm.args.agent import AgentArgParser
+from dbtqdm.consts import DEF_SOCKET, DEF_AGENT_WINDOW, DEF_DB_TYPE, DEF_DB_HOST, DEF_DB_PORT, DEF_DB_NAME, \
+    DEF_DB_PATH, DEF_URL
+from dbtqdm.http.client import IngestClient, IngestError
+from dbtqdm.ingest import check_update
+from dbtqdm.store import BarStore
+from dbtqdm.utils import expand_bar
+
+logger = getLogger(__name__)
+
+RECEIVE_BUFFER = 4 * 1024 * 1024
+MAX_DATAGRAM = 65536
+REJECTED_ERRORS = (ValueError, TypeError, IngestError)
+
+
+class ProgressAgent(object):
+    """ Agent which receives the progress bar updates of all the processes of a host through a Unix domain socket, and
+      forwards them in bulk to the database or to the dbtqdm server. The updates of the same progress bar are merged,
+      therefore, the number of connections and writes is bounded by host instead of by process.
+    """
+
+    @property
+    def path(self) -> str:
+        """
+        :return: The socket path.
+        """
+        return self._path
+
+    def __init__(self, backend: Union[BarStore, IngestClient], path: str = DEF_SOCKET,
+                 window: float = DEF_AGENT_WINDOW) -> None:
+        """ Constructor.
+        :param backend: Where the progress bars are forwarded, a progress bar store or the ingest API of a server.
+        :param path: The socket path.
+        :param window: The seconds to gather the updates before forwarding them.
+        """
+        self._backend, self._path, self._window = backend, path, window
+        self._bars: Dict[str, dict] = {}
+        self._dirty: Set[str] = set()
+        self._finished: List[dict] = []
+        self._socket = None
+
+    def bind(self) -> None:
+        """ Create the socket. If the path already exists, it is replaced. """
+        if exists(self._path):
+            unlink(self._path)
+        self._socket = socket(AF_UNIX, SOCK_DGRAM)
+        try:
+            self._socket.setsockopt(SOL_SOCKET, SO_RCVBUF, RECEIVE_BUFFER)
+        except OSError:
+            pass
+        self._socket.bind(self._path)
+
+    def serve_forever(self) -> None:
+        """ Receive and forward the progress bar updates until the process is stopped. """
+        if self._socket is None:
+            self.bind()
+        deadline = monotonic() + self._window
+        try:
+            while True:
+                self._socket.settimeout(max(deadline - monotonic(), 0.001))
+                try:
+                    self.receive(self._socket.recv(MAX_DATAGRAM))
+                except SocketTimeout:
+                    pass
+                if monotonic() >= deadline:
+                    self.forward()
+                    deadline = monotonic() + self._window
+        finally:
+            self.forward()
+            self.close()
+
+    def receive(self, data: bytes) -> None:
+        """ Merge a progress bar update received in a datagram. The invalid datagrams are ignored, like the ingest API
+          of the server does, and so are the updates which would make the merged progress bar invalid.
+        :param data: The datagram data, the JSON of the update with the basic fields of the progress bar.
+        """
+        try:
+            update = loads(data)
+            check_update(update)
+            bar_id = update['bar_name'] + (update.get('suffix') or '')
+            bar = dict(self._bars.get(bar_id, {}), **update)
+            expand_bar(bar)
+        except (ValueError, TypeError, OverflowError, OSError) as e:
+            logger.warning(f'Invalid progress bar update: {e}')
+            return
+        if bar.get('finished'):
+            self._bars.pop(bar_id, None)
+            self._dirty.discard(bar_id)
+            self._finished.append(bar)
+        else:
+            self._bars[bar_id] = bar
+            self._dirty.add(bar_id)
+
+    def forward(self) -> None:
+        """ Forward the changed and finished progress bars to the backend. If it is not available, they are forwarded
+          again the next time. The progress bars which it rejects are discarded, so they never block the rest.
+        """
+        bars = [self._bars[bar_id] for bar_id in self._dirty]
+        finished, self._dirty, self._finished = self._finished, set(), []
+        if not bars and not finished:
+            return
+        try:
+            if isinstance(self._backend, IngestClient):
+                self._write(self._backend.bulk_write, bars + finished)
+            else:
+                self._write(self._backend.save, [bar for bar in map(self._expand, bars) if bar is not None])
+                while finished:
+                    bar = self._expand(finished[0])
+                    if bar is not None:
+                        self._write(lambda bars: self._backend.finish(bars[0]), [bar])
+                    finished.pop(0)
+        except Exception as e:
+            logger.warning(f'The progress bars could not be forwarded: {e}')
+            self._dirty.update(bar['bar_name'] + (bar.get('suffix') or '') for bar in bars)
+            self._finished = finished + self._finished
+
+    def _write(self, write: Callable[[List[dict]], Any], bars: List[dict]) -> None:
+        """ Write several progress bars with a single call. If the backend rejects them, they are written one by one,
+          so only the invalid ones are discarded. The connection and database errors are raised to retry them.
+        :param write: The function of the backend which writes the list of progress bars.
+        :param bars: The progress bars.
+        """
+        if not bars:
+            return
+        try:
+            write(bars)
+        except REJECTED_ERRORS as e:
+            if len(bars) > 1:
+                for bar in bars:
+                    self._write(write, [bar])
+            else:
+                logger.warning(f'The progress bar "{bars[0].get("bar_name")}" has been rejected and discarded: {e}')
+
+    @staticmethod
+    def _expand(bar: dict) -> Union[dict, None]:
+        """ Complete a progress bar with all the stored fields.
+        :param bar: The basic fields of the progress bar.
+        :return: The progress bar information, or None if it is not valid, so it is discarded.
+        """
+        try:
+            return expand_bar(bar)
+        except (ValueError, TypeError, OverflowError, OSError) as e:
+            logger.warning(f'The progress bar "{bar.get("bar_name")}" is not valid and it is discarded: {e}')
+            return None
+
+    def close(self) -> None:
+        """ Close and remove the socket. """
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            if exists(self._path):
+                unlink(self._path)
+
+
+def init_backend(db_type: str = DEF_DB_TYPE, db_host: str = DEF_DB_HOST, db_port: int = DEF_DB_PORT,
+                 replicaset: str = None, db_name: str = DEF_DB_NAME, db_path: str = DEF_DB_PATH,
+                 url: str = DEF_URL) -> Union[BarStore, IngestClient]:
+    """ Open the backend where the agent forwards the progress bars.
+    :param db_type: The backend type, "mongo", "sqlite" or "http".
+    :param db_host: Only for MongoDB. The database host.
+    :param db_port: Only for MongoDB. The database port.
+    :param replicaset: Only for MongoDB. The replicaset.
+    :param db_name: Only for MongoDB. The database name.
+    :param db_path: Only for SQLite. The database file path.
+    :param url: Only for http. The server URL.
+    :return: The progress bar store or the ingest API client.
+    """
+    if db_type == 'http':
+        return IngestClient(url)
+    if db_type == 'sqlite':
+        from dbtqdm.sqlite import connect_db as connect_sqlite
+        from dbtqdm.sqlite.store import SQLiteStore
+        return SQLiteStore(connect_sqlite(db_path))
+    from dbtqdm.mongo.utils import connect_db, ensure_indexes
+    from dbtqdm.mongo.store import MongoStore
+    db = connect_db(db_host, db_port, replicaset)[db_name]
+    ensure_indexes(db)
+    return MongoStore(db)
+
+
+def main() -> None:
+    """ The main function. """
+    basicConfig(level=INFO)
+    args = AgentArgParser()
+    backend = init_backend(args.db_type, args.db_host, args.db_port, args.replicaset, args.database, args.db_path,
+                           args.url)
+    agent = ProgressAgent(backend, args.socket, args.window)
+    agent.bind()
+    logger.info(f'Listening on {agent.path} and forwarding to {args.db_type}.')
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
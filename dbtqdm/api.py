@@ -0,0 +1,97 @@
+from time import time
+from typing import Dict, List, Tuple, Union, Mapping, Iterable
+
+from dbtqdm.board import BarBoard, page_etag
+from dbtqdm.consts import DEF_HISTORY_POINTS
+from dbtqdm.store import group_bars, merge_groups, group_summary
+from dbtqdm.utils import lttb
+
+
+def stale_limit(timeout: float, now: float = None) -> Union[float, None]:
+    """ Calculate the timestamp before which the heartbeat of an active progress bar is stale.
+    :param timeout: The seconds without heartbeat to consider that a progress bar is stale. If 0, they are never stale.
+    :param now: The current timestamp. By default, the current time.
+    :return: The timestamp or None if the progress bars are never stale.
+    """
+    return (time() if now is None else now) - timeout if timeout > 0 else None
+
+
+def board_data(board: BarBoard, params: Union[dict, None], since: Union[str, None], title: str,
+               stale_before: float = None) -> Tuple[dict, str]:
+    """ Get the data of the API of the active progress bars from the board.
+    :param board: The board.
+    :param params: The page parameters returned by page_params(), or None to get all the progress bars.
+    :param since: If it is given and there are no page parameters, only the progress bars created or updated after
+       this board version, and the ids of the removed ones in "removed".
+    :param title: The page title.
+    :param stale_before: The progress bars whose heartbeat is older than this timestamp are stale.
+    :return: A tuple with the data and its ETag.
+    """
+    if params is not None:
+        bars, after, version = board.page(stale_before=stale_before, **params)
+        return {'title': title, 'version': version, 'bars': bars, 'next': after}, page_etag(version, params, bars)
+    bars, removed, version = board.changes(since) if since else (board.bars(), None, board.version)
+    data = {'title': title, 'version': version, 'bars': bars}
+    if removed is not None:
+        data['removed'] = removed
+    return data, version
+
+
+def finished_data(obj: dict) -> dict:
+    """ Complete the last finished execution of a progress bar to be shown like an active one.
+    :param obj: The finished execution.
+    :return: The same execution.
+    """
+    obj['remaining_str'] = '0s'
+    obj['start_str'] = '0s'
+    return obj
+
+
+def history_points(args: Mapping[str, str]) -> int:
+    """ Read the parameter "points" of the history API.
+    :param args: The query string arguments.
+    :return: The number of points (200 by default).
+    :raise ValueError: If it is not a positive integer.
+    """
+    try:
+        points = int(args['points']) if args.get('points') else DEF_HISTORY_POINTS
+    except ValueError:
+        raise ValueError(f'The parameter "points" must be an integer, not "{args["points"]}".')
+    if points < 1:
+        raise ValueError(f'The parameter "points" must be positive, not "{points}".')
+    return points
+
+
+def history_data(obj: dict, points: int) -> dict:
+    """ Downsample the history of a progress bar.
+    :param obj: The history, with the list of samples of timestamp, position and rate.
+    :param points: The maximum number of samples.
+    :return: The same history with the downsampled samples.
+    """
+    obj['samples'] = lttb(obj['samples'], points, y=2)
+    return obj
+
+
+def groups_data(partials: Iterable[dict], live_bars: List[dict], stale_before: float = None,
+                prefix: str = None) -> Dict[str, List[dict]]:
+    """ Get the data of the groups API, merging the groups of the database with the progress bars received by the ingest
+      API, which must have been excluded from the database ones because they are also saved in the checkpoints.
+    :param partials: The partial groups of the database.
+    :param live_bars: The progress bars received by the ingest API.
+    :param stale_before: The progress bars whose heartbeat is older than this timestamp are stale.
+    :param prefix: If it is given, only the groups whose bar name starts with it.
+    :return: A dict with the list of "groups" sorted by bar name.
+    """
+    merged = merge_groups(group_bars(live_bars, stale_before), merge_groups(partials))
+    return {'groups': [group_summary(merged[name]) for name in sorted(merged) if name.startswith(prefix or '')]}
+
+
+def ingest_updates(data: object) -> List[dict]:
+    """ Read the body of the ingest API.
+    :param data: The decoded JSON body.
+    :return: The list of progress bar updates.
+    :raise ValueError: If the body is not a JSON object with the list "bars".
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('bars'), list):
+        raise ValueError('The request body must be a JSON object with the list "bars".')
+    return data['bars']
@@ -0,0 +1,102 @@
+from argparse import ArgumentParser
+
+from dbtqdm.consts import DEF_DB_HOST, DEF_DB_PORT, DEF_DB_NAME, DEF_DB_TYPE, DEF_DB_PATH, DEF_URL, DEF_SOCKET, \
+    DEF_AGENT_WINDOW, AGENT_DB_TYPES
+
+
+class AgentArgParser(object):
+    """ Argument parser for the agent. """
+    @property
+    def socket(self) -> str:
+        """
+        :return: The Unix domain socket path. By default, "dbtqdm.sock" in the temporary directory.
+        """
+        return self._args.socket
+
+    @property
+    def window(self) -> float:
+        """
+        :return: The seconds to gather the updates before forwarding them. By default, 0.5.
+        """
+        return self._args.window
+
+    @property
+    def db_type(self) -> str:
+        """
+        :return: Where the progress bars are forwarded, "mongo", "sqlite" or "http". By default, "mongo".
+        """
+        return self._args.db_type
+
+    @property
+    def db_path(self) -> str:
+        """
+        :return: Only for the database type "sqlite". The database file path. By default, "tqdm.db".
+        """
+        return self._args.db_path
+
+    @property
+    def db_host(self) -> str:
+        """
+        :return: The database host. By default, "localhost".
+        """
+        return self._args.db_host
+
+    @property
+    def db_port(self) -> int:
+        """
+        :return: The database port. By default, 27017.
+        """
+        return self._args.db_port
+
+    @property
+    def replicaset(self) -> str:
+        """
+        :return: The MongoDB replicaset. By default, it is not used.
+        """
+        return self._args.replicaset
+
+    @property
+    def database(self) -> str:
+        """
+        :return: The database name. By default, "tqdm".
+        """
+        return self._args.database
+
+    @property
+    def url(self) -> str:
+        """
+        :return: Only for the type "http". The dbtqdm server URL. By default, "http://localhost:5000".
+        """
+        return self._args.url
+
+    def __init__(self) -> None:
+        """ Constructor. """
+        parser = ArgumentParser(description='Start the agent to forward the bar progress data of this host.')
+        self.set_arguments(parser)
+        self._args = parser.parse_args()
+
+    @staticmethod
+    def set_arguments(parser: ArgumentParser) -> None:
+        """ Set the parser arguments.
+        :parser parser: The parser to add the arguments.
+        """
+        parser.add_argument('-s', '--socket', type=str, metavar='PATH', default=DEF_SOCKET,
+                            help=f'The Unix domain socket path. By default, {DEF_SOCKET}.')
+        parser.add_argument('-w', '--window', type=float, metavar='SECONDS', default=DEF_AGENT_WINDOW,
+                            help=f'The seconds to gather the updates before forwarding them. '
+                                 f'By default, {DEF_AGENT_WINDOW}.')
+        parser.add_argument('-t', '--db_type', type=str, metavar='TYPE', default=DEF_DB_TYPE, choices=AGENT_DB_TYPES,
+                            help=f'Where the progress bars are forwarded. By default, {DEF_DB_TYPE}. '
+                                 f'Available types: {AGENT_DB_TYPES}.')
+        parser.add_argument('--db_host', type=str, metavar='HOST', default=DEF_DB_HOST,
+                            help=f'The database host. By default, {DEF_DB_HOST}.')
+        parser.add_argument('--db_port', type=int, metavar='PORT', default=DEF_DB_PORT,
+                            help=f'The database port. By default, {DEF_DB_PORT}.')
+        parser.add_argument('--db_path', type=str, metavar='PATH', default=DEF_DB_PATH,
+                            help=f'Only for the type sqlite. The database file path. By default, {DEF_DB_PATH}.')
+        parser.add_argument('-r', '--replicaset', type=str, metavar='NAME',
+                            help='The replicaset. By default, none.')
+        parser.add_argument('-d', '--database', type=str, metavar='NAME', default=DEF_DB_NAME,
+                            help=f'The database name. By default, {DEF_DB_NAME}.')
+        parser.add_argument('-u', '--url', type=str, metavar='URL', default=DEF_URL,
+                            help=f'Only for the type http. The dbtqdm server URL. By default, {DEF_URL}.')
@@ -1,7 +1,8 @@
 from argparse import ArgumentParser
 
 from dbtqdm.consts import DEF_HOST, DEF_PORT, DEF_DB_HOST, DEF_DB_PORT, DEF_DB_NAME, DEF_INTERVAL, DEF_TITLE, \
-    DEF_DB_TYPE, DB_TYPES
+    DEF_DB_TYPE, DB_TYPES, DEF_CACHE_TTL, SERVER_MODES, DEF_SERVER_MODE, DEF_DB_PATH, \
+    DEF_SHM_PATH, DEF_CHECKPOINT, DEF_RETENTION, DEF_STALE_TIMEOUT
 
 
 class TqdmArgParser(object):
@@ -27,13 +28,29 @@ class TqdmArgParser(object):
         """
         return self._args.port
 
+    @property
+    def server_mode(self) -> str:
+        """
+        :return: The server implementation: "flask" for the Flask server or "async" for the asyncio server.
+           By default, "flask".
+        """
+        return self._args.server_mode
+
     @property
     def db_type(self) -> str:
         """
-        :return: The database manager type. By default, "mongo". At the moment only mongo is available.
+        :return: The database manager type, "mongo", "sqlite" or "shm". By default, "mongo".
         """
         return self._args.db_type
 
+    @property
+    def db_path(self) -> str:
+        """
+        :return: Only for the database types "sqlite" and "shm". The database file path. By default, "tqdm.db" for
+           "sqlite" and "tqdm.slots" in /dev/shm or the temporary directory for "shm".
+        """
+        return self._args.db_path
+
     @property
     def db_host(self) -> str:
         """
@@ -69,11 +86,52 @@ class TqdmArgParser(object):
         """
         return self._args.interval * 1000
 
+    @property
+    def cache_ttl(self) -> float:
+        """
+        :return: The seconds while the snapshot of the progress bars is shared by all the clients. By default, 1.
+        """
+        return self._args.cache_ttl
+
+    @property
+    def checkpoint(self) -> float:
+        """
+        :return: The seconds between two saves of the progress bars received by the ingest API. By default, 60.
+        """
+        return self._args.checkpoint
+
+    @property
+    def retention(self) -> float:
+        """
+        :return: The days while the finished executions are kept before compacting them into daily rollups. By default,
+           0, they are kept forever.
+        """
+        return self._args.retention
+
+    @property
+    def stale_timeout(self) -> float:
+        """
+        :return: The seconds without heartbeat to archive a progress bar as aborted. By default, 300.
+        """
+        return self._args.stale_timeout
+
+    @property
+    def compact(self) -> bool:
+        """
+        :return: If True, compact the finished executions older than the retention days and exit, without starting
+           the server.
+        """
+        return self._args.compact
+
     def __init__(self) -> None:
         """ Constructor. """
         parser = ArgumentParser(description='Start the server to serve the bar progress data.')
         self.set_arguments(parser)
         self._args = parser.parse_args()
+        if self._args.server_mode == 'async' and self._args.db_type != 'mongo':
+            parser.error('The async server mode is only available for the database type "mongo".')
+        if self._args.compact and self._args.retention <= 0:
+            parser.error('The retention days must be set to compact the finished executions.')
 
     @staticmethod
     def set_arguments(parser: ArgumentParser) -> None:
@@ -84,17 +142,40 @@ class TqdmArgParser(object):
                             help=f'The server host. By default, {DEF_HOST}.')
         parser.add_argument('-p', '--port', type=int, metavar='PORT', default=DEF_PORT,
                             help=f'The server port. By default, {DEF_PORT}.')
+        parser.add_argument('-m', '--server_mode', type=str, metavar='MODE', default=DEF_SERVER_MODE,
+                            choices=SERVER_MODES,
+                            help=f'The server implementation. By default, {DEF_SERVER_MODE}. '
+                                 f'Available modes: {SERVER_MODES}.')
         parser.add_argument('-t', '--db_type', type=str, metavar='TYPE', default=DEF_DB_TYPE, choices=DB_TYPES,
-                            help=f'The database host. By default, {DEF_DB_TYPE}. Available databases: {DB_TYPES}.')
+                            help=f'The database type: mongo (MongoDB), sqlite (SQLite file) or shm (shared memory '
+                                 f'file). By default, {DEF_DB_TYPE}. Available types: {DB_TYPES}.')
         parser.add_argument('--db_host', type=str, metavar='HOST', default=DEF_DB_HOST,
-                            help=f'The database host. By default, {DEF_HOST}.')
+                            help=f'The database host. By default, {DEF_DB_HOST}.')
         parser.add_argument('--db_port', type=int, metavar='PORT', default=DEF_DB_PORT,
-                            help=f'The database port. By default, {DEF_PORT}.')
+                            help=f'The database port. By default, {DEF_DB_PORT}.')
+        parser.add_argument('--db_path', type=str, metavar='PATH',
+                            help=f'Only for the database types sqlite and shm. The database file path. By default, '
+                                 f'{DEF_DB_PATH} for sqlite and {DEF_SHM_PATH} for shm.')
         parser.add_argument('-r', '--replicaset', type=str, metavar='NAME',
                             help=f'The replicaset. By default, none.')
         parser.add_argument('-d', '--database', type=str, metavar='NAME', default=DEF_DB_NAME,
                             help=f'The database name. By default, {DEF_DB_NAME}.')
         parser.add_argument('-i', '--interval', type=int, metavar='SECONDS', default=DEF_INTERVAL,
                             help=f'The database name. By default, {DEF_DB_NAME}.')
+        parser.add_argument('-c', '--cache_ttl', type=float, metavar='SECONDS', default=DEF_CACHE_TTL,
+                            help=f'The seconds while the snapshot of the progress bars is shared by all the clients. '
+                                 f'By default, {DEF_CACHE_TTL}.')
+        parser.add_argument('-k', '--checkpoint', type=float, metavar='SECONDS', default=DEF_CHECKPOINT,
+                            help=f'The seconds between two saves of the progress bars received by the ingest API. '
+                                 f'If 0, they are only saved when they finish. By default, {DEF_CHECKPOINT}.')
+        parser.add_argument('-R', '--retention', type=float, metavar='DAYS', default=DEF_RETENTION,
+                            help='The days while the finished executions are kept. The older ones are compacted each '
+                                 'hour into daily rollups by bar name. By default, they are kept forever.')
+        parser.add_argument('-s', '--stale_timeout', type=float, metavar='SECONDS', default=DEF_STALE_TIMEOUT,
+                            help=f'The seconds without heartbeat to archive a progress bar as aborted, because its '
+                                 f'process has died. If 0, they are never archived. By default, {DEF_STALE_TIMEOUT}.')
+        parser.add_argument('--compact', action='store_true',
+                            help='Compact the finished executions older than the retention days and exit, without '
+                                 'starting the server.')
         parser.add_argument('title', type=str, metavar='TITLE', default=DEF_TITLE, nargs='?',
                             help=f'The web page title. By default, "{DEF_TITLE}".')
@@ -0,0 +1,594 @@
+import asyncio
+from json import dumps
+from logging import getLogger
+from os.path import dirname, join
+from time import monotonic, perf_counter, time
+from typing import Any, Union, Dict, Awaitable, Callable
+
+from aiohttp import web
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import DESCENDING, ReplaceOne
+from pymongo.errors import OperationFailure, PyMongoError
+
+from dbtqdm.api import stale_limit, board_data, finished_data, history_points, history_data, groups_data, \
+    ingest_updates
+from dbtqdm.board import BarBoard, page_params
+from dbtqdm.ingest import LiveBars
+from dbtqdm.consts import DEF_TITLE, DEF_INTERVAL, DEF_DB_PORT, DEF_HOST, DEF_PORT, DEF_DB_HOST, DEF_DB_NAME, \
+    STATS_COLLECTION, ACTIVE_COLLECTION, DEF_CACHE_TTL, TQDM_ROUTE, BAR_ROUTE, REMOVE_ROUTE, STREAM_ROUTE, KEEP_ALIVE, \
+    HISTORY_COLLECTION, HISTORY_ROUTE, INGEST_ROUTE, DEF_CHECKPOINT, METRICS_ROUTE, STATS_ROUTE, \
+    ROLLUP_COLLECTION, ROLLUPS_ROUTE, DEF_RETENTION, MAINTENANCE_INTERVAL, DEF_STALE_TIMEOUT, GROUPS_ROUTE, \
+    MIGRATION_INTERVAL
+from dbtqdm.metrics import registry, request_seconds, store_seconds, server_bars, CONTENT_TYPE
+from dbtqdm.mongo.store import MongoStore
+from dbtqdm.mongo.utils import ensure_indexes, migrate_collections, connect_db, release_db, stats_query, STATS_SORT, \
+    rollups_query, ROLLUP_SORT, groups_pipeline, group_document, heartbeat_only
+from dbtqdm.store import stats_params, stats_page, rollup_params, retention_limit, aborted_bar
+from dbtqdm.utils import shared_meter, json_default
+from dbtqdm.wire import BodyCache, bars_representation, compress, etag_matches, response_encoding
+
+logger = getLogger(__name__)
+templates = Environment(loader=FileSystemLoader(join(dirname(__file__), 'templates')),
+                        autoescape=select_autoescape(['html']))
+
+
+class AsyncSnapshotCache(object):
+    """ Asyncio version of the server SnapshotCache. The snapshot is reloaded at most once each TTL seconds and
+      the concurrent requests which find it expired wait for the same load (single-flight).
+    """
+
+    def __init__(self, board: BarBoard, db: AsyncIOMotorDatabase, ttl: float = DEF_CACHE_TTL,
+                 live: LiveBars = None) -> None:
+        """ Constructor.
+        :param board: The board to update with the active progress bars.
+        :param db: The database.
+        :param ttl: The seconds while the snapshot is valid.
+        :param live: The progress bars received by the ingest API, which are added to the database ones.
+        """
+        self.board, self.db, self.ttl, self.live = board, db, ttl, live if live is not None else LiveBars()
+        self._expiration, self._loading = None, None
+
+    async def get(self) -> str:
+        """ Update the board if the snapshot is expired.
+        :return: The board version.
+        """
+        if self._expiration is not None and monotonic() < self._expiration:
+            return self.board.version
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load())
+        return await asyncio.shield(self._loading)
+
+    def invalidate(self) -> None:
+        """ Expire the snapshot, so the next call to get() loads it again. """
+        self._expiration = None
+
+    async def _load(self) -> str:
+        """ Load the active progress bars into the board. """
+        try:
+            bars = await timed('active', self.db[ACTIVE_COLLECTION].find({}, {'_id': 0}).to_list(None))
+            bars = [shared_meter(bar) for bar in bars] + self.live.bars()
+            self._expiration = monotonic() + self.ttl
+            server_bars.set(len(bars))
+            return self.board.update(bars)
+        finally:
+            self._loading = None
+
+
+def json_response(data: Any, status: int = 200) -> web.Response:
+    """ Create a JSON response.
+    :param data: The data to send.
+    :param status: The HTTP status.
+    :return: The response.
+    """
+    return web.Response(text=dumps(data, default=json_default), status=status, content_type='application/json')
+
+
+def conditional_response(request: web.Request, data: Union[dict, list], etag: str) -> web.Response:
+    """ Create a JSON response with an ETag. If the request has the same ETag in its If-None-Match header, then
+      the response is empty with the status 304 and the data is not serialized.
+    :param request: The request.
+    :param data: The data to send.
+    :param etag: The data version.
+    :return: The response.
+    """
+    response = web.Response(status=304) if etag_matches(etag, request.headers.get('If-None-Match')) else \
+        json_response(data)
+    response.headers['ETag'] = f'"{etag}"'
+    return response
+
+
+def bars_response(request: web.Request, data: dict, etag: str) -> web.Response:
+    """ Create the response of the API of the active progress bars, with the same media types, compression and cache
+      of serialized bodies than the Flask server.
+    :param request: The request.
+    :param data: The data to send.
+    :param etag: The data version.
+    :return: The response.
+    """
+    status, body, headers = bars_representation(request.app['bodies'], (request.query_string,), data, etag,
+                                                request.headers)
+    return web.Response(body=body if status == 200 else None, status=status, headers=headers)
+
+
+def render(template: str, **kwargs) -> web.Response:
+    """ Render a Flask server template.
+    :param template: The template name.
+    :param kwargs: The template variables.
+    :return: The response with the rendered page.
+    """
+    def url_for(endpoint: str, filename: str = None) -> str:
+        return f'/static/{filename}' if endpoint == 'static' else '/'
+
+    html = templates.get_template(template).render(url_for=url_for, request={'script_root': ''}, **kwargs)
+    return web.Response(text=html, content_type='text/html')
+
+
+async def home(request: web.Request) -> web.Response:
+    """ Show all the progress bar.
+    :return: The home web page, which shows all the progress bars.
+    """
+    return render('index.html', title=request.app['title'], interval=request.app['interval'])
+
+
+async def bar_page(request: web.Request) -> web.Response:
+    """ Show a bar.
+    :return: The web page, which shows the specified progress bar.
+    """
+    return render('bar.html', bar_name=request.match_info['bar_id'], interval=request.app['interval'])
+
+
+async def health(request: web.Request) -> web.Response:
+    """ Check if this service is alive. """
+    return web.Response(text='I am ready!')
+
+
+async def metrics(request: web.Request) -> web.Response:
+    """ API to get the metrics of the server in the Prometheus text format. """
+    return web.Response(body=registry.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+
+@web.middleware
+async def measure_request(request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]) \
+        -> web.StreamResponse:
+    """ Measure the latency of the requests by route, except the event streams, which are open while the page is, and
+      compress the responses like the Flask server.
+    """
+    start = perf_counter()
+    try:
+        return compress_response(request, await handler(request))
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else 'unmatched'
+        if route != STREAM_ROUTE:
+            request_seconds.observe(perf_counter() - start, route, request.method)
+
+
+def compress_response(request: web.Request, response: web.StreamResponse) -> web.StreamResponse:
+    """ Compress a response with gzip or brotli if the client accepts it, except the small ones, the files and the
+      event streams.
+    :param request: The request.
+    :param response: The response.
+    :return: The same response, compressed if it is possible.
+    """
+    if not isinstance(response, web.Response) or response.status != 200 or not isinstance(response.body, bytes) or \
+            'Content-Encoding' in response.headers:
+        return response
+    encoding = response_encoding(response.content_type, len(response.body), request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.body = compress(response.body, encoding)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+async def timed(operation: str, awaitable: Awaitable) -> Any:
+    """ Measure the time of a database operation.
+    :param operation: The operation name, the same than the BarStore methods.
+    :param awaitable: The database operation.
+    :return: The operation result.
+    """
+    start = perf_counter()
+    try:
+        return await awaitable
+    finally:
+        store_seconds.observe(perf_counter() - start, operation)
+
+
+async def tqdm(request: web.Request) -> web.Response:
+    """ API to get the bar data give its id. If that progress bar is not active, then it will check the last finished
+      progress bar with this id. Both queries are executed concurrently. If it does not exist, then return a error
+      message.
+    """
+    bar_id, board = request.match_info['bar_id'], request.app['board']
+    _, obj = await asyncio.gather(
+        request.app['cache'].get(),
+        timed('last_stats', request.app['db'][STATS_COLLECTION].find_one({'bar_id': bar_id}, {'_id': 0},
+                                                                         sort=[('start_time', DESCENDING)])))
+    bar, version = board.bar(bar_id)
+    if bar:
+        return conditional_response(request, bar, version)
+    if obj:
+        return conditional_response(request, finished_data(obj), f'{obj.get("start_time")}-{obj.get("end_time")}')
+    return json_response({'error': f'Bar progress "{bar_id}" does not exist.'}, 404)
+
+
+async def history(request: web.Request) -> web.Response:
+    """ API to get the history of the last execution of a progress bar, downsampled to the number of points given by
+      the parameter "points" (200 by default).
+    """
+    bar_id = request.match_info['bar_id']
+    try:
+        points = history_points(request.query)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    obj = await timed('history', request.app['db'][HISTORY_COLLECTION].find_one({'bar_id': bar_id}, {'_id': 0}))
+    if obj:
+        history_data(obj, points)
+        last = obj['samples'][-1][0] if obj['samples'] else 0
+        return conditional_response(request, obj, f'{obj["start"]}-{last}-{len(obj["samples"])}')
+    return json_response({'error': f'There is no history for the progress bar "{bar_id}".'}, 404)
+
+
+async def stats(request: web.Request) -> web.Response:
+    """ API to browse the finished executions of the progress bars, with the same parameters and response than the
+      Flask server.
+    """
+    try:
+        params = stats_params(request.query)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    query, projection = stats_query(params['bar_name'], params['suffix'], params['since'], params['until'],
+                                    params['after'], params['fields'])
+    cursor = request.app['db'][STATS_COLLECTION].find(query, projection, sort=STATS_SORT, limit=params['limit'] + 1)
+    return json_response(stats_page(await timed('stats', cursor.to_list(None)), params['limit']))
+
+
+async def rollups(request: web.Request) -> web.Response:
+    """ API to get the daily rollups of the compacted executions, with the same parameters and response than the Flask
+      server.
+    """
+    try:
+        params = rollup_params(request.query)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    cursor = request.app['db'][ROLLUP_COLLECTION].find(
+        rollups_query(params['bar_name'], params['since'], params['until']), {'_id': 0}, sort=ROLLUP_SORT,
+        limit=params['limit'])
+    return json_response({'rollups': await timed('rollups', cursor.to_list(None))})
+
+
+async def remove(request: web.Request) -> web.Response:
+    """ Remove a progress bar from the database. If the progress bar is still alive, then it will appear again
+      in the next page updating.
+    """
+    bar_id = request.match_info['bar_id']
+    removed = request.app['live'].remove(bar_id)
+    result = await timed('remove', request.app['db'][ACTIVE_COLLECTION].delete_one({'bar_id': bar_id}))
+    if result.deleted_count or removed:
+        request.app['board'].remove(bar_id)
+        request.app['cache'].invalidate()
+        return json_response(True)
+    return json_response({'error': f'Bar progress "{bar_id}" does not exist or it is already removed.'}, 404)
+
+
+async def ingest(request: web.Request) -> web.Response:
+    """ API to report the changes of several progress bars in a single request, with the same body than the Flask
+      server. The active progress bars are kept in memory and they are only saved into the database when they finish
+      or in the periodic checkpoints.
+    """
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    try:
+        updates = ingest_updates(data)
+        updated, finished = request.app['live'].update(updates)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    db, board = request.app['db'], request.app['board']
+    for bar in updated:
+        board.put(bar)
+    for bar in finished:
+        async with request.app['persist']:
+            await timed('finish', finish(db, bar))
+        board.remove(bar['bar_id'])
+    await notify(request.app)
+    return json_response({'received': len(updates)})
+
+
+async def finish(db: AsyncIOMotorDatabase, bar: dict) -> None:
+    """ Move a finished progress bar from the active progress bars to the stats collection.
+    :param db: The database.
+    :param bar: The finished progress bar.
+    """
+    await db[ACTIVE_COLLECTION].delete_one({'bar_id': bar['bar_id']})
+    await db[STATS_COLLECTION].replace_one({'start_time': bar['start_time'], 'bar_name': bar['bar_name'],
+                                            'suffix': bar['suffix']}, bar, upsert=True)
+
+
+async def save_checkpoints(app: web.Application, seconds: float) -> None:
+    """ Save periodically into the database the progress bars received by the ingest API which have changed.
+    :param app: The web application.
+    :param seconds: The seconds between two checkpoints.
+    """
+    while True:
+        await asyncio.sleep(seconds)
+        try:
+            async with app['persist']:
+                bars = app['live'].dirty()
+                if bars:
+                    await timed('save', app['db'][ACTIVE_COLLECTION].bulk_write(
+                        [ReplaceOne({'bar_id': bar['bar_id']}, bar, upsert=True) for bar in bars], ordered=False))
+        except PyMongoError as e:
+            logger.warning(f'The progress bars could not be saved: {e}')
+
+
+async def compact_stats(app: web.Application, days: float) -> None:
+    """ Compact periodically the finished executions older than the retention days into daily rollups. The compaction
+      reads and writes whole days, so it is executed in a thread with a synchronous client to not block the server.
+    :param app: The web application.
+    :param days: The days while the finished executions are kept.
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            compacted = await timed('compact', loop.run_in_executor(None, app['store'].compact, retention_limit(days)))
+            if compacted:
+                logger.info(f'{compacted} finished progress bars have been compacted into daily rollups.')
+        except PyMongoError as e:
+            logger.warning(f'The finished progress bars could not be compacted: {e}')
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+
+
+async def reap_bars(app: web.Application, timeout: float) -> None:
+    """ Archive periodically as aborted the progress bars without heartbeat during a timeout, because their process has
+      died without closing them, and remove them from the board. The progress bars received by the ingest API which
+      have not been updated during the timeout are also archived.
+    :param app: The web application.
+    :param timeout: The seconds without heartbeat to consider that a progress bar is aborted.
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(timeout / 2)
+        try:
+            async with app['persist']:
+                expired = app['live'].expire(time() - timeout)
+                for bar in expired:
+                    await timed('finish', finish(app['db'], aborted_bar(bar)))
+                reaped = [bar['bar_id'] for bar in expired] + \
+                    await timed('reap', loop.run_in_executor(None, app['store'].reap, time() - timeout))
+        except PyMongoError as e:
+            logger.warning(f'The aborted progress bars could not be archived: {e}')
+            continue
+        for bar_id in reaped:
+            app['board'].remove(bar_id)
+        if reaped:
+            app['cache'].invalidate()
+            await notify(app)
+            logger.info(f'{len(reaped)} progress bars without heartbeat have been archived as aborted.')
+
+
+async def migrate_bars(app: web.Application, seconds: float) -> None:
+    """ Migrate periodically the progress bars written with the old layout by the clients of previous versions, in a
+      thread with a synchronous client to not block the server.
+    :param app: The web application.
+    :param seconds: The seconds between two migrations.
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(seconds)
+        try:
+            async with app['persist']:
+                migrated = await timed('migrate', loop.run_in_executor(None, app['store'].migrate))
+        except PyMongoError as e:
+            logger.warning(f'The progress bars of previous versions could not be migrated: {e}')
+            continue
+        if migrated:
+            app['cache'].invalidate()
+            await notify(app)
+
+
+async def all_tqdm(request: web.Request) -> web.Response:
+    """ Get the data of all the progress bars, with the same "since" parameter, page parameters and ETag header than
+      the Flask server.
+    """
+    board = request.app['board']
+    try:
+        params = page_params(request.query)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    await request.app['cache'].get()
+    data, etag = board_data(board, params, request.query.get('since'), request.app['title'],
+                            stale_limit(request.app['stale_timeout']))
+    return bars_response(request, data, etag)
+
+
+async def groups(request: web.Request) -> web.Response:
+    """ API to get the active progress bars aggregated by bar name, like the Flask server, with a single aggregation
+      pipeline.
+    """
+    stale_before, bars = stale_limit(request.app['stale_timeout']), request.app['live'].bars()
+    pipeline = groups_pipeline(stale_before, [bar['bar_id'] for bar in bars])
+    documents = await timed('groups', request.app['db'][ACTIVE_COLLECTION].aggregate(pipeline).to_list(None))
+    return json_response(groups_data([group_document(doc) for doc in documents], bars, stale_before,
+                                     request.query.get('prefix')))
+
+
+async def stream(request: web.Request) -> web.StreamResponse:
+    """ Stream of Server-Sent Events with the progress bar changes, with the same events than the Flask server. """
+    bar_id, board, changed = request.query.get('bar_id'), request.app['board'], request.app['changed']
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                           'X-Accel-Buffering': 'no'})
+    await response.prepare(request)
+    version = await request.app['cache'].get()
+    bars = board.bars()
+    await response.write(sse('snapshot', [bar for bar in bars if bar_id is None or bar['bar_id'] == bar_id]))
+    while True:
+        async with changed:
+            try:
+                await asyncio.wait_for(changed.wait(), KEEP_ALIVE)
+            except asyncio.TimeoutError:
+                await response.write(b': keep-alive\n\n')
+                continue
+        bars, removed, version = board.changes(version)
+        if removed is None:
+            # The removals since the previous version are not remembered anymore, so the client starts again
+            await response.write(sse('snapshot', [bar for bar in bars if bar_id is None or bar['bar_id'] == bar_id]))
+            continue
+        for bar in bars:
+            if bar_id is None or bar['bar_id'] == bar_id:
+                await response.write(sse('bar', bar))
+        for removed_id in removed:
+            if bar_id is None or removed_id == bar_id:
+                await response.write(sse('remove', removed_id))
+
+
+def sse(event: str, data: Union[dict, list, str]) -> bytes:
+    """ Format a Server-Sent Event.
+    :param event: The event type.
+    :param data: The event data, which is serialized to JSON.
+    :return: The formatted event.
+    """
+    return f'event: {event}\ndata: {dumps(data, default=json_default)}\n\n'.encode('utf-8')
+
+
+async def watch(app: web.Application) -> None:
+    """ Keep the board updated while the server is alive and wake up the event streams on each change.
+      It uses a MongoDB change stream if it is available, otherwise, it reloads the snapshot periodically.
+    :param app: The web application.
+    """
+    board, cache, collection = app['board'], app['cache'], app['db'][ACTIVE_COLLECTION]
+    change_streams, ids = True, {}
+    while True:
+        version = board.version
+        try:
+            if change_streams:
+                async with collection.watch(full_document='updateLookup') as changes:
+                    ids = {bar['_id']: bar['bar_id'] async for bar in collection.find({}, {'bar_id': 1})}
+                    cache.invalidate()
+                    await cache.get()
+                    async for change in changes:
+                        operation = change['operationType']
+                        if operation in ['insert', 'update', 'replace'] and change.get('fullDocument'):
+                            bar = change['fullDocument']
+                            ids[bar.pop('_id')] = bar['bar_id']
+                            board.put(shared_meter(bar))
+                        elif operation == 'delete' and change['documentKey']['_id'] in ids:
+                            board.remove(ids.pop(change['documentKey']['_id']))
+                        elif operation in ['drop', 'invalidate']:
+                            break
+                        if not heartbeat_only(change):
+                            await notify(app)
+            else:
+                await cache.get()
+                await asyncio.sleep(app['interval'] / 1000 if cache.ttl <= 0 else cache.ttl)
+        except OperationFailure as e:
+            logger.info(f'Change streams are not available ({e}). Reloading the progress bars periodically.')
+            change_streams = False
+        except PyMongoError as e:
+            logger.warning(f'Error watching the progress bars: {e}')
+            await asyncio.sleep(1)
+        if board.version != version:
+            await notify(app)
+
+
+async def notify(app: web.Application) -> None:
+    """ Wake up the event streams.
+    :param app: The web application.
+    """
+    async with app['changed']:
+        app['changed'].notify_all()
+
+
+def create_app(title: str = DEF_TITLE, db_host: str = DEF_DB_HOST, db_port: int = DEF_DB_PORT,
+               replicaset: str = None, db_name: str = DEF_DB_NAME, seconds_interval: int = DEF_INTERVAL * 1000,
+               cache_ttl: float = DEF_CACHE_TTL, checkpoint: float = DEF_CHECKPOINT,
+               retention: float = DEF_RETENTION, stale_timeout: float = DEF_STALE_TIMEOUT) -> web.Application:
+    """ Create the asyncio web application with the same routes, templates and static files than the Flask server.
+    :param title: The web page title.
+    :param db_host: The database host.
+    :param db_port: The database port.
+    :param replicaset: The MongoDB replicaset.
+    :param db_name: The database name.
+    :param seconds_interval: The interval between the web page refreshing.
+    :param cache_ttl: The seconds while the snapshot of the active progress bars is reused by all the clients.
+    :param checkpoint: The seconds between two saves of the progress bars received by the ingest API. If 0, they are
+       only saved when they finish.
+    :param retention: The days while the finished executions are kept. The older ones are compacted into daily rollups
+       each hour. If 0, they are kept forever.
+    :param stale_timeout: The seconds without heartbeat to archive a progress bar as aborted. If 0, they are never
+       archived.
+    :return: The web application.
+    """
+    app = web.Application(middlewares=[measure_request])
+    kwargs: Dict[str, Any] = {'replicaset': replicaset} if replicaset else {}
+    app['db'] = AsyncIOMotorClient(db_host, db_port, **kwargs)[db_name]
+    app['title'], app['interval'], app['board'], app['live'] = title, seconds_interval, BarBoard(), LiveBars()
+    app['stale_timeout'], app['bodies'] = stale_timeout, BodyCache()
+    app['cache'] = AsyncSnapshotCache(app['board'], app['db'], cache_ttl, app['live'])
+
+    async def background(app: web.Application):
+        app['changed'], app['persist'] = asyncio.Condition(), asyncio.Lock()
+        tasks = [asyncio.ensure_future(watch(app))]
+        app['store'] = MongoStore(connect_db(db_host, db_port, replicaset)[db_name])
+        tasks.append(asyncio.ensure_future(migrate_bars(app, MIGRATION_INTERVAL)))
+        if checkpoint > 0:
+            tasks.append(asyncio.ensure_future(save_checkpoints(app, checkpoint)))
+        if retention > 0:
+            tasks.append(asyncio.ensure_future(compact_stats(app, retention)))
+        if stale_timeout > 0:
+            tasks.append(asyncio.ensure_future(reap_bars(app, stale_timeout)))
+        yield
+        for task in tasks:
+            task.cancel()
+        release_db(app['store'].db.client)
+
+    app.cleanup_ctx.append(background)
+    app.router.add_get('/', home)
+    app.router.add_get(BAR_ROUTE + '/{bar_id}', bar_page)
+    app.router.add_get('/health', health)
+    app.router.add_get(METRICS_ROUTE, metrics)
+    app.router.add_get(TQDM_ROUTE, all_tqdm)
+    app.router.add_get(GROUPS_ROUTE, groups)
+    app.router.add_get(TQDM_ROUTE + '/{bar_id}', tqdm)
+    app.router.add_get(TQDM_ROUTE + '/{bar_id}' + HISTORY_ROUTE, history)
+    app.router.add_get(STATS_ROUTE, stats)
+    app.router.add_get(STATS_ROUTE + ROLLUPS_ROUTE, rollups)
+    app.router.add_get(REMOVE_ROUTE + '/{bar_id}', remove)
+    app.router.add_get(STREAM_ROUTE, stream)
+    app.router.add_post(INGEST_ROUTE, ingest)
+    app.router.add_static('/static', join(dirname(__file__), 'static'))
+    return app
+
+
+def start_server(title: str = DEF_TITLE, host: str = DEF_HOST, port: int = DEF_PORT, db_host: str = DEF_DB_HOST,
+                 db_port: int = DEF_DB_PORT, replicaset: str = None, db_name: str = DEF_DB_NAME,
+                 seconds_interval: int = DEF_INTERVAL * 1000, cache_ttl: float = DEF_CACHE_TTL,
+                 checkpoint: float = DEF_CHECKPOINT, retention: float = DEF_RETENTION,
+                 stale_timeout: float = DEF_STALE_TIMEOUT) -> None:
+    """ Start the asyncio server.
+    :param title: The web page title.
+    :param host: The web page host.
+    :param port: The web page port.
+    :param db_host: The database host.
+    :param db_port: The database port.
+    :param replicaset: The MongoDB replicaset.
+    :param db_name: The database name.
+    :param seconds_interval: The interval between the web page refreshing.
+    :param cache_ttl: The seconds while the snapshot of the active progress bars is reused by all the clients.
+    :param checkpoint: The seconds between two saves of the progress bars received by the ingest API. If 0, they are
+       only saved when they finish.
+    :param retention: The days while the finished executions are kept. The older ones are compacted into daily rollups
+       each hour. If 0, they are kept forever.
+    :param stale_timeout: The seconds without heartbeat to archive a progress bar as aborted. If 0, they are never
+       archived.
+    """
+    client = connect_db(db_host, db_port, replicaset)
+    ensure_indexes(client[db_name])
+    migrated = migrate_collections(client[db_name])
+    if migrated:
+        logger.info(f'{migrated} progress bars have been migrated to the collection "{ACTIVE_COLLECTION}".')
+    release_db(client, close=True)
+    web.run_app(create_app(title, db_host, db_port, replicaset, db_name, seconds_interval, cache_ttl, checkpoint,
+                           retention, stale_timeout), host=host, port=port)
@@ -0,0 +1,57 @@
+from importlib import import_module
+from typing import Dict, Type, Any, TYPE_CHECKING
+
+from tqdm.auto import tqdm as auto_tqdm
+
+if TYPE_CHECKING:
+    from dbtqdm.db import DatabaseTqdm
+
+BACKENDS: Dict[str, str] = {
+    'mongo': 'dbtqdm.mongo.mongo:MongoTqdm',
+    'sqlite': 'dbtqdm.sqlite.sqlite:SQLiteTqdm',
+    'shm': 'dbtqdm.shm.shm:ShmTqdm',
+    'http': 'dbtqdm.http.http:HttpTqdm',
+    'agent': 'dbtqdm.agent.agent:AgentTqdm'
+}
+RENAMED_PARAMS = {'n_cols': 'ncols', 'min_interval': 'mininterval', 'max_interval': 'maxinterval',
+                  'dynamic_n_cols': 'dynamic_ncols', 'n_rows': 'nrows'}
+DB_PARAMS = {'database', 'name', 'suffix', 'host', 'port', 'replicaset', 'path', 'slots', 'url', 'asynchronous',
+             'history_interval', 'max_writes', 'shared', 'shard', 'heartbeat'}
+
+
+def register_backend(mode: str, target: str) -> None:
+    """ Register a progress bar backend. It is not imported until a progress bar uses its mode.
+    :param mode: The mode of the progress bars which use this backend.
+    :param target: The backend class as "module:class", for example, "dbtqdm.mongo.mongo:MongoTqdm".
+    """
+    BACKENDS[mode] = target
+
+
+def get_backend(mode: str) -> Type['DatabaseTqdm']:
+    """ Import the progress bar class of a mode.
+    :param mode: The mode.
+    :return: The progress bar class.
+    :raise ValueError: If there is no backend for that mode.
+    """
+    if mode not in BACKENDS:
+        raise ValueError(f'There is no progress bar backend for the mode "{mode}". '
+                         f'Available modes: {["auto"] + list(BACKENDS)}.')
+    module, name = BACKENDS[mode].split(':')
+    return getattr(import_module(module), name)
+
+
+def tqdm(*args, mode: str = None, **kwargs) -> Any:
+    """ Create a progress bar of the given mode, importing only its backend. In mode 'auto', it is a plain tqdm
+      progress bar, the database parameters are ignored and no database module is imported.
+    :param args: The progress bar arguments.
+    :param mode: The progress bar mode. If it is not set, this function will check if there is the environment variable
+       TQDM_MODE. By default, auto.
+    :param kwargs: The progress bar keyword arguments, with the same names than the DatabaseTqdm ones.
+    :return: The progress bar.
+    """
+    from dbtqdm.db import DatabaseTqdm
+    mode = DatabaseTqdm._db_property('mode', mode, 'TQDM_MODE', False, 'auto')
+    if mode == 'auto':
+        return auto_tqdm(*args, **{RENAMED_PARAMS.get(key, key): value for key, value in kwargs.items()
+                                   if key not in DB_PARAMS})
+    return get_backend(mode)(*args, mode=mode, **kwargs)
@@ -0,0 +1,332 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from heapq import merge
+from itertools import takewhile
+from threading import Lock
+from time import time
+from typing import Dict, List, Tuple, Union, Mapping, Callable, Iterator
+from zlib import crc32
+
+from dbtqdm.consts import DEF_PAGE_SIZE, MAX_PAGE_SIZE, DEF_BAR_SORT
+from dbtqdm.utils import pack_cursor, unpack_cursor, iteration_rate, bar_status, without_heartbeat
+
+INF = float('inf')
+STATUSES = ('running', 'finished', 'stale')
+PAGE_PARAMS = ('prefix', 'bar_name', 'suffix', 'status', 'sort', 'after', 'limit')
+ALL_BARS = ('all', '')
+
+Partition = Tuple[str, str]
+Index = List[Tuple[float, str]]
+
+
+class BarBoard(object):
+    """ In-memory and versioned state of the active progress bars. Each change of a progress bar increases the board
+      version, therefore, it is possible to know which progress bars have been created, updated or removed after
+      a given version. The versions are strings with the format "<epoch>.<number>", where the epoch identifies
+      the board instance, so the versions of a previous server execution are never mixed with the current ones.
+      The heartbeats of the progress bars are kept apart, only to know which ones are stale, so they never change the
+      board version nor are sent to the clients.
+    """
+
+    @property
+    def version(self) -> str:
+        """
+        :return: The current version of the board.
+        """
+        return self._token(self._version)
+
+    def __init__(self, max_removed: int = 10000) -> None:
+        """ Constructor.
+        :param max_removed: The maximum number of removed progress bars to remember. If a client asks for the changes
+           since a version older than the oldest remembered removal, then it will receive all the progress bars.
+        """
+        self._epoch = format(int(time() * 1000), 'x')
+        self._version, self._min_version = 0, 0
+        self._bars: Dict[str, dict] = {}
+        self._versions: Dict[str, int] = {}
+        self._heartbeats: Dict[str, float] = {}
+        self._removed: 'OrderedDict[str, int]' = OrderedDict()
+        self._max_removed = max_removed
+        self._indexes: Dict[Partition, Dict[str, Index]] = {}
+        self._names: List[str] = []
+        self._keys: Dict[str, Tuple[Tuple[float, ...], Tuple[Partition, ...]]] = {}
+        self._lock = Lock()
+
+    def update(self, bars: List[dict]) -> str:
+        """ Replace the state of all the progress bars. Only the progress bars which are new or different from
+          the previous state increase the board version.
+        :param bars: The list with all the active progress bars.
+        :return: The board version after the update.
+        """
+        bars = {bar['bar_id']: bar for bar in bars}
+        with self._lock:
+            for bar_id in self._bars.keys() - bars.keys():
+                self._remove(bar_id)
+            for bar in bars.values():
+                self._put(bar)
+            return self._token(self._version)
+
+    def put(self, bar: dict) -> str:
+        """ Create or update a progress bar.
+        :param bar: The progress bar information.
+        :return: The board version after the change.
+        """
+        with self._lock:
+            self._put(bar)
+            return self._token(self._version)
+
+    def remove(self, bar_id: str) -> str:
+        """ Remove a progress bar.
+        :param bar_id: The bar id.
+        :return: The board version after the change.
+        """
+        with self._lock:
+            if bar_id in self._bars:
+                self._remove(bar_id)
+            return self._token(self._version)
+
+    def bars(self) -> List[dict]:
+        """
+        :return: All the active progress bars.
+        """
+        with self._lock:
+            return list(self._bars.values())
+
+    def bar(self, bar_id: str) -> Tuple[Union[dict, None], str]:
+        """ Get a progress bar with the version of its last change.
+        :param bar_id: The bar id.
+        :return: A tuple with the progress bar, or None if it is not active, and the version of its last change.
+        """
+        with self._lock:
+            return self._bars.get(bar_id), self._token(self._versions.get(bar_id, self._removed.get(bar_id, 0)))
+
+    def changes(self, since: str) -> Tuple[List[dict], Union[List[str], None], str]:
+        """ Get the changes after a version.
+        :param since: The version returned by a previous call.
+        :return: A tuple with the list of created or updated progress bars, the list of removed bar ids, and the
+           current board version. If the version is not valid or it is too old, then all the progress bars are returned
+           and the list of removed bar ids is None.
+        """
+        with self._lock:
+            version = self._parse(since)
+            if version is None:
+                return list(self._bars.values()), None, self._token(self._version)
+            bars = [self._bars[bar_id] for bar_id, v in self._versions.items() if v > version]
+            removed = [bar_id for bar_id, v in self._removed.items() if v > version]
+            return bars, removed, self._token(self._version)
+
+    def page(self, prefix: str = None, suffix: str = None, status: str = None, stale_before: float = None,
+             sort: str = DEF_BAR_SORT, after: str = None, limit: int = DEF_PAGE_SIZE, bar_name: str = None
+             ) -> Tuple[List[dict], Union[str, None], str]:
+        """ Get a page of the active progress bars, filtered and sorted. The progress bars are kept sorted by each sort
+          key in the indexes of all the progress bars, of each bar name, of each suffix and of each status, so the page
+          starts with a binary search of the cursor in the index which matches the filters. The prefix is answered by
+          merging the indexes of the bar names in its range, which are found with a binary search too. The stale
+          progress bars depend on the time of the request, so they are filtered while reading the index, like the
+          filters given together with another one which has already chosen the index.
+        :param prefix: If it is given, only the progress bars whose bar name starts with this prefix.
+        :param suffix: If it is given, only the progress bars with this suffix.
+        :param status: If it is given, only the progress bars with this status: "running", "finished" or "stale".
+        :param stale_before: The progress bars whose heartbeat is older than this timestamp are stale. If None, no
+           progress bar is stale.
+        :param sort: The sort key: "progress", "rate", "eta" or "start", with the prefix "-" for descending order.
+        :param after: If it is given, the cursor returned with the previous page.
+        :param limit: The page size.
+        :param bar_name: If it is given, only the progress bars with this bar name, for example, the members of a group.
+        :return: A tuple with the progress bars of the page, each one with its "status", the cursor of the next page,
+           or None if it is the last one, and the current board version.
+        :raise ValueError: If the sort key or the cursor are not valid.
+        """
+        field, descending = sort.lstrip('-'), sort.startswith('-')
+        if field not in SORT_KEYS:
+            raise ValueError(f'The sort key "{sort}" is not valid. It must be one of: {", ".join(SORT_KEYS)}.')
+        key = _page_key(after) if after else None
+        with self._lock:
+            partitions = self._partitions(prefix, suffix, status, bar_name)
+            indexes = [self._indexes[partition][field] for partition in partitions if partition in self._indexes]
+            entries = merge(*(_entries(index, key, descending) for index in indexes), reverse=descending)
+            bars, last = [], None
+            for entry in entries:
+                bar = self._bars[entry[1]]
+                if prefix and not (bar.get('bar_name') or '').startswith(prefix) or \
+                        suffix is not None and (bar.get('suffix') or '') != suffix:
+                    continue
+                current = bar_status(bar, stale_before, self._heartbeats.get(entry[1]))
+                if status and current != status:
+                    continue
+                if len(bars) == limit:
+                    return bars, pack_cursor(last), self._token(self._version)
+                bars.append(dict(bar, status=current))
+                last = entry
+            return bars, None, self._token(self._version)
+
+    def _partitions(self, prefix: Union[str, None], suffix: Union[str, None], status: Union[str, None],
+                    bar_name: Union[str, None]) -> List[Partition]:
+        """ Choose the partitions whose indexes contain the progress bars of a page: the one of the bar name, the ones
+          of the bar names which start with the prefix, the one of the suffix, the one of the status or, if there are
+          no filters or only the stale status is requested, the one of all the progress bars. The lock must be held.
+        """
+        if bar_name is not None:
+            return [('bar_name', bar_name)]
+        if prefix:
+            names = takewhile(lambda name: name.startswith(prefix), self._names[bisect_left(self._names, prefix):])
+            return [('bar_name', name) for name in names]
+        if suffix is not None:
+            return [('suffix', suffix)]
+        return [('status', status)] if status and status != 'stale' else [ALL_BARS]
+
+    def _index(self, bar_id: str, bar: Union[dict, None]) -> None:
+        """ Move a progress bar to its position in the sorted indexes of all the progress bars, of its bar name, of its
+          suffix and of its status, with a binary search. Only the entries whose sort value or partition have changed
+          are moved, and the empty partitions are removed. The bar names with a partition are kept sorted to find the
+          ones of a prefix. The lock must be held.
+        :param bar_id: The bar id.
+        :param bar: The progress bar information or None to remove it from the indexes.
+        """
+        old_keys, old_partitions = self._keys.pop(bar_id, ((), ()))
+        new_keys, new_partitions = (), ()
+        if bar is not None:
+            new_keys = tuple(function(bar) for function in SORT_KEYS.values())
+            new_partitions = (ALL_BARS, ('bar_name', bar.get('bar_name') or ''), ('suffix', bar.get('suffix') or ''),
+                              ('status', bar_status(bar)))
+            self._keys[bar_id] = (new_keys, new_partitions)
+        for partition in dict.fromkeys(old_partitions + new_partitions):
+            if partition not in self._indexes:
+                self._indexes[partition] = {field: [] for field in SORT_KEYS}
+                if partition[0] == 'bar_name':
+                    insort(self._names, partition[1])
+            indexes = self._indexes[partition]
+            for position, field in enumerate(SORT_KEYS):
+                old = (old_keys[position], bar_id) if partition in old_partitions else None
+                new = (new_keys[position], bar_id) if partition in new_partitions else None
+                if old != new:
+                    if old is not None:
+                        del indexes[field][bisect_left(indexes[field], old)]
+                    if new is not None:
+                        insort(indexes[field], new)
+            if not indexes[DEF_BAR_SORT.lstrip('-')]:
+                del self._indexes[partition]
+                if partition[0] == 'bar_name':
+                    del self._names[bisect_left(self._names, partition[1])]
+
+    def _put(self, bar: dict) -> None:
+        """ Store a progress bar with a new version if it is new or different from the stored one, without its
+          heartbeat, which is kept apart. The lock must be held.
+        """
+        bar_id = bar['bar_id']
+        if bar.get('heartbeat') is not None:
+            self._heartbeats[bar_id] = bar['heartbeat']
+        else:
+            self._heartbeats.pop(bar_id, None)
+        bar = without_heartbeat(bar)
+        if self._bars.get(bar_id) == bar:
+            return
+        self._version += 1
+        self._index(bar_id, bar)
+        self._bars[bar_id] = bar
+        self._versions[bar_id] = self._version
+        self._removed.pop(bar_id, None)
+
+    def _remove(self, bar_id: str) -> None:
+        """ Remove a progress bar, remembering the version of the removal. The lock must be held. """
+        self._version += 1
+        del self._bars[bar_id], self._versions[bar_id]
+        self._heartbeats.pop(bar_id, None)
+        self._index(bar_id, None)
+        self._removed[bar_id] = self._version
+        while len(self._removed) > self._max_removed:
+            _, self._min_version = self._removed.popitem(last=False)
+
+    def _token(self, version: int) -> str:
+        """ Convert a version number into a version string. """
+        return f'{self._epoch}.{version}'
+
+    def _parse(self, token: str) -> Union[int, None]:
+        """ Convert a version string into a version number.
+        :return: The version number or None if it is not valid, it belongs to other board or it is too old.
+        """
+        epoch, _, version = (token or '').partition('.')
+        if epoch != self._epoch or not version.isdigit() or int(version) < self._min_version:
+            return None
+        return int(version) if int(version) <= self._version else None
+
+
+def _entries(index: Index, key: Union[Tuple[float, str], None], descending: bool) -> Iterator[Tuple[float, str]]:
+    """ Read a sorted index after a cursor, found with a binary search.
+    :param index: The index.
+    :param key: The sort value and bar id of the cursor, or None to read it from the start.
+    :param descending: True to read it in descending order.
+    :return: The iterator of the index entries.
+    """
+    if key is None:
+        positions = range(len(index) - 1, -1, -1) if descending else range(len(index))
+    elif descending:
+        positions = range(bisect_left(index, key) - 1, -1, -1)
+    else:
+        positions = range(bisect_right(index, key), len(index))
+    return (index[position] for position in positions)
+
+
+def _progress(bar: dict) -> float:
+    """ The fraction of the iterations already done, or 0 if the total is unknown. """
+    return bar.get('n', 0) / bar['total'] if bar.get('total') else 0
+
+
+def _eta(bar: dict) -> float:
+    """ The remaining seconds, or infinite if they are unknown. """
+    return bar.get('remaining') or 0 if bar.get('rate') and bar.get('total') else INF
+
+
+def _start(bar: dict) -> float:
+    """ The start timestamp. """
+    return bar.get('start') or 0
+
+
+SORT_KEYS: Dict[str, Callable[[dict], float]] = {
+    'progress': _progress, 'rate': iteration_rate, 'eta': _eta, 'start': _start
+}
+
+
+def _page_key(cursor: str) -> Tuple[float, str]:
+    """ Read the sort value and bar id of a cursor returned by BarBoard.page(). """
+    key = unpack_cursor(cursor)
+    if len(key) != 2 or not isinstance(key[0], (int, float)) or not isinstance(key[1], str):
+        raise ValueError(f'The cursor "{cursor}" is not valid.')
+    return key[0], key[1]
+
+
+def page_params(args: Mapping[str, str]) -> Union[dict, None]:
+    """ Read the parameters to get a page of active progress bars: "prefix" of the bar name, "bar_name", "suffix",
+      "status" ("running", "finished" or "stale"), "sort" ("progress", "rate", "eta" or "start", with the prefix "-"
+      for descending order, "-start" by default), "after" with the cursor of the previous page and "limit" (50 by
+      default and 1000 at most).
+    :param args: The query string arguments.
+    :return: The keyword arguments of BarBoard.page() or None if none of these parameters is given.
+    :raise ValueError: If any parameter is not valid.
+    """
+    if not any(args.get(name) is not None for name in PAGE_PARAMS):
+        return None
+    status, sort = args.get('status') or None, args.get('sort') or DEF_BAR_SORT
+    if status is not None and status not in STATUSES:
+        raise ValueError(f'The status "{status}" is not valid. It must be one of: {", ".join(STATUSES)}.')
+    if sort.lstrip('-') not in SORT_KEYS:
+        raise ValueError(f'The sort key "{sort}" is not valid. It must be one of: {", ".join(SORT_KEYS)}.')
+    if args.get('after'):
+        _page_key(args['after'])
+    try:
+        limit = min(max(int(args['limit']), 1), MAX_PAGE_SIZE) if args.get('limit') else DEF_PAGE_SIZE
+    except ValueError:
+        raise ValueError(f'The parameter "limit" must be an integer, not "{args["limit"]}".')
+    return {'prefix': args.get('prefix') or None, 'bar_name': args.get('bar_name'), 'suffix': args.get('suffix'),
+            'status': status, 'sort': sort, 'after': args.get('after') or None, 'limit': limit}
+
+
+def page_etag(version: str, params: dict, bars: List[dict]) -> str:
+    """ Create the ETag of a page of active progress bars. It changes when the board version, the page parameters or
+      the status of any progress bar of the page change, because a progress bar can become stale without any change.
+    :param version: The board version.
+    :param params: The page parameters returned by page_params().
+    :param bars: The progress bars of the page.
+    :return: The ETag.
+    """
+    return f'{version}-{crc32(repr((sorted(params.items()), [bar["status"] for bar in bars])).encode()):08x}'
@@ -1,5 +1,28 @@
-DEF_TITLE, DEF_INTERVAL = 'Process monitors', 5
+from os.path import isdir, join
+from tempfile import gettempdir
+
+DEF_TITLE, DEF_INTERVAL, DEF_CACHE_TTL = 'Process monitors', 5, 1.0
 DEF_HOST, DEF_PORT = 'localhost', 5000
 DEF_DB_TYPE, DEF_DB_HOST, DEF_DB_PORT, DEF_DB_NAME = 'mongo', 'localhost', 27017, 'tqdm'
-DB_TYPES = ['mongo']
-STATS_COLLECTION = '_stats_'
+DB_TYPES = ['mongo', 'sqlite', 'shm']
+DEF_DB_PATH, DEF_DB_TIMEOUT = 'tqdm.db', 30.0
+DEF_SHM_PATH, DEF_SHM_SLOTS = join('/dev/shm' if isdir('/dev/shm') else gettempdir(), 'tqdm.slots'), 1024
+STATS_COLLECTION, ACTIVE_COLLECTION, HISTORY_COLLECTION = '_stats_', '_active_', '_history_'
+ROLLUP_COLLECTION = '_rollups_'
+TQDM_ROUTE, BAR_ROUTE, STATS_ROUTE, REMOVE_ROUTE, STREAM_ROUTE = '/tqdm', '/bar', '/stats', '/remove', '/stream'
+HISTORY_ROUTE, INGEST_ROUTE, METRICS_ROUTE, ROLLUPS_ROUTE = '/history', '/ingest', '/metrics', '/rollups'
+GROUPS_ROUTE = '/groups'
+KEEP_ALIVE = 15
+SERVER_MODES, DEF_SERVER_MODE = ['flask', 'async'], 'flask'
+DEF_HISTORY_INTERVAL, HISTORY_SIZE, DEF_HISTORY_POINTS = 1.0, 1000, 200
+DEF_BATCH_WINDOW = 0.05
+DEF_CHECKPOINT, DEF_URL, DEF_HTTP_TIMEOUT = 60.0, f'http://{DEF_HOST}:{DEF_PORT}', 10.0
+DEF_STATS_LIMIT, MAX_STATS_LIMIT = 100, 1000
+DEF_PAGE_SIZE, MAX_PAGE_SIZE, DEF_BAR_SORT = 50, 1000, '-start'
+JSON_TYPE, MSGPACK_TYPE = 'application/json', 'application/msgpack'
+COLUMNAR_TYPE = 'application/vnd.dbtqdm.columnar+json'
+MIN_COMPRESS_SIZE = 1024
+DEF_RETENTION, MAINTENANCE_INTERVAL, MIGRATION_INTERVAL = 0, 3600, 10.0
+COMPACTION_TIMEOUT, MAX_COMPACTION_IDS = 3600, 100
+DEF_HEARTBEAT, DEF_STALE_TIMEOUT = 30.0, 300.0
+DEF_SOCKET, DEF_AGENT_WINDOW, AGENT_DB_TYPES = join(gettempdir(), 'dbtqdm.sock'), 0.5, ['mongo', 'sqlite', 'http']
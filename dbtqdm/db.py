@@ -2,18 +2,60 @@ from abc import ABC, ABCMeta, abstractmethod
 from io import TextIOWrapper, StringIO
 from typing import Iterable, Union, Any, Tuple, List
 from os import environ
-from datetime import datetime, timedelta
+from datetime import datetime
+from threading import Lock
+from time import monotonic, perf_counter
 
 from tqdm.auto import tqdm
 
+from dbtqdm.backends import BACKENDS
 from dbtqdm.consts import DEF_DB_NAME
-from dbtqdm.utils import format_interval
+from dbtqdm.metrics import registry, Gauge, save_seconds, write_failures, skipped_updates, start_metrics_server
+from dbtqdm.utils import meter_stats
 
 
 class EnvironError(Exception):
     pass
 
 
+class WriteBudget(object):
+    """ Process-wide budget of database writes per second, which is shared fairly among the active progress bars. """
+
+    @property
+    def bars(self) -> int:
+        """
+        :return: The number of active progress bars in this process.
+        """
+        return self._bars
+
+    def __init__(self) -> None:
+        """ Constructor. """
+        self._bars, self._lock = 0, Lock()
+
+    def register(self) -> None:
+        """ Add an active progress bar. """
+        with self._lock:
+            self._bars += 1
+
+    def unregister(self) -> None:
+        """ Remove an active progress bar. """
+        with self._lock:
+            self._bars = max(self._bars - 1, 0)
+
+    def interval(self, writes_per_second: float) -> float:
+        """ Calculate the minimum seconds between two writes of the same progress bar.
+        :param writes_per_second: The maximum number of writes per second of the whole process. If 0 or None, there is
+           no limit.
+        :return: The minimum seconds between two writes of each progress bar.
+        """
+        return max(self._bars, 1) / writes_per_second if writes_per_second else 0
+
+
+budget = WriteBudget()
+registry.register(Gauge('dbtqdm_active_bars', 'Active progress bars of this process which are not in mode auto.',
+                        function=lambda: budget.bars))
+
+
 class DatabaseTqdm(tqdm, ABC):
     """ Class to create a TQDM process bar based on MongoDB. """
     __metaclass__ = ABCMeta
@@ -21,7 +63,8 @@ class DatabaseTqdm(tqdm, ABC):
     @property
     def mode(self) -> str:
         """
-        :return: The TQDM mode. 'auto' for normal tqdm auto mode or 'mongo' to use MongoDB database.
+        :return: The TQDM mode. 'auto' for normal tqdm auto mode, 'mongo' to use MongoDB database or 'sqlite' to use
+           a SQLite database file.
         """
         return self._mode
 
@@ -68,7 +111,8 @@ class DatabaseTqdm(tqdm, ABC):
                  initial: Union[int, float] = 0, position: int = None, postfix: Union[dict, Any] = None,
                  unit_divisor: float = 1000, write_bytes: bool = None, lock_args: Tuple = None,
                  n_rows: int = None, colour: str = None, delay: float = 0, gui: bool = False,
-                 mode: str = 'auto', database: str = 'tqdm', name: str = None, suffix: str = None, **kwargs) -> None:
+                 mode: str = 'auto', database: str = 'tqdm', name: str = None, suffix: str = None,
+                 max_writes: float = None, **kwargs) -> None:
         """
         :param iterable: Iterable to decorate with a progressbar. Leave blank to manually manage the updates.
         :param desc: Prefix for the progressbar.
@@ -127,8 +171,9 @@ class DatabaseTqdm(tqdm, ABC):
         :param delay: Don't display until [default: 0] seconds have elapsed.
         :param gui: WARNING: internal parameter - do not use. Use tqdm.gui.tqdm(...) instead.
             If set, will attempt to use matplotlib animations for a graphical output [default: False].
-        :param mode: Two modes: auto (normal tqdm behavior), or mongo (using MongoDB as bar progress).
-            If it is not set, this function will check if there is the environment variable TQDM_MODE. By default, auto.
+        :param mode: Three modes: auto (normal tqdm behavior), mongo (using MongoDB as bar progress) or sqlite (using
+            a SQLite database file as bar progress). If it is not set, this function will check if there is the
+            environment variable TQDM_MODE. By default, auto.
         :param database: The database name. By default, tqdm.
         :param bar_name: Only for mode 'mongo'. The bar progress name. If it is not set, this function will check if
            there is the environment variable TQDM_NAME. If it is not given, neither parameter o environment variable,
@@ -136,14 +181,21 @@ class DatabaseTqdm(tqdm, ABC):
         :param suffix: Only for mode 'mongo'. If it is set, the name is form concatenating the bar name with this suffix
            (name + suffix). This method will use when the bar name is given by environment variable instead of
            constructor parameter, in order to have several bar progress for the same name.
+        :param max_writes: Not for mode 'auto'. The maximum number of database writes per second of the whole process,
+           which is shared fairly among all its active progress bars. The changes are only written if the position,
+           total, description, postfix or colour have changed, but the first and the final state are always written.
+           If it is not set, this function will check if there is the environment variable TQDM_MAX_WRITES.
+           By default, there is no limit.
 
         :return:  decorated iterator.
         """
+        self._last_write, self._last_state, self._registered = None, None, False
+        self._max_writes = float(self._db_property('max_writes', max_writes, 'TQDM_MAX_WRITES', default=0))
         self._mode = self._db_property('mode', mode, 'TQDM_MODE', False, 'auto')
-        if self._mode not in ['auto', 'mongo']:
+        if self._mode != 'auto' and self._mode not in BACKENDS:
             raise EnvironError(f'The environment variable TQDM_MODE cannot be "{self._mode}". '
-                               f'The available values are: "auto" or "mongo".')
-        if self.mode == 'mongo':
+                               f'The available values are: auto, {", ".join(BACKENDS)}.')
+        if self.mode != 'auto':
             try:
                 self._database = self._db_property('db', database, 'TQDM_DB', default=DEF_DB_NAME)
                 self._bar_name = self._db_property('name', name, 'TQDM_NAME', required=True)
@@ -152,6 +204,11 @@ class DatabaseTqdm(tqdm, ABC):
                 raise EnvironError(f'To use the mode "{self.__name__}" for tqdm progress bar, '
                                    f'it is necessary to define the following environment variable: {e.args[0]}')
         self._start = datetime.timestamp(datetime.now())
+        if self._mode != 'auto':
+            budget.register()
+            self._registered = True
+            if environ.get('TQDM_METRICS_PORT'):
+                start_metrics_server(int(environ['TQDM_METRICS_PORT']))
         super(DatabaseTqdm, self).__init__(iterable=iterable, desc=desc, total=total, leave=leave, file=file,
                                            ncols=n_cols, mininterval=min_interval, maxinterval=max_interval,
                                            miniters=miniters, ascii=ascii, disable=disable, unit=unit,
@@ -162,7 +219,9 @@ class DatabaseTqdm(tqdm, ABC):
 
     def close(self) -> None:
         """ Close the TQDM bar progress. """
-        if self._mode == 'mongo':
+        if not hasattr(self, '_start'):  # The constructor has failed
+            return
+        if self._mode != 'auto':
             bar_name, suffix, start = self.bar_name, self.suffix, self._start
             meter = self.meter_dict(**self.format_dict)
             meter['bar_name'], meter['suffix'], meter['start_time'] = bar_name, suffix, start
@@ -172,6 +231,9 @@ class DatabaseTqdm(tqdm, ABC):
             meter['finished'] = True
             meter['bar_id'] = self.bar_id
             self.close_bar(meter)
+        if self._registered:
+            budget.unregister()
+            self._registered = False
         super(DatabaseTqdm, self).close()
 
     @abstractmethod
@@ -194,7 +256,31 @@ class DatabaseTqdm(tqdm, ABC):
         self.format_dict['bar_name'] = self.bar_name
         self.format_dict['suffix'] = self.suffix
         self.format_dict['colour'] = self.colour
-        self.save_changes()
+        if self._must_write():
+            start = perf_counter()
+            try:
+                self.save_changes()
+            except Exception:
+                write_failures.inc(self._mode)
+                raise
+            save_seconds.observe(perf_counter() - start, self._mode)
+        return True
+
+    def _must_write(self) -> bool:
+        """ Check if the current state of the progress bar has to be written into the database. It is not written if
+          the visible state has not changed or if the progress bar has exceeded its share of the process write budget.
+          However, the first state and the final state are always written.
+        :return: True if the state has to be written, otherwise False.
+        """
+        state = (self.n, self.total, self.desc, self.postfix, self.colour)
+        if state == self._last_state:
+            skipped_updates.inc('unchanged')
+            return False
+        now, final = monotonic(), self.total is not None and self.n >= self.total
+        if self._last_write is not None and not final and now - self._last_write < budget.interval(self._max_writes):
+            skipped_updates.inc('budget')
+            return False
+        self._last_write, self._last_state = now, state
         return True
 
     @abstractmethod
@@ -244,34 +330,8 @@ class DatabaseTqdm(tqdm, ABC):
         :return: All dictionary with all the information about the meter, ready to do a representation display.
         """
 
-        # sanity check: total
-        total = None if total and n >= (total + 0.5) else total  # allow float imprecision (#849)
-
-        # apply custom scale if necessary
-        if unit_scale and unit_scale not in (True, 1):
-            total = total * unit_scale if total else total
-            n *= unit_scale
-            rate = rate * unit_scale if rate else rate  # by default rate = self.avg_dn / self.avg_dt
-
-        elapsed_str = format_interval(elapsed) if elapsed else '0s'
-
-        # if unspecified, attempt to use rate = average speed
-        # (we allow manual override since predicting time is an arcane art)
-        rate = (n - initial) / elapsed if rate is None and elapsed else rate
-        remaining = (total - n) / rate if rate and total else 0
-        rate, primary_unit, secondary_unit = (1 / rate, 's', unit) if rate and rate <= 1 else (rate, unit, 's')
-        remaining_str = format_interval(remaining) if rate else '?'
-        percentage = 100 * n / total if total else 0
         postfix = postfix if postfix else ''
-        try:
-            eta = datetime.now() + timedelta(seconds=remaining) if rate and total else datetime.utcfromtimestamp(0)
-        except OverflowError:
-            eta = datetime.max
-
         return dict(
-            n=n, initial=initial, total=total, unit=unit, primary_unit=primary_unit, secondary_unit=secondary_unit,
-            unit_scale=unit_scale, unit_divisor=unit_divisor,
-            rate=rate, elapsed=elapsed, elapsed_str=elapsed_str, remaining=remaining, remaining_str=remaining_str,
-            eta=eta, percentage=percentage, desc=prefix + postfix, colour=colour,
-            bar_name=self.bar_name, suffix=self.suffix, start=self._start, finished=False,
-            start_time_str=datetime.utcfromtimestamp(self._start), **extra_kwargs)
+            meter_stats(n, total, elapsed, unit, unit_scale, rate, unit_divisor, initial), desc=prefix + postfix,
+            colour=colour, bar_name=self.bar_name, suffix=self.suffix, bar_id=self.bar_id, start=self._start,
+            finished=False, start_time_str=datetime.utcfromtimestamp(self._start), **extra_kwargs)
@@ -0,0 +1,108 @@
+from logging import getLogger
+from queue import Queue, Full
+from threading import Thread, Lock
+from time import sleep
+from typing import Dict, List, Set, Any
+
+from dbtqdm.store import BarStore, ChangesNotAvailable, SNAPSHOT_EVENT, BAR_EVENT, REMOVE_EVENT
+from dbtqdm.utils import without_heartbeat
+
+logger = getLogger(__name__)
+
+
+class BarFeed(Thread):
+    """ Daemon thread which watches the active progress bars and notifies each change to the subscribers.
+      It uses the database changes if they are available, like MongoDB change streams, otherwise, it reads all the
+      active progress bars periodically and only notifies the progress bars which have been changed or removed.
+      In both cases, the database load does not depend on the number of subscribers.
+    """
+
+    def __init__(self, store: BarStore, interval: float = 1, change_streams: bool = True,
+                 max_events: int = 1000) -> None:
+        """ Constructor.
+        :param store: The store with the active progress bars.
+        :param interval: The seconds between two reads of the progress bars when the changes are not available.
+        :param change_streams: If False, do not try to use the database changes.
+        :param max_events: Maximum number of pending events for each subscriber. If a subscriber exceeds this number,
+           its pending events are replaced by a snapshot event.
+        """
+        super(BarFeed, self).__init__(name='dbtqdm-feed', daemon=True)
+        self._store, self._interval = store, interval
+        self._change_streams, self._max_events = change_streams, max_events
+        self._subscribers: Set[Queue] = set()
+        self._bars: Dict[str, dict] = {}
+        self._lock = Lock()
+
+    def subscribe(self) -> Queue:
+        """ Subscribe to the progress bar changes.
+        :return: The queue where the events will be received. Each event is a tuple with the event type
+           ('snapshot', 'bar' or 'remove') and its data.
+        """
+        queue = Queue(self._max_events)
+        with self._lock:
+            self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: Queue) -> None:
+        """ Stop receiving the progress bar changes.
+        :param queue: The queue obtained by subscribe().
+        """
+        with self._lock:
+            self._subscribers.discard(queue)
+
+    def snapshot(self) -> List[dict]:
+        """
+        :return: The current state of all the active progress bars.
+        """
+        return self._store.active()
+
+    def run(self) -> None:
+        """ Watch the progress bar changes while the server is alive. """
+        while True:
+            try:
+                if self._change_streams:
+                    self._watch()
+                else:
+                    self._tail()
+            except ChangesNotAvailable as e:
+                logger.info(f'The progress bar changes are not available ({e}). Reading the progress bars each '
+                            f'{self._interval} seconds.')
+                self._change_streams = False
+            except Exception as e:
+                logger.warning(f'Error watching the progress bars: {e}')
+                sleep(self._interval)
+
+    def _watch(self) -> None:
+        """ Notify the changes notified by the database. """
+        for event, data in self._store.changes():
+            self.publish(event, data)
+
+    def _tail(self) -> None:
+        """ Notify the changes reading all the active progress bars periodically. The heartbeats are ignored, because
+          they are written periodically even if the progress bars have not changed.
+        """
+        while True:
+            bars = {bar['bar_id']: without_heartbeat(bar) for bar in self.snapshot()}
+            for bar_id, bar in bars.items():
+                if self._bars.get(bar_id) != bar:
+                    self.publish(BAR_EVENT, bar)
+            for bar_id in self._bars.keys() - bars.keys():
+                self.publish(REMOVE_EVENT, bar_id)
+            self._bars = bars
+            sleep(self._interval)
+
+    def publish(self, event: str, data: Any) -> None:
+        """ Send an event to all the subscribers. If a subscriber is not able to receive more events,
+          its pending events are discarded and replaced by a snapshot event.
+        :param event: The event type.
+        :param data: The event data.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for queue in subscribers:
+            try:
+                queue.put_nowait((event, data))
+            except Full:
+                with queue.mutex:
+                    queue.queue.clear()
+                queue.put_nowait((SNAPSHOT_EVENT, None))
@@ -0,0 +1,9 @@
+from .http import HttpTqdm as tqdm
+
+
+def __getattr__(name: str):
+    """ Import the client only when it is used. """
+    if name in ['IngestClient', 'IngestError', 'connect']:
+        from . import client
+        return getattr(client, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,98 @@
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from json import dumps
+from os import getpid
+from threading import Lock
+from typing import Dict, Union, Iterable
+from urllib.parse import urlsplit
+
+from dbtqdm.consts import DEF_URL, DEF_HTTP_TIMEOUT, INGEST_ROUTE
+
+
+class IngestError(Exception):
+    """ The server has rejected the progress bar updates. """
+    pass
+
+
+class IngestClient(object):
+    """ Persistent keep-alive connection with the ingest API of a dbtqdm server, shared by all the progress bars of
+      the process. It can be used as target of the background writer, which sends the updates of all the progress bars
+      in a single request.
+    """
+
+    @property
+    def url(self) -> str:
+        """
+        :return: The server URL.
+        """
+        return self._url
+
+    def __init__(self, url: str = DEF_URL, timeout: float = DEF_HTTP_TIMEOUT) -> None:
+        """ Constructor.
+        :param url: The server URL, for example, http://localhost:5000.
+        :param timeout: The seconds to wait for the server.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ['http', 'https'] or not parts.hostname:
+            raise ValueError(f'The server URL "{url}" is not valid.')
+        self._url, self._timeout = url, timeout
+        self._connection_class = HTTPSConnection if parts.scheme == 'https' else HTTPConnection
+        self._host, self._port, self._path = parts.hostname, parts.port, parts.path.rstrip('/') + INGEST_ROUTE
+        self._connection: Union[HTTPConnection, None] = None
+        self._lock = Lock()
+
+    def bulk_write(self, updates: Iterable[dict], ordered: bool = False) -> int:
+        """ Send several progress bar updates in a single request. If the connection has been closed by the server,
+          it is opened again and the request is repeated once.
+        :param updates: The progress bar updates.
+        :param ordered: Ignored, the updates are always applied in order. It exists to be used as target of
+           the background writer.
+        :return: The number of sent updates.
+        :raise IngestError: If the server rejects the updates.
+        """
+        updates = list(updates)
+        body = dumps({'bars': updates}).encode('utf-8')
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._connection is None:
+                        self._connection = self._connection_class(self._host, self._port, timeout=self._timeout)
+                    self._connection.request('POST', self._path, body, {'Content-Type': 'application/json'})
+                    response = self._connection.getresponse()
+                    data = response.read()
+                    break
+                except (HTTPException, OSError):
+                    self.close()
+                    if attempt:
+                        raise
+        if response.status != 200:
+            raise IngestError(f'The server "{self._url}" has rejected the progress bar updates with the status '
+                              f'{response.status}: {data.decode("utf-8", "ignore")}')
+        return len(updates)
+
+    def close(self) -> None:
+        """ Close the connection. It will be opened again with the next request. """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+_clients: Dict[str, IngestClient] = {}
+_pid = getpid()
+_lock = Lock()
+
+
+def connect(url: str = DEF_URL, timeout: float = DEF_HTTP_TIMEOUT) -> IngestClient:
+    """ Get the client of a server. The clients are shared in the same process by URL. After a fork, the child process
+      creates its own clients, because the connections cannot be shared.
+    :param url: The server URL.
+    :param timeout: The seconds to wait for the server.
+    :return: The server client.
+    """
+    global _pid
+    with _lock:
+        if _pid != getpid():
+            _clients.clear()
+            _pid = getpid()
+        if url not in _clients:
+            _clients[url] = IngestClient(url, timeout)
+        return _clients[url]
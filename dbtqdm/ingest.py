@@ -0,0 +1,132 @@
+from math import isfinite
+from threading import Lock
+from time import time
+from typing import Dict, List, Tuple, Set, Union
+
+from dbtqdm.utils import expand_bar
+
+
+NUMBER_FIELDS = ('n', 'elapsed', 'initial', 'unit_divisor', 'start', 'end')
+OPTIONAL_NUMBER_FIELDS = ('total', 'rate')
+TEXT_FIELDS = ('suffix', 'unit')
+OPTIONAL_TEXT_FIELDS = ('desc', 'colour')
+
+
+def check_update(update: dict) -> None:
+    """ Check the fields of a progress bar update received by the ingest API.
+    :param update: The progress bar update.
+    :raise ValueError: If it does not contain the bar name or any field has a wrong type.
+    """
+    if not isinstance(update, dict) or not isinstance(update.get('bar_name'), str):
+        raise ValueError('Each progress bar update must contain its "bar_name".')
+    for field, value in update.items():
+        if field in NUMBER_FIELDS + OPTIONAL_NUMBER_FIELDS:
+            valid = _number(value) or value is None and field in OPTIONAL_NUMBER_FIELDS
+        elif field in TEXT_FIELDS + OPTIONAL_TEXT_FIELDS:
+            valid = isinstance(value, str) or value is None and field in OPTIONAL_TEXT_FIELDS
+        elif field == 'unit_scale':
+            valid = isinstance(value, bool) or _number(value)
+        else:
+            continue
+        if not valid:
+            raise ValueError(f'The field "{field}" of the progress bar "{update["bar_name"]}" is not valid: {value!r}.')
+
+
+def _number(value: object) -> bool:
+    """ Check if a value is a finite number. """
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and isfinite(value)
+
+
+class LiveBars(object):
+    """ Progress bars reported directly to the server through its ingest API. Their state is only kept in the server
+      memory, and it is saved into the database when they finish or, periodically, in the checkpoints.
+    """
+
+    def __init__(self) -> None:
+        """ Constructor. """
+        self._bars: Dict[str, dict] = {}
+        self._expanded: Dict[str, dict] = {}
+        self._dirty: Set[str] = set()
+        self._lock = Lock()
+
+    def update(self, updates: List[dict]) -> Tuple[List[dict], List[dict]]:
+        """ Merge several progress bar updates. Each update contains the bar_name and suffix of the progress bar, and
+          the basic fields which have changed: n, total, elapsed, rate, initial, unit, unit_scale, unit_divisor, desc,
+          colour, start and, if the progress bar has finished, finished and end. The finished progress bars are
+          forgotten. The updates are applied all or none: if any of them is not valid, none is applied. The time of the
+          last update of each progress bar is its heartbeat, which is saved with it in the checkpoints.
+        :param updates: The progress bar updates.
+        :return: A tuple with the list of the updated progress bars and the list of the finished ones.
+        :raise ValueError: If an update does not contain the bar name or any field has a wrong type.
+        """
+        for update in updates:
+            check_update(update)
+        with self._lock:
+            staged: Dict[str, Union[Tuple[dict, dict], None]] = {}
+            finished = []
+            for update in updates:
+                bar_id = update['bar_name'] + (update.get('suffix') or '')
+                if bar_id in staged:
+                    bar = dict(staged[bar_id][0]) if staged[bar_id] else {}
+                else:
+                    bar = dict(self._bars.get(bar_id, {}))
+                bar.update(update)
+                try:
+                    expanded = expand_bar(bar)
+                except (TypeError, ValueError, OverflowError, OSError) as e:
+                    raise ValueError(f'The progress bar "{bar_id}" is not valid: {e}')
+                if expanded['finished']:
+                    staged[bar_id] = None
+                    finished.append(expanded)
+                else:
+                    staged[bar_id] = (bar, expanded)
+            updated, now = [], time()
+            for bar_id, state in staged.items():
+                if state is None:
+                    self._forget(bar_id)
+                else:
+                    self._bars[bar_id], self._expanded[bar_id] = state[0], dict(state[1], heartbeat=now)
+                    self._dirty.add(bar_id)
+                    updated.append(self._expanded[bar_id])
+        return updated, finished
+
+    def bars(self) -> List[dict]:
+        """
+        :return: All the active progress bars.
+        """
+        with self._lock:
+            return list(self._expanded.values())
+
+    def remove(self, bar_id: str) -> bool:
+        """ Forget an active progress bar. If it is still alive, it will appear again with its next update.
+        :param bar_id: The bar id.
+        :return: True if the progress bar has been removed, False if it does not exist.
+        """
+        with self._lock:
+            return self._forget(bar_id)
+
+    def expire(self, before: float) -> List[dict]:
+        """ Forget the progress bars which have not been updated since a timestamp, because their process has probably
+          died without finishing them.
+        :param before: The timestamp.
+        :return: The expired progress bars.
+        """
+        with self._lock:
+            expired = [bar for bar in self._expanded.values() if bar['heartbeat'] < before]
+            for bar in expired:
+                self._forget(bar['bar_id'])
+        return expired
+
+    def dirty(self) -> List[dict]:
+        """ Get the progress bars which have changed since the previous call.
+        :return: The changed progress bars.
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return [self._expanded[bar_id] for bar_id in dirty if bar_id in self._expanded]
+
+    def _forget(self, bar_id: str) -> bool:
+        """ Forget a progress bar. The lock must be held. """
+        self._dirty.discard(bar_id)
+        self._expanded.pop(bar_id, None)
+        return self._bars.pop(bar_id, None) is not None
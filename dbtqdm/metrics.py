@@ -0,0 +1,263 @@
+from bisect import bisect_left
+from threading import Lock, Thread
+from typing import Dict, List, Tuple, Callable, Sequence, Any
+
+from dbtqdm.consts import METRICS_ROUTE
+
+DEF_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+Labels = Tuple[str, ...]
+
+
+class Metric(object):
+    """ A metric with optional labels, which is rendered in the Prometheus text format. """
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        """ Constructor.
+        :param name: The metric name.
+        :param documentation: The metric description.
+        :param labels: The label names.
+        """
+        self.name, self.documentation, self.label_names = name, documentation, tuple(labels)
+        self._lock = Lock()
+
+    def render(self) -> List[str]:
+        """
+        :return: The lines of this metric in the Prometheus text format.
+        """
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}'] + self._samples()
+
+    def _samples(self) -> List[str]:
+        """
+        :return: The sample lines of this metric.
+        """
+        return []
+
+    def _labels(self, values: Labels, extra: str = '') -> str:
+        """ Format the labels of a sample.
+        :param values: The label values.
+        :param extra: An extra formatted label, like the bucket bound of a histogram.
+        :return: The formatted labels or an empty string if there are no labels.
+        """
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, values)]
+        pairs += [extra] if extra else []
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter(Metric):
+    """ A counter which only increases. """
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        """ Constructor.
+        :param name: The metric name.
+        :param documentation: The metric description.
+        :param labels: The label names.
+        """
+        super(Counter, self).__init__(name, documentation, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """ Increase the counter.
+        :param labels: The label values.
+        :param amount: The amount to increase.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        """
+        :param labels: The label values.
+        :return: The counter value.
+        """
+        return self._values.get(labels, 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f'{self.name}{self._labels(labels)} {_number(value)}' for labels, value in values]
+
+
+class Gauge(Metric):
+    """ A value which can increase and decrease, or which is calculated by a function when it is rendered. """
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 function: Callable[[], float] = None) -> None:
+        """ Constructor.
+        :param name: The metric name.
+        :param documentation: The metric description.
+        :param labels: The label names.
+        :param function: If it is given, the function without arguments which calculates the value of the gauge.
+        """
+        super(Gauge, self).__init__(name, documentation, labels)
+        self._values: Dict[Labels, float] = {}
+        self._function = function
+
+    def set(self, value: float, *labels: str) -> None:
+        """ Set the gauge value.
+        :param value: The value.
+        :param labels: The label values.
+        """
+        with self._lock:
+            self._values[labels] = value
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            return [f'{self.name} {_number(self._function())}']
+        with self._lock:
+            values = list(self._values.items())
+        return [f'{self.name}{self._labels(labels)} {_number(value)}' for labels, value in values]
+
+
+class Histogram(Metric):
+    """ A histogram of observations, usually latencies in seconds. """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEF_BUCKETS) -> None:
+        """ Constructor.
+        :param name: The metric name.
+        :param documentation: The metric description.
+        :param labels: The label names.
+        :param buckets: The upper bounds of the buckets, in increasing order. The bucket +Inf is always added.
+        """
+        super(Histogram, self).__init__(name, documentation, labels)
+        self._buckets = tuple(buckets)
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """ Add an observation.
+        :param value: The observed value.
+        :param labels: The label values.
+        """
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(labels, ([0] * (len(self._buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, *labels: str) -> int:
+        """
+        :param labels: The label values.
+        :return: The number of observations.
+        """
+        return sum(self._values[labels][0]) if labels in self._values else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(counts), total[0]) for labels, (counts, total) in self._values.items()]
+        lines = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self._labels(labels, f"le={_quote(_number(bound))}")} {cumulative}')
+            lines.append(f'{self.name}_sum{self._labels(labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{self._labels(labels)} {cumulative}')
+        return lines
+
+
+class Registry(object):
+    """ The metrics of a process. """
+
+    def __init__(self) -> None:
+        """ Constructor. """
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """ Add a metric. If there is already a metric with the same name, that one is returned.
+        :param metric: The metric.
+        :return: The registered metric.
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        """
+        :return: All the metrics in the Prometheus text format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+save_seconds = registry.register(Histogram(
+    'dbtqdm_save_seconds', 'Seconds to save the state of a progress bar, or to schedule it in asynchronous mode.',
+    ['mode']))
+write_failures = registry.register(Counter(
+    'dbtqdm_write_failures_total', 'Progress bar writes which have failed.', ['mode']))
+skipped_updates = registry.register(Counter(
+    'dbtqdm_skipped_updates_total', 'Progress bar updates which have not been written, because the bar has not changed '
+                                    'or it has exceeded its write budget.', ['reason']))
+coalesced_updates = registry.register(Counter(
+    'dbtqdm_coalesced_updates_total', 'Pending writes of the background writer replaced by a newer one.'))
+background_writes = registry.register(Counter(
+    'dbtqdm_background_writes_total', 'Writes sent by the background writer.'))
+request_seconds = registry.register(Histogram(
+    'dbtqdm_request_seconds', 'Seconds to serve a request of the server, by route.', ['route', 'method']))
+store_seconds = registry.register(Histogram(
+    'dbtqdm_store_seconds', 'Seconds of the database queries of the server, by operation.', ['operation']))
+server_bars = registry.register(Gauge(
+    'dbtqdm_server_active_bars', 'Active progress bars in the last snapshot of the server.'))
+
+
+_server: Any = None
+_server_lock = Lock()
+
+
+def start_metrics_server(port: int, host: str = '') -> Any:
+    """ Serve the metrics of this process on /metrics with a background thread. It is only started once by process.
+    :param port: The port. If 0, a free port is chosen.
+    :param host: The host. By default, all the interfaces.
+    :return: The HTTP server.
+    """
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """ HTTP handler which serves the metrics of the process. """
+
+        def do_GET(self) -> None:
+            """ Serve the metrics in the Prometheus text format. """
+            if self.path.split('?')[0] != METRICS_ROUTE:
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            """ Do not log the requests. """
+            pass
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            _server.daemon_threads = True
+            Thread(target=_server.serve_forever, name='dbtqdm-metrics', daemon=True).start()
+        return _server
+
+
+def _number(value: float) -> str:
+    """ Format a sample value. """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _quote(value: str) -> str:
+    """ Quote a label value. """
+    return f'"{value}"'
+
+
+def _escape(value: str) -> str:
+    """ Escape a label value. """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -1,2 +1,9 @@
 from .mongo import MongoTqdm as tqdm
-from .utils import connect_db
+
+
+def __getattr__(name: str):
+    """ Import the database utilities only when they are used, because they import pymongo. """
+    if name in ['connect_db', 'release_db', 'migrate_collections']:
+        from . import utils
+        return getattr(utils, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
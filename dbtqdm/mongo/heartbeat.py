@@ -0,0 +1,97 @@
+from logging import getLogger
+from os import getpid
+from threading import Thread, Lock
+from time import time, sleep
+from typing import Dict, Hashable, Tuple, Set, Union, TYPE_CHECKING
+
+from dbtqdm.consts import DEF_HEARTBEAT
+
+if TYPE_CHECKING:
+    from pymongo.collection import Collection
+
+logger = getLogger(__name__)
+
+
+class Heartbeat(Thread):
+    """ Daemon thread which periodically writes the current timestamp into the field "heartbeat" of the active progress
+      bars of this process, even if they have not changed, so the server can detect the ones whose process has died.
+      All the progress bars of the same collection are updated with a single write, therefore, the number of writes
+      does not depend on the number of progress bars.
+    """
+
+    @property
+    def pid(self) -> int:
+        """
+        :return: The process id where this heartbeat was created.
+        """
+        return self._pid
+
+    def __init__(self, interval: float = DEF_HEARTBEAT) -> None:
+        """ Constructor.
+        :param interval: The seconds between two heartbeats.
+        """
+        super(Heartbeat, self).__init__(name='dbtqdm-heartbeat', daemon=True)
+        self._pid, self.interval = getpid(), interval
+        self._bars: Dict[Hashable, Tuple['Collection', str]] = {}
+        self._lock = Lock()
+
+    def register(self, key: Hashable, collection: 'Collection', bar_id: str) -> None:
+        """ Start writing the heartbeat of a progress bar.
+        :param key: The key which identifies the progress bar.
+        :param collection: The collection of the active progress bars.
+        :param bar_id: The bar id.
+        """
+        with self._lock:
+            self._bars[key] = (collection, bar_id)
+
+    def unregister(self, key: Hashable) -> None:
+        """ Stop writing the heartbeat of a progress bar.
+        :param key: The key which identifies the progress bar.
+        """
+        with self._lock:
+            self._bars.pop(key, None)
+
+    def beat(self) -> int:
+        """ Write the heartbeat of all the registered progress bars. The progress bars which are not in the database,
+          because they have not been written yet or they have been removed, are not created.
+        :return: The number of writes.
+        """
+        with self._lock:
+            bars = list(self._bars.values())
+        groups: Dict[Tuple[int, str], Tuple['Collection', Set[str]]] = {}
+        for collection, bar_id in bars:
+            key = (id(collection.database.client), collection.full_name)
+            groups.setdefault(key, (collection, set()))[1].add(bar_id)
+        now = time()
+        for collection, bar_ids in groups.values():
+            try:
+                collection.update_many({'bar_id': {'$in': sorted(bar_ids)}}, {'$set': {'heartbeat': now}})
+            except Exception as e:
+                logger.warning(f'The heartbeat of the progress bars could not be written: {e}')
+        return len(groups)
+
+    def run(self) -> None:
+        """ Write the heartbeats until the process finishes. """
+        while True:
+            sleep(self.interval)
+            self.beat()
+
+
+_heartbeat: Union[Heartbeat, None] = None
+_heartbeat_lock = Lock()
+
+
+def get_heartbeat(interval: float = DEF_HEARTBEAT) -> Heartbeat:
+    """ Get the heartbeat thread of this process, creating and starting it if it does not exist yet. If the process has
+      been forked, a new thread is created for the child process. If several progress bars use different intervals,
+      the shortest one is used for all of them.
+    :param interval: The seconds between two heartbeats.
+    :return: The heartbeat thread.
+    """
+    global _heartbeat
+    with _heartbeat_lock:
+        if _heartbeat is None or _heartbeat.pid != getpid():
+            _heartbeat = Heartbeat(interval)
+            _heartbeat.start()
+        _heartbeat.interval = min(_heartbeat.interval, interval)
+        return _heartbeat
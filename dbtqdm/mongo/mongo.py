@@ -1,10 +1,23 @@
-from collections import Iterable
 from io import StringIO, TextIOWrapper
-from typing import Tuple, Union, Any
+from datetime import datetime
+from itertools import count
+from os import getpid
+from socket import gethostname
+from threading import Lock
+from time import time
+from typing import Tuple, Union, Any, Iterable, TYPE_CHECKING
 
 from dbtqdm import DatabaseTqdm
-from dbtqdm.consts import STATS_COLLECTION, DEF_DB_HOST, DEF_DB_PORT, DEF_DB_NAME
+from dbtqdm.consts import STATS_COLLECTION, ACTIVE_COLLECTION, HISTORY_COLLECTION, DEF_DB_HOST, DEF_DB_PORT, \
+    DEF_DB_NAME, DEF_HISTORY_INTERVAL, HISTORY_SIZE, DEF_HEARTBEAT
 from dbtqdm.db import EnvironError
+from dbtqdm.utils import str2bool, shared_meter
+from dbtqdm.writer import get_writer
+
+if TYPE_CHECKING:
+    from pymongo import ReplaceOne, UpdateOne
+
+_shards = count()
 
 
 class MongoTqdm(DatabaseTqdm):
@@ -18,8 +31,9 @@ class MongoTqdm(DatabaseTqdm):
                  unit_divisor: float = 1000, write_bytes: bool = None, lock_args: Tuple = None,
                  n_rows: int = None, colour: str = None, delay: float = 0, gui: bool = False,
                  mode: str = 'auto', database: str = 'tqdm', name: str = None, suffix: str = None,
-                 host: str = None, port: int = None, replicaset: str = None,
-                 **kwargs) -> None:
+                 host: str = None, port: int = None, replicaset: str = None, asynchronous: bool = None,
+                 history_interval: float = None, max_writes: float = None, shared: bool = None, shard: str = None,
+                 heartbeat: float = None, **kwargs) -> None:
         """
         :param iterable: Iterable to decorate with a progressbar. Leave blank to manually manage the updates.
         :param desc: Prefix for the progressbar.
@@ -86,6 +100,33 @@ class MongoTqdm(DatabaseTqdm):
            the environment variable TQDM_PORT. By default, 27017.
         :param replicaset: Only for mode 'mongo'. The database replicaset. If it is not set, this function will check
            if there is the environment variable TQDM_REPLICASET. By default, do not use it.
+        :param asynchronous: Only for mode 'mongo'. If True, the changes are saved by a background thread, therefore,
+           the iteration thread never waits for the database, and the changes of all the progress bars of the process
+           are sent together as one bulk write for each database. If False, each change is written by the iteration
+           thread. If it is not set, this function will check if there is the environment variable TQDM_ASYNC.
+           By default, True.
+        :param history_interval: Only for mode 'mongo'. The minimum seconds between two samples of the progress bar
+           history, which is used to draw the bar throughput. Only the last samples are kept. If 0, the history is not
+           recorded. If it is not set, this function will check if there is the environment variable
+           TQDM_HISTORY_INTERVAL. By default, 1 second.
+        :param max_writes: Only for mode 'mongo'. The maximum number of database writes per second of the whole
+           process, which is shared fairly among all its active progress bars. The changes are only written if the
+           position, total, description, postfix or colour have changed, but the first and the final state are always
+           written. If it is not set, this function will check if there is the environment variable TQDM_MAX_WRITES.
+           By default, there is no limit.
+        :param shared: Only for mode 'mongo'. If True, several processes, even in different hosts, can contribute to
+           the same progress bar. Each one increments atomically the bar position with its own progress and the server
+           combines the rate and ETA of all of them. The total must be the total of the whole progress bar. The bar is finished when all of them have been closed.
+           The history is not recorded for shared progress bars. If it is not set, this function will check if there
+           is the environment variable TQDM_SHARED. By default, False.
+        :param shard: Only for shared progress bars. The name of this contribution to the progress bar. If it is not set,
+           this function will check if there is the environment variable TQDM_SHARD. By default, a unique name formed
+           by the host name, the process id and a counter.
+        :param heartbeat: Only for mode 'mongo'. The seconds between two heartbeats. A background thread writes the
+           current timestamp into all the active progress bars of the process with a single write each time, even if
+           they have not changed, so the server can archive as aborted the ones whose process has been killed. If 0,
+           the heartbeat is not written and the progress bar is never considered aborted. If it is not set, this
+           function will check if there is the environment variable TQDM_HEARTBEAT. By default, 30 seconds.
         :param database: The database name. By default, tqdm.
         :param bar_name: Only for mode 'mongo'. The bar progress name. If it is not set, this function will check if
            there is the environment variable TQDM_NAME. If it is not given, neither parameter o environment variable,
@@ -96,7 +137,10 @@ class MongoTqdm(DatabaseTqdm):
 
         :return:  decorated iterator.
         """
-        self.__collection = None
+        self.__collection, self.__asynchronous, self.__history_interval = None, False, 0
+        self.__samples, self.__last_sample, self.__history_started, self.__history_lock = [], 0, False, Lock()
+        self.__shared, self.__shard = False, None
+        self.__heartbeat, self.__beats = 0, None
         self._mode = self._db_property('mode', mode, 'TQDM_MODE', False, 'auto')
         if self._mode == 'mongo':
             host = self._db_property('host', host, 'TQDM_HOST', default=DEF_DB_HOST)
@@ -105,22 +149,33 @@ class MongoTqdm(DatabaseTqdm):
             database = self._db_property('db', database, 'TQDM_DB', default=DEF_DB_NAME)
             bar_name = self._db_property('name', name, 'TQDM_NAME', required=True)
             suffix = self._db_property('suffix', suffix, 'TQDM_SUFFIX', default='')
+            self.__asynchronous = str2bool(self._db_property('asynchronous', asynchronous, 'TQDM_ASYNC', default=True))
+            self.__history_interval = float(self._db_property('history_interval', history_interval,
+                                                              'TQDM_HISTORY_INTERVAL', default=DEF_HISTORY_INTERVAL))
+            self.__shared = str2bool(self._db_property('shared', shared, 'TQDM_SHARED', default=False))
+            self.__heartbeat = float(self._db_property('heartbeat', heartbeat, 'TQDM_HEARTBEAT', default=DEF_HEARTBEAT))
+            if self.__shared:
+                shard = self._db_property('shard', shard, 'TQDM_SHARD',
+                                          default=f'{gethostname()}-{getpid()}-{next(_shards)}')
+                self.__shard, self.__history_interval = str(shard).replace('.', '_').replace('$', '_'), 0
             self._database, self._bar_name, self._suffix = database, bar_name, suffix
-            if self.bar_name == STATS_COLLECTION:
-                raise ValueError(f'The bar_name parameter cannot be the reserved collection "{STATS_COLLECTION}".')
-            from pymongo import ASCENDING, DESCENDING
-            from dbtqdm.mongo import connect_db
+            from pymongo import ReplaceOne, UpdateOne, ReturnDocument
+            from dbtqdm.mongo.utils import connect_db, ensure_indexes, release_db
 
+            # Bound now because the progress bars may be closed at interpreter shutdown, when nothing can be imported
+            self.__replace_one, self.__update_one, self.__release_db = ReplaceOne, UpdateOne, release_db
+            self.__return_after = ReturnDocument.AFTER
             self.__client = connect_db(host, port, replicaset)
             self.__db = self.__client[database]
             self.__stats = self.__db[STATS_COLLECTION]
-            if 'stats_ix' not in self.__stats.index_information():
-                self.__stats.create_index(
-                    [('start_time', DESCENDING), ('bar_ix', ASCENDING)], name='stats_ix', unique=True)
-                self.__stats.create_index([('start_time', DESCENDING)], name='start_ix')
-                self.__stats.create_index('bar_id', name='bar_ix')
+            self.__history = self.__db[HISTORY_COLLECTION]
+            ensure_indexes(self.__db)
 
-            self.__collection = self.__db[self.bar_id]
+            self.__collection = self.__db[ACTIVE_COLLECTION]
+            if self.__heartbeat > 0:
+                from dbtqdm.mongo.heartbeat import get_heartbeat
+                self.__beats = get_heartbeat(self.__heartbeat)
+                self.__beats.register(id(self), self.__collection, bar_name + suffix)
 
         self.disable = disable
         super(MongoTqdm, self).__init__(iterable=iterable, desc=desc, total=total, leave=leave, file=file,
@@ -130,7 +185,8 @@ class MongoTqdm(DatabaseTqdm):
                                         bar_format=bar_format, initial=initial, position=position, postfix=postfix,
                                         unit_divisor=unit_divisor, write_bytes=write_bytes, lock_args=lock_args,
                                         n_rows=n_rows, colour=colour, delay=delay, gui=gui,
-                                        mode=self.mode, database=database, name=name, suffix=suffix, **kwargs)
+                                        mode=self.mode, database=database, name=name, suffix=suffix,
+                                        max_writes=max_writes, **kwargs)
 
     def __db_properties(self, **kwargs) -> Tuple[str, int, str, str, str, str]:
         """ Get the database connection parameters from the kwargs if they are defined or
@@ -152,21 +208,150 @@ class MongoTqdm(DatabaseTqdm):
             raise EnvironError(f'To use the mode "mongo" for tqdm progress bar, '
                                f'it is necessary to define the following environment variable: {e.args[0]}')
 
-    def save_changes(self):
-        """ Save the current data of the progress bar into MongoDB. """
-        if not self.__collection:
+    def save_changes(self) -> bool:
+        """ Save the current data of the progress bar into MongoDB.
+          In asynchronous mode, the changes are only scheduled to be saved by the background writer.
+        """
+        if self.__collection is None:
             return False
-        return bool(self.__collection.replace_one({}, self.meter_dict(**self.format_dict), upsert=True))
+        recorded = self.__record_sample()
+        if self.__shared and self.__asynchronous:
+            get_writer().submit(id(self), self.__collection, self.__shared_operation)
+            return True
+        if self.__shared:
+            return bool(self.__collection.bulk_write([self.__shared_operation()]))
+        if self.__asynchronous:
+            operation = self.__replace_one({'bar_id': self.bar_id}, self.__active_document(), upsert=True)
+            get_writer().submit(id(self), self.__collection, operation)
+            if recorded:
+                get_writer().submit((id(self), HISTORY_COLLECTION), self.__history, self.__history_operation)
+            return True
+        if recorded:
+            self.__save_history()
+        return bool(self.__collection.replace_one({'bar_id': self.bar_id}, self.__active_document(), upsert=True))
+
+    def __active_document(self) -> dict:
+        """
+        :return: The document of the progress bar in the active collection, with its heartbeat if it is enabled.
+        """
+        document = self.meter_dict(**self.format_dict)
+        if self.__heartbeat > 0:
+            document['heartbeat'] = time()
+        return document
+
+    def __shared_update(self, closed: bool = False) -> dict:
+        """ Create the update of a shared progress bar, which sets the absolute position and statistics of this shard.
+          The position of the progress bar is the sum of the ones of its shards, calculated by shared_meter() when it
+          is read, so a lost or repeated write never makes it drift. The counter of writes only changes to detect
+          the concurrent writes when the progress bar is finished.
+        :param closed: True if this shard is being closed.
+        :return: The update document.
+        """
+        format_dict = self.format_dict
+        n, elapsed, rate = format_dict['n'], format_dict['elapsed'], format_dict['rate']
+        rate = rate if rate is not None else (n - format_dict['initial']) / elapsed if elapsed else 0
+        update = {
+            '$inc': {'writes': 1},
+            '$set': {
+                f'shards.{self.__shard}': {'n': n, 'rate': rate, 'elapsed': elapsed, 'start': self.start,
+                                           'updated': time(), 'closed': closed},
+                'total': format_dict['total'], 'unit': format_dict['unit'], 'unit_scale': format_dict['unit_scale'],
+                'unit_divisor': format_dict['unit_divisor'],
+                'desc': (format_dict['prefix'] or '') + (format_dict['postfix'] or ''),
+                'colour': format_dict.get('colour'), 'bar_name': self.bar_name, 'suffix': self.suffix, 'shared': True
+            },
+            '$setOnInsert': {'start': self.start, 'start_time_str': datetime.utcfromtimestamp(self.start),
+                             'initial': 0, 'finished': False}
+        }
+        if self.__heartbeat > 0:
+            update['$set']['heartbeat'] = time()
+        return update
+
+    def __shared_operation(self) -> 'UpdateOne':
+        """
+        :return: The write operation to update a shared progress bar.
+        """
+        return self.__update_one({'bar_id': self.bar_id}, self.__shared_update(), upsert=True)
+
+    def __close_shared(self) -> None:
+        """ Close this shard of a shared progress bar. If all its shards are closed, the progress bar is finished and
+          its aggregated statistics are stored into the stats collection. It is only removed if nobody has written it
+          meanwhile, for example, a new shard.
+        """
+        bar = self.__collection.find_one_and_update({'bar_id': self.bar_id}, self.__shared_update(closed=True),
+                                                    projection={'_id': 0}, upsert=True,
+                                                    return_document=self.__return_after)
+        if not all(shard.get('closed') for shard in bar.get('shards', {}).values()):
+            return
+        if self.__collection.delete_one({'bar_id': self.bar_id, 'writes': bar['writes']}).deleted_count:
+            end = datetime.timestamp(datetime.now())
+            bar = shared_meter(bar, end)
+            bar.update(start_time=bar['start'], end_time=end, end_time_str=datetime.utcfromtimestamp(end),
+                       finished=True)
+            self.__stats.replace_one({'start_time': bar['start'], 'bar_name': bar['bar_name'],
+                                      'suffix': bar['suffix']}, bar, upsert=True)
+
+    def __record_sample(self, force: bool = False) -> bool:
+        """ Record a sample of the progress bar history with the timestamp, the position and the rate,
+          if the history interval has elapsed since the previous sample.
+        :param force: If True, record the sample even if the history interval has not elapsed.
+        :return: True if the sample has been recorded, otherwise False.
+        """
+        now = time()
+        if not self.__history_interval or (now - self.__last_sample < self.__history_interval and not force):
+            return False
+        self.__last_sample, n, elapsed = now, self.format_dict['n'], self.format_dict['elapsed']
+        rate = self.format_dict['rate']
+        rate = rate if rate is not None else (n - self.format_dict['initial']) / elapsed if elapsed else 0
+        with self.__history_lock:
+            self.__samples.append([now, n, rate])
+        return True
+
+    def __history_operation(self) -> Union['ReplaceOne', 'UpdateOne', None]:
+        """ Create the write operation to save the recorded samples into the history collection, keeping only the last
+          samples of each progress bar. The history of previous executions of the same progress bar is replaced.
+        :return: The write operation or None if there are no recorded samples.
+        """
+        with self.__history_lock:
+            samples, self.__samples = self.__samples, []
+        if not samples:
+            return None
+        if self.__history_started:
+            return self.__update_one({'bar_id': self.bar_id, 'start': self.start},
+                                     {'$push': {'samples': {'$each': samples, '$slice': -HISTORY_SIZE}}})
+        self.__history_started = True
+        return self.__replace_one({'bar_id': self.bar_id},
+                                  {'bar_id': self.bar_id, 'start': self.start, 'samples': samples[-HISTORY_SIZE:]},
+                                  upsert=True)
+
+    def __save_history(self) -> None:
+        """ Save the recorded samples into the history collection. """
+        operation = self.__history_operation()
+        if operation is not None:
+            self.__history.bulk_write([operation])
 
     def close_bar(self, bar: dict) -> None:
         """ The  final action when the progress bar is finished.
           Usually, it stores the data into a history table or collection.
         :param bar: The progress bar information.
         """
-        if self.__collection:
+        if self.__collection is not None:
+            if self.__beats is not None:
+                self.__beats.unregister(id(self))
+            if self.__asynchronous:
+                get_writer().discard(id(self))
+                get_writer().discard((id(self), HISTORY_COLLECTION))
+            if self.__record_sample(force=True):
+                self.__save_history()
+            if self.__shared:
+                self.__close_shared()
+                self.__collection = None
+                self.__release_db(self.__client)
+                return
             bar_name, suffix, start = self.bar_name, self.suffix, self.start
             collection, stats = self.__collection, self.__stats
-            collection.drop()
+            collection.delete_one({'bar_id': self.bar_id})
             self.__collection = None
             if bar_name:
                 stats.replace_one({'start_time': start, 'bar_name': bar_name, 'suffix': suffix}, bar, upsert=True)
+            self.__release_db(self.__client)
@@ -0,0 +1,215 @@
+from time import time
+from typing import List, Union, Iterator, Sequence
+from uuid import uuid4
+
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+from pymongo.database import Database
+from pymongo.errors import OperationFailure, DuplicateKeyError
+
+from dbtqdm.consts import ACTIVE_COLLECTION, STATS_COLLECTION, HISTORY_COLLECTION, ROLLUP_COLLECTION, \
+    DEF_STATS_LIMIT, COMPACTION_TIMEOUT, MAX_COMPACTION_IDS
+from dbtqdm.mongo.utils import STATS_SORT, ROLLUP_SORT, stats_query, rollups_query, groups_pipeline, group_document, \
+    migrate_collections, heartbeat_only
+from dbtqdm.store import BarStore, Event, ChangesNotAvailable, SNAPSHOT_EVENT, BAR_EVENT, REMOVE_EVENT, StatsKey, \
+    RUN_FIELDS, DAY, day_start, daily_rollups, merge_rollups, aborted_bar
+from dbtqdm.utils import shared_meter, without_heartbeat
+
+
+class MongoStore(BarStore):
+    """ Access of the server to the progress bars stored in MongoDB. """
+
+    @property
+    def db(self) -> Database:
+        """
+        :return: The database.
+        """
+        return self._db
+
+    def __init__(self, db: Database) -> None:
+        """ Constructor.
+        :param db: The database.
+        """
+        self._db = db
+
+    def active(self) -> List[dict]:
+        """
+        :return: All the active progress bars.
+        """
+        return [shared_meter(bar) for bar in self._db[ACTIVE_COLLECTION].find({}, {'_id': 0})]
+
+    def last_stats(self, bar_id: str) -> Union[dict, None]:
+        """ Get the last finished execution of a progress bar.
+        :param bar_id: The bar id.
+        :return: The progress bar information or None if that progress bar has never finished.
+        """
+        return self._db[STATS_COLLECTION].find_one({'bar_id': bar_id}, {'_id': 0}, sort=[('start_time', DESCENDING)])
+
+    def stats(self, bar_name: str = None, suffix: str = None, since: float = None, until: float = None,
+              after: StatsKey = None, limit: int = DEF_STATS_LIMIT, fields: Sequence[str] = None) -> List[dict]:
+        """ Get the finished executions of the progress bars with an indexed query.
+        :param bar_name: If it is given, only the executions with this bar name.
+        :param suffix: If it is given, only the executions with this suffix.
+        :param since: If it is given, only the executions started at this timestamp or later.
+        :param until: If it is given, only the executions started before this timestamp.
+        :param after: If it is given, only the executions after this key of start time, bar name and suffix.
+        :param limit: The maximum number of executions.
+        :param fields: If it is given, only these fields and the key ones.
+        :return: The finished executions.
+        """
+        query, projection = stats_query(bar_name, suffix, since, until, after, fields)
+        return list(self._db[STATS_COLLECTION].find(query, projection, sort=STATS_SORT, limit=limit))
+
+    def compact(self, before: float) -> int:
+        """ Compact the finished executions started before a timestamp into daily rollups, one day each time, so only
+          the executions of a day are in memory. The executions of a day are claimed first with a unique compaction id,
+          so concurrent compactions never take the same ones, and they are only removed after merging them into the
+          rollups, which record the ids already merged. Therefore, the claims abandoned by an interrupted compaction
+          are resumed after COMPACTION_TIMEOUT seconds without counting any execution twice. The claimed executions
+          are read and removed through the sparse index stats_compaction_ix, which only contains them.
+        :param before: The timestamp.
+        :return: The number of compacted executions.
+        """
+        stats, compacted = self._db[STATS_COLLECTION], 0
+        for compaction in stats.distinct('compaction', {'compaction': {'$gt': ''},
+                                                        'compaction_time': {'$lt': time() - COMPACTION_TIMEOUT}}):
+            compacted += self.__compact_claimed(compaction)
+        while True:
+            oldest = stats.find_one({'start_time': {'$lt': before}, 'compaction': None}, {'start_time': 1},
+                                    sort=[('start_time', ASCENDING)])
+            if oldest is None:
+                return compacted
+            day, compaction = day_start(oldest['start_time']), uuid4().hex
+            stats.update_many({'start_time': {'$gte': day, '$lt': min(day + DAY, before)}, 'compaction': None},
+                              {'$set': {'compaction': compaction, 'compaction_time': time()}})
+            compacted += self.__compact_claimed(compaction)
+
+    def __compact_claimed(self, compaction: str) -> int:
+        """ Merge the executions claimed by a compaction into the daily rollups and remove them.
+        :param compaction: The compaction id.
+        :return: The number of compacted executions.
+        """
+        stats = self._db[STATS_COLLECTION]
+        runs = list(stats.find({'compaction': compaction}, {field: 1 for field in RUN_FIELDS}))
+        for new in daily_rollups(runs):
+            self.__merge_rollup(new, compaction)
+        stats.delete_many({'compaction': compaction})
+        return len(runs)
+
+    def __merge_rollup(self, new: dict, compaction: str) -> None:
+        """ Merge a rollup into the stored one of the same bar name and day, unless it was already merged by the same
+          compaction. The stored rollup is only replaced if it has not changed meanwhile, otherwise, it is retried.
+        :param new: The new rollup.
+        :param compaction: The id of the compaction which has created the new rollup.
+        """
+        rollups, key = self._db[ROLLUP_COLLECTION], {'bar_name': new['bar_name'], 'start_time': new['start_time']}
+        while True:
+            old = rollups.find_one(key, {'_id': 0})
+            merged = old.get('compactions') if old else None
+            if compaction in (merged or []):
+                return
+            rollup = dict(merge_rollups(old, new), compactions=((merged or []) + [compaction])[-MAX_COMPACTION_IDS:])
+            try:
+                result = rollups.replace_one(dict(key, compactions=merged), rollup, upsert=old is None)
+            except DuplicateKeyError:
+                continue
+            if result.matched_count or result.upserted_id is not None:
+                return
+
+    def rollups(self, bar_name: str = None, since: float = None, until: float = None,
+                limit: int = DEF_STATS_LIMIT) -> List[dict]:
+        """ Get the daily rollups of the compacted executions with an indexed query.
+        :param bar_name: If it is given, only the rollups of this bar name.
+        :param since: If it is given, only the rollups of the days which start at this timestamp or later.
+        :param until: If it is given, only the rollups of the days which start before this timestamp.
+        :param limit: The maximum number of rollups.
+        :return: The rollups.
+        """
+        return list(self._db[ROLLUP_COLLECTION].find(rollups_query(bar_name, since, until),
+                                                     {'_id': 0, 'compactions': 0}, sort=ROLLUP_SORT, limit=limit))
+
+    def history(self, bar_id: str) -> Union[dict, None]:
+        """ Get the history of the last execution of a progress bar.
+        :param bar_id: The bar id.
+        :return: A dict with the bar id, its start timestamp and the list of samples, or None if there is no history.
+        """
+        return self._db[HISTORY_COLLECTION].find_one({'bar_id': bar_id}, {'_id': 0})
+
+    def remove(self, bar_id: str) -> bool:
+        """ Remove an active progress bar.
+        :param bar_id: The bar id.
+        :return: True if the progress bar has been removed, False if it does not exist.
+        """
+        return bool(self._db[ACTIVE_COLLECTION].delete_one({'bar_id': bar_id}).deleted_count)
+
+    def save(self, bars: List[dict]) -> None:
+        """ Create or replace several active progress bars in a single bulk write.
+        :param bars: The progress bars.
+        """
+        if bars:
+            self._db[ACTIVE_COLLECTION].bulk_write([ReplaceOne({'bar_id': bar['bar_id']}, bar, upsert=True)
+                                                    for bar in bars], ordered=False)
+
+    def finish(self, bar: dict) -> None:
+        """ Move a finished progress bar from the active progress bars to the stats collection.
+        :param bar: The finished progress bar.
+        """
+        self._db[ACTIVE_COLLECTION].delete_one({'bar_id': bar['bar_id']})
+        self._db[STATS_COLLECTION].replace_one({'start_time': bar['start_time'], 'bar_name': bar['bar_name'],
+                                                'suffix': bar['suffix']}, bar, upsert=True)
+
+    def reap(self, before: float) -> List[str]:
+        """ Archive as aborted the active progress bars whose last heartbeat is older than a timestamp. Each one is only
+          removed if its heartbeat has not changed meanwhile, so a progress bar which is still alive is never archived.
+        :param before: The timestamp.
+        :return: The ids of the archived progress bars.
+        """
+        active, reaped = self._db[ACTIVE_COLLECTION], []
+        for bar in active.find({'heartbeat': {'$lt': before}}, {'_id': 0}):
+            if active.delete_one({'bar_id': bar['bar_id'], 'heartbeat': bar['heartbeat']}).deleted_count:
+                self._db[STATS_COLLECTION].replace_one({'start_time': bar['start'], 'bar_name': bar['bar_name'],
+                                                        'suffix': bar['suffix']}, aborted_bar(bar), upsert=True)
+                reaped.append(bar['bar_id'])
+        return reaped
+
+    def migrate(self) -> int:
+        """ Move the progress bars stored by the clients of previous versions, one collection by progress bar, to the
+          collection of active progress bars.
+        :return: The number of migrated progress bars.
+        """
+        return migrate_collections(self._db)
+
+    def groups(self, stale_before: float = None, exclude: Sequence[str] = ()) -> List[dict]:
+        """ Aggregate the active progress bars by bar name with a single aggregation pipeline, so the progress bars are
+          not sent to the server.
+        :param stale_before: The progress bars whose heartbeat is older than this timestamp are stale. If None, no
+           progress bar is stale.
+        :param exclude: The ids of the progress bars which must not be aggregated.
+        :return: The partial groups, which can be merged with merge_groups().
+        """
+        pipeline = groups_pipeline(stale_before, exclude)
+        return [group_document(document) for document in self._db[ACTIVE_COLLECTION].aggregate(pipeline)]
+
+    def changes(self) -> Iterator[Event]:
+        """ Watch the changes of the active progress bars with a MongoDB change stream.
+        :return: An iterator of pairs with the event type and its data.
+        :raise ChangesNotAvailable: If the database is not a replica set.
+        """
+        collection = self._db[ACTIVE_COLLECTION]
+        try:
+            with collection.watch(full_document='updateLookup') as stream:
+                ids = {bar['_id']: bar['bar_id'] for bar in collection.find({}, {'bar_id': 1})}
+                yield SNAPSHOT_EVENT, None
+                for change in stream:
+                    operation = change['operationType']
+                    if heartbeat_only(change):
+                        continue
+                    if operation in ['insert', 'update', 'replace'] and change.get('fullDocument'):
+                        bar = change['fullDocument']
+                        ids[bar.pop('_id')] = bar['bar_id']
+                        yield BAR_EVENT, without_heartbeat(shared_meter(bar))
+                    elif operation == 'delete' and change['documentKey']['_id'] in ids:
+                        yield REMOVE_EVENT, ids.pop(change['documentKey']['_id'])
+                    elif operation in ['drop', 'invalidate']:
+                        return
+        except OperationFailure as e:
+            raise ChangesNotAvailable(str(e)) from e
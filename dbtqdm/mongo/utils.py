@@ -1,13 +1,250 @@
-from typing import Union
+from os import getpid
+from threading import Lock
+from time import time
+from typing import Union, Dict, Tuple, List, Set, Sequence
 
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, IndexModel
+from pymongo.database import Database
+
+from dbtqdm.consts import STATS_COLLECTION, ACTIVE_COLLECTION, HISTORY_COLLECTION, ROLLUP_COLLECTION
+from dbtqdm.store import STATS_KEY, StatsKey
+
+ClientKey = Tuple[str, int, Union[str, None]]
+STATS_SORT = [(field, DESCENDING) for field in STATS_KEY]
+STATS_INDEXES = [
+    IndexModel(STATS_SORT, name='stats_key_ix', unique=True),
+    IndexModel([('bar_id', ASCENDING), ('start_time', DESCENDING)], name='stats_bar_ix'),
+    IndexModel([('bar_name', ASCENDING), ('start_time', DESCENDING), ('suffix', DESCENDING)], name='stats_name_ix'),
+    IndexModel([('suffix', ASCENDING), ('start_time', DESCENDING), ('bar_name', DESCENDING)], name='stats_suffix_ix'),
+    IndexModel([('compaction', ASCENDING), ('compaction_time', ASCENDING)], name='stats_compaction_ix', sparse=True)
+]
+OBSOLETE_INDEXES = ['stats_ix', 'start_ix', 'bar_ix']
+ROLLUP_SORT = [('start_time', DESCENDING), ('bar_name', DESCENDING)]
+ROLLUP_INDEXES = [
+    IndexModel([('bar_name', ASCENDING), ('start_time', DESCENDING)], name='rollup_ix', unique=True),
+    IndexModel(ROLLUP_SORT, name='rollup_time_ix')
+]
+
+_clients: Dict[ClientKey, List[Union[MongoClient, int]]] = {}
+_client_keys: Dict[int, ClientKey] = {}
+_indexed: Set[Tuple[ClientKey, str]] = set()
+_pid = getpid()
+_lock = Lock()
+
+
+def _check_fork() -> None:
+    """ Forget the clients created by the parent process, because MongoClient instances are not fork-safe. """
+    global _pid
+    if _pid != getpid():
+        _clients.clear()
+        _client_keys.clear()
+        _indexed.clear()
+        _pid = getpid()
 
 
 def connect_db(host: str = 'localhost', port: int = 27017, replicaset: Union[str, None] = None) -> MongoClient:
-    """ Connect with the database.
+    """ Connect with the database. The clients are shared in the same process by host, port and replicaset.
+      Each call increases the reference counter of the client, which is decreased with release_db().
     :param host: The database connection host.
     :param port: The database connection port.
     :param replicaset: The replicaset. If None, then, replicaset is not used.
     :return: The MongoDB client.
     """
-    return MongoClient(host, port, replicaset=replicaset) if replicaset else MongoClient(host, port)
+    key = (host, int(port), replicaset if replicaset else None)
+    with _lock:
+        _check_fork()
+        if key not in _clients:
+            client = MongoClient(host, port, replicaset=replicaset) if replicaset else MongoClient(host, port)
+            _clients[key] = [client, 0]
+            _client_keys[id(client)] = key
+        _clients[key][1] += 1
+        return _clients[key][0]
+
+
+def release_db(client: MongoClient, close: bool = False) -> None:
+    """ Decrease the reference counter of a shared client. The client is kept open to be reused by the next progress
+      bars, unless close is True and nobody else is using it.
+    :param client: The MongoDB client obtained with connect_db().
+    :param close: If True, close the client when its reference counter reaches 0.
+    """
+    with _lock:
+        _check_fork()
+        key = _client_keys.get(id(client))
+        if key is None:
+            return
+        _clients[key][1] = max(_clients[key][1] - 1, 0)
+        if close and not _clients[key][1]:
+            del _clients[key], _client_keys[id(client)]
+            for indexed in [indexed for indexed in _indexed if indexed[0] == key]:
+                _indexed.discard(indexed)
+            client.close()
+
+
+def ensure_indexes(db: Database) -> None:
+    """ Create the indexes of the progress bar collections only the first time that a database is used
+      in this process.
+    :param db: The database.
+    """
+    with _lock:
+        _check_fork()
+        key = (_client_keys.get(id(db.client), id(db.client)), db.name)
+        if key in _indexed:
+            return
+        _indexed.add(key)
+    try:
+        existing = db[STATS_COLLECTION].index_information()
+        for name in OBSOLETE_INDEXES:
+            if name in existing:
+                db[STATS_COLLECTION].drop_index(name)
+        db[STATS_COLLECTION].create_indexes(STATS_INDEXES)
+        db[ROLLUP_COLLECTION].create_indexes(ROLLUP_INDEXES)
+        db[ACTIVE_COLLECTION].create_index('bar_id', name='active_bar_ix', unique=True)
+        db[ACTIVE_COLLECTION].create_index('heartbeat', name='active_heartbeat_ix', sparse=True)
+        db[HISTORY_COLLECTION].create_index('bar_id', name='history_bar_ix', unique=True)
+    except Exception:
+        with _lock:
+            _indexed.discard(key)
+        raise
+
+
+def stats_query(bar_name: str = None, suffix: str = None, since: float = None, until: float = None,
+                after: StatsKey = None, fields: Sequence[str] = None) -> Tuple[dict, dict]:
+    """ Create the query of BarStore.stats() for the stats collection. It must be sorted by STATS_SORT. Each filter
+      combination is served by an index which also returns the executions in that order: stats_key_ix without
+      filters, stats_name_ix by bar name, stats_suffix_ix by suffix and stats_bar_ix by bar name and suffix.
+    :param bar_name: If it is given, only the executions with this bar name.
+    :param suffix: If it is given, only the executions with this suffix.
+    :param since: If it is given, only the executions started at this timestamp or later.
+    :param until: If it is given, only the executions started before this timestamp.
+    :param after: If it is given, only the executions after this key of start time, bar name and suffix.
+    :param fields: If it is given, only these fields and the key ones.
+    :return: The filter and the projection.
+    """
+    query, start_time = {}, {}
+    if bar_name is not None:
+        query['bar_name'] = bar_name
+    if suffix is not None:
+        query['suffix'] = suffix
+    if bar_name is not None and suffix is not None:
+        query['bar_id'] = bar_name + suffix
+    if since is not None:
+        start_time['$gte'] = since
+    if until is not None:
+        start_time['$lt'] = until
+    if start_time:
+        query['start_time'] = start_time
+    if after is not None:
+        query['$or'] = [{'start_time': {'$lt': after[0]}},
+                        {'start_time': after[0], 'bar_name': {'$lt': after[1]}},
+                        {'start_time': after[0], 'bar_name': after[1], 'suffix': {'$lt': after[2]}}]
+    projection = {'_id': 0}
+    if fields is not None:
+        projection.update({field: 1 for field in list(fields) + list(STATS_KEY) + ['bar_id'] if field != '_id'})
+    return query, projection
+
+
+def rollups_query(bar_name: str = None, since: float = None, until: float = None) -> dict:
+    """ Create the query of BarStore.rollups() for the rollup collection. It must be sorted by ROLLUP_SORT.
+    :param bar_name: If it is given, only the rollups of this bar name.
+    :param since: If it is given, only the rollups of the days which start at this timestamp or later.
+    :param until: If it is given, only the rollups of the days which start before this timestamp.
+    :return: The filter.
+    """
+    query, start_time = {} if bar_name is None else {'bar_name': bar_name}, {}
+    if since is not None:
+        start_time['$gte'] = since
+    if until is not None:
+        start_time['$lt'] = until
+    if start_time:
+        query['start_time'] = start_time
+    return query
+
+
+def groups_pipeline(stale_before: float = None, exclude: Sequence[str] = ()) -> List[dict]:
+    """ Create the aggregation pipeline of BarStore.groups() for the active collection, which calculates all the groups
+      in the database with a single query, like group_bars() does with the progress bars. The position of the shared
+      progress bars is the sum of the positions of their shards, and their rate the sum of the rates of the open ones.
+    :param stale_before: The progress bars whose heartbeat is older than this timestamp are stale. If None, no progress
+       bar is stale.
+    :param exclude: The ids of the progress bars which must not be aggregated.
+    :return: The pipeline. Its documents must be converted with group_document().
+    """
+    shard_n = {'$sum': {'$map': {
+        'input': {'$objectToArray': {'$ifNull': ['$shards', {}]}}, 'as': 'shard', 'in': {'$ifNull': ['$$shard.v.n', 0]}
+    }}}
+    shard_rate = {'$sum': {'$map': {
+        'input': {'$objectToArray': {'$ifNull': ['$shards', {}]}}, 'as': 'shard',
+        'in': {'$cond': [{'$eq': ['$$shard.v.closed', True]}, 0, {'$ifNull': ['$$shard.v.rate', 0]}]}
+    }}}
+    bar_rate = {'$cond': [{'$and': [{'$eq': ['$primary_unit', 's']}, {'$gt': ['$rate', 0]}]},
+                          {'$divide': [1, '$rate']}, {'$ifNull': ['$rate', 0]}]}
+    stale = {'$and': [{'$gt': ['$heartbeat', None]}, {'$lt': ['$heartbeat', stale_before]}]} \
+        if stale_before is not None else {'$literal': False}
+    has_total = {'$gt': ['$total', 0]}
+    pipeline = [{'$match': {'bar_id': {'$nin': list(exclude)}}}] if exclude else []
+    return pipeline + [
+        {'$addFields': {'n': {'$cond': [{'$eq': ['$shared', True]}, shard_n, {'$ifNull': ['$n', 0]}]}}},
+        {'$project': {'bar_name': 1, 'start': 1, 'n': 1,
+                      'total': {'$cond': [has_total, '$total', 0]},
+                      'rate': {'$cond': [{'$eq': ['$shared', True]}, shard_rate, bar_rate]}, 'stale': stale,
+                      'finished': {'$or': [{'$eq': ['$finished', True]},
+                                           {'$and': [has_total, {'$gte': ['$n', '$total']}]}]}}},
+        {'$addFields': {'finished': {'$and': [{'$eq': ['$stale', False]}, {'$eq': ['$finished', True]}]},
+                        'remaining': {'$cond': [{'$and': [{'$gt': ['$rate', 0]}, has_total]},
+                                                {'$divide': [{'$subtract': ['$total', '$n']}, '$rate']}, None]}}},
+        {'$group': {'_id': '$bar_name', 'members': {'$sum': 1}, 'stale': {'$sum': {'$cond': ['$stale', 1, 0]}},
+                    'finished': {'$sum': {'$cond': ['$finished', 1, 0]}}, 'n': {'$sum': '$n'},
+                    'total': {'$sum': '$total'}, 'no_total': {'$sum': {'$cond': [has_total, 0, 1]}},
+                    'rate': {'$sum': '$rate'}, 'remaining': {'$max': '$remaining'}, 'start': {'$min': '$start'}}},
+        {'$sort': {'_id': ASCENDING}}
+    ]
+
+
+def group_document(document: dict) -> dict:
+    """ Convert a document of the groups pipeline into a partial group, like the ones returned by group_bars().
+    :param document: The document.
+    :return: The partial group.
+    """
+    group = {field: value for field, value in document.items() if field != '_id'}
+    group.update(bar_name=document['_id'], running=document['members'] - document['stale'] - document['finished'])
+    return group
+
+
+def heartbeat_only(change: dict) -> bool:
+    """ Check if a change of the active collection only writes the heartbeat of a progress bar, which is not a change
+      of the progress bar for the clients.
+    :param change: The event of the change stream.
+    :return: True if it is an update which only sets the field "heartbeat".
+    """
+    description = change.get('updateDescription') or {}
+    return change['operationType'] == 'update' and set(description.get('updatedFields') or {}) == {'heartbeat'} and \
+        not description.get('removedFields')
+
+
+def migrate_collections(db: Database) -> int:
+    """ Move the progress bars stored with the old layout, one collection by progress bar, to the collection of
+      active progress bars. The old collections are removed after being migrated. The clients of previous versions
+      write their collection again in each update, so this function is called periodically by the server to move them
+      again. Each migrated progress bar is marked as "migrated" with the time of its migration as heartbeat, so it is
+      archived as aborted by BarStore.reap() if its client stops writing it, and it is removed when its client stores
+      it as finished.
+    :param db: The database.
+    :return: The number of migrated progress bars.
+    """
+    migrated, now = 0, time()
+    for name in db.list_collection_names():
+        if name in [STATS_COLLECTION, ACTIVE_COLLECTION, HISTORY_COLLECTION, ROLLUP_COLLECTION] or \
+                name.startswith('system.'):
+            continue
+        bar = db[name].find_one({}, {'_id': 0})
+        if bar and 'bar_name' in bar:
+            bar.update(bar_id=name, heartbeat=now, migrated=True)
+            db[ACTIVE_COLLECTION].replace_one({'bar_id': name}, bar, upsert=True)
+            db[name].drop()
+            migrated += 1
+    for bar in db[ACTIVE_COLLECTION].find({'migrated': True}, {'_id': 0, 'bar_id': 1, 'start': 1, 'bar_name': 1,
+                                                               'suffix': 1, 'heartbeat': 1}):
+        if db[STATS_COLLECTION].find_one({'start_time': bar.get('start'), 'bar_name': bar['bar_name'],
+                                          'suffix': bar.get('suffix', '')}, {'_id': 1}):
+            db[ACTIVE_COLLECTION].delete_one({'bar_id': bar['bar_id'], 'heartbeat': bar['heartbeat']})
+    return migrated
@@ -1,23 +1,103 @@
-from typing import Tuple, Union
+from queue import Empty
+from threading import Lock, Condition, Thread
+from time import monotonic, sleep, perf_counter, time
+from typing import Tuple, Union, Iterator, Callable, Any, TYPE_CHECKING
 
-from flask import Flask, render_template, json, jsonify, Response
+from flask import Flask, render_template, json, jsonify, Response, request, stream_with_context, g
 from flask_cors import CORS
 from logging import getLogger
 
-from pymongo import DESCENDING
-from pymongo.database import Database
-
-from dbtqdm.mongo import connect_db
+from dbtqdm.api import stale_limit, board_data, finished_data, history_points, history_data, groups_data, \
+    ingest_updates
 from dbtqdm.args.server import TqdmArgParser
+from dbtqdm.board import BarBoard, page_params
+from dbtqdm.feed import BarFeed, SNAPSHOT_EVENT, BAR_EVENT, REMOVE_EVENT
+from dbtqdm.ingest import LiveBars
 from dbtqdm.consts import DEF_TITLE, DEF_INTERVAL, DEF_DB_PORT, DEF_HOST, DEF_PORT, DEF_DB_HOST, DEF_DB_NAME, \
-    STATS_COLLECTION
+    ACTIVE_COLLECTION, DEF_CACHE_TTL, TQDM_ROUTE, BAR_ROUTE, STATS_ROUTE, REMOVE_ROUTE, STREAM_ROUTE, KEEP_ALIVE, \
+    HISTORY_ROUTE, DEF_DB_TYPE, DEF_DB_PATH, DEF_SHM_PATH, INGEST_ROUTE, DEF_CHECKPOINT, \
+    METRICS_ROUTE, ROLLUPS_ROUTE, DEF_RETENTION, MAINTENANCE_INTERVAL, DEF_STALE_TIMEOUT, GROUPS_ROUTE, \
+    MIGRATION_INTERVAL
+from dbtqdm.metrics import registry, request_seconds, server_bars, CONTENT_TYPE
+from dbtqdm.store import BarStore, MeteredStore, stats_params, stats_page, rollup_params, retention_limit, aborted_bar
+from dbtqdm.utils import without_heartbeat
+from dbtqdm.wire import BodyCache, bars_representation, compress, response_encoding
+
+if TYPE_CHECKING:
+    from pymongo.database import Database
+
+
+class SnapshotCache(object):
+    """ Shared snapshot of the server data, which is reloaded at most once each TTL seconds, no matter how many clients
+      are connected. If several requests find the snapshot expired at the same time, only one of them loads it and the
+      rest wait for the result (single-flight).
+    """
+
+    def __init__(self, load: Callable[[], Any], ttl: float = DEF_CACHE_TTL) -> None:
+        """ Constructor.
+        :param load: The function without arguments to load the snapshot.
+        :param ttl: The seconds while the snapshot is valid. If 0, the snapshot is loaded each time, but the concurrent
+           loads are still coalesced into one.
+        """
+        self.load, self.ttl = load, ttl
+        self._value, self._expiration, self._generation = None, None, 0
+        self._loading = False
+        self._condition = Condition()
+
+    def get(self) -> Any:
+        """ Get the snapshot, loading it if it is expired.
+        :return: The value returned by the load function.
+        """
+        with self._condition:
+            generation = self._generation
+            while self._loading:
+                self._condition.wait()
+                if not self._expired() and generation == self._generation:
+                    return self._value
+            if not self._expired():
+                return self._value
+            self._loading, generation = True, self._generation
+        try:
+            value = self.load()
+        finally:
+            with self._condition:
+                self._loading = False
+                self._condition.notify_all()
+        with self._condition:
+            self._value = value
+            self._expiration = monotonic() + self.ttl if generation == self._generation else None
+            return value
+
+    def invalidate(self) -> None:
+        """ Expire the snapshot, so the next call to get() loads it again. """
+        with self._condition:
+            self._expiration = None
+            self._generation += 1
+
+    def _expired(self) -> bool:
+        """ The lock must be held. """
+        return self._expiration is None or monotonic() >= self._expiration
+
 
 app = Flask(__name__, template_folder='templates')
 cors = CORS(app, resources={r"/api/*": {"origins": "*"}})
 CORS(app)
 logger = getLogger(__name__)
-TQDM_ROUTE, BAR_ROUTE, STATS_ROUTE, REMOVE_ROUTE = '/tqdm', '/bar', '/stats', '/remove'
-web_title, interval = DEF_TITLE, DEF_INTERVAL * 1000
+web_title, interval, stale_seconds = DEF_TITLE, DEF_INTERVAL * 1000, DEF_STALE_TIMEOUT
+feed, feed_lock, persist_lock = None, Lock(), Lock()
+board, live, bodies = BarBoard(), LiveBars(), BodyCache()
+
+
+def load_snapshot() -> str:
+    """ Read the active progress bars from the database and from the ingest API, and update the board with them.
+    :return: The new board version.
+    """
+    bars = store.active() + live.bars()
+    server_bars.set(len(bars))
+    return board.update(bars)
+
+
+cache = SnapshotCache(load_snapshot)
 
 
 @app.route('/')
@@ -45,25 +125,125 @@ def health():
     return "I am ready!"
 
 
+@app.route(METRICS_ROUTE)
+def metrics() -> Response:
+    """ API to get the metrics of the server and the progress bars of its process in the Prometheus text format. """
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+@app.before_request
+def start_request() -> None:
+    """ Save when the request has started to measure its latency. """
+    g.request_start = perf_counter()
+
+
+@app.after_request
+def finish_request(response: Response) -> Response:
+    """ Measure the latency of the request by route. For the event streams, only until the response starts.
+    :param response: The response.
+    :return: The same response.
+    """
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_seconds.observe(perf_counter() - g.request_start, route, request.method)
+    return response
+
+
+@app.after_request
+def compress_response(response: Response) -> Response:
+    """ Compress the responses with gzip or brotli if the client accepts it, except the small ones, the files and the
+      event streams.
+    :param response: The response.
+    :return: The same response, compressed if it is possible.
+    """
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed or \
+            'Content-Encoding' in response.headers:
+        return response
+    encoding = response_encoding(response.content_type, response.content_length, request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    return response
+
+
 @app.route(TQDM_ROUTE + '/<bar_id>', methods=['GET'])
 def tqdm(bar_id: str) -> Union[dict, Tuple[Response, int]]:
     """ API to get the bar data give its id. If that progress bar is not active, then it will check the last finished
       progress bar with this id. If it does not exist, then return a error message.
+      The response has an ETag header, so the clients can use the If-None-Match header to receive an empty response
+      with the status 304 if the progress bar has not changed.
     :param bar_id: The id of the progress bar. This id is formed by the bar name and bar name suffix.
     """
-    global db
-    if bar_id in db.list_collection_names():
-        return bar_progress(db, bar_id)
+    global store
+    cache.get()
+    bar, version = board.bar(bar_id)
+    if bar:
+        return conditional_response(bar, version)
 
-    obj = db[STATS_COLLECTION].find_one({'bar_id': bar_id}, sort=[('start', DESCENDING)])
+    obj = store.last_stats(bar_id)
     if obj:
-        del obj['_id']
-        obj['remaining_str'] = '0s'
-        obj['start_str'] = '0s'
-        return obj
+        response = jsonify(finished_data(obj))
+        response.add_etag()
+        return response.make_conditional(request)
     return jsonify(error=str(f'Bar progress "{bar_id}" does not exist.')), 404
 
 
+@app.route(TQDM_ROUTE + '/<bar_id>' + HISTORY_ROUTE, methods=['GET'])
+def history(bar_id: str) -> Union[Response, Tuple[Response, int]]:
+    """ API to get the history of the last execution of a progress bar, downsampled to the number of points given by
+      the parameter "points" (200 by default).
+    :param bar_id: The id of the progress bar. This id is formed by the bar name and bar name suffix.
+    :return: A dict with the bar id, its start timestamp and a list of samples with the timestamp, position and rate.
+    """
+    global store
+    try:
+        points = history_points(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    obj = store.history(bar_id)
+    if obj:
+        response = jsonify(history_data(obj, points))
+        response.add_etag()
+        return response.make_conditional(request)
+    return jsonify(error=str(f'There is no history for the progress bar "{bar_id}".')), 404
+
+
+@app.route(STATS_ROUTE, methods=['GET'])
+def stats() -> Union[Response, Tuple[Response, int]]:
+    """ API to browse the finished executions of the progress bars, from the newest to the oldest. They can be filtered
+      by the parameters "bar_name", "suffix", "since" and "until" (timestamps of the start time), and "fields" selects
+      a comma separated list of fields besides the key ones (bar_id, bar_name, suffix and start_time). The page size is
+      given by "limit" (100 by default and 1000 at most) and the next page is requested with the parameter "after"
+      set to the "next" cursor of the previous response.
+    :return: A dict with the finished executions in "stats" and the cursor of the "next" page, or null if it is the
+       last one.
+    """
+    global store
+    try:
+        params = stats_params(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    limit = params['limit']
+    params['limit'] += 1
+    return jsonify(stats_page(store.stats(**params), limit))
+
+
+@app.route(STATS_ROUTE + ROLLUPS_ROUTE, methods=['GET'])
+def rollups() -> Union[Response, Tuple[Response, int]]:
+    """ API to get the daily rollups of the finished executions which have been compacted, from the newest day to the
+      oldest. They can be filtered by the parameters "bar_name", "since" and "until" (timestamps of the day start),
+      and "limit" is the maximum number of rollups (100 by default and 1000 at most).
+    :return: A dict with the list of rollups in "rollups".
+    """
+    global store
+    try:
+        params = rollup_params(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(rollups=store.rollups(**params))
+
+
 @app.route(REMOVE_ROUTE + '/<bar_id>', methods=['GET'])
 def remove(bar_id: str) -> Union[str, Tuple[Response, int]]:
     """ Remove a progress bar from the database. If the progress bar is still alive, then it will appear again
@@ -71,40 +251,262 @@ def remove(bar_id: str) -> Union[str, Tuple[Response, int]]:
     :param bar_id: The bar id to remove. This id is formed by the bar name and bar name suffix.
     :return: If the bar progress exists, then the bar information is returned, otherwise an error message is returned.
     """
-    global db
-    if bar_id in db.list_collection_names():
-        db[bar_id].drop()
+    global store
+    removed = live.remove(bar_id)
+    if store.remove(bar_id) or removed:
+        board.remove(bar_id)
+        cache.invalidate()
         return json.dumps(True)
     return jsonify(error=str(f'Bar progress "{bar_id}" does not exist or it is already removed.')), 404
 
 
 @app.route(TQDM_ROUTE, methods=['GET'])
-def all_tqdm() -> dict:
-    """ Get the data of all the progress bars.
-    :return: A dict with the page title and the data with all the progress bars.
+def all_tqdm() -> Union[Response, Tuple[Response, int]]:
+    """ Get the data of all the progress bars. If the parameter "since" is given with the version of a previous
+      response, then only the progress bars created or updated after that version are returned in "bars", and the ids
+      of the removed ones in "removed". If that version is too old or not valid, all the progress bars are returned
+      without the "removed" field. The response has an ETag header, so the clients can use the If-None-Match header
+      to receive an empty response with the status 304 if nothing has changed.
+      If any of the parameters "prefix", "suffix", "status", "sort", "after" or "limit" is given, then only a page of
+      the progress bars is returned in "bars", filtered and sorted by these parameters, with the cursor of the
+      "next" page. With the header "Accept: application/vnd.dbtqdm.columnar+json" or "Accept: application/msgpack",
+      "bars" is a dict with a list of raw values for each field, without the formatted ones.
+    :return: A dict with the page title, the board version and the data with the progress bars.
     """
-    global db, web_title
-    return {
-        'title': web_title,
-        'bars': [bar_progress(db, name) for name in db.list_collection_names() if name != STATS_COLLECTION]
-    }
+    global web_title, stale_seconds
+    try:
+        params = page_params(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    cache.get()
+    data, etag = board_data(board, params, request.args.get('since'), web_title, stale_limit(stale_seconds))
+    return bars_response(data, etag)
 
 
-def bar_progress(db: Database, bar_id: str) -> dict:
-    """ Obtain the progress bar information from MongoDB from its id.
-    :param db: The database.
-    :param bar_id: The bar id to remove. This id is formed by the bar name and bar name suffix.
-    :return: The
+@app.route(GROUPS_ROUTE, methods=['GET'])
+def groups() -> Response:
+    """ API to get the active progress bars aggregated by bar name, for example, the shards of a task which only differ
+      in their suffix. Each group has the number of "members" and how many of them are "running", "finished" or
+      "stale", the sum of their positions "n", totals "total" and rates "rate" in iterations per second, its
+      "percentage", the first "start", and the "remaining" seconds and "eta" timestamp of the slowest member. If the
+      parameter "prefix" is given, only the groups whose bar name starts with it. The members of a group are returned
+      by /tqdm?bar_name=<bar_name>.
+    :return: A dict with the list of "groups" sorted by bar name.
+    """
+    global store, stale_seconds
+    stale_before, bars = stale_limit(stale_seconds), live.bars()
+    partials = store.groups(stale_before, [bar['bar_id'] for bar in bars])
+    return jsonify(groups_data(partials, bars, stale_before, request.args.get('prefix')))
+
+
+def bars_response(data: dict, etag: str) -> Response:
+    """ Create the response of the API of the active progress bars, like conditional_response(), but in the media type
+      chosen by the Accept header: JSON, columnar JSON or MessagePack. The body is compressed with the best encoding
+      accepted by the client and cached, so it is only serialized and compressed once for all the clients.
+    :param data: The data to send.
+    :param etag: The data version.
+    :return: The response.
     """
-    bar = db[bar_id].find_one({})
-    if bar and '_id' in bar:
-        del bar['_id']
-    return bar
+    status, body, headers = bars_representation(bodies, (request.query_string,), data, etag, request.headers)
+    return Response(body, status, headers)
+
+
+@app.route(INGEST_ROUTE, methods=['POST'])
+def ingest() -> Union[Response, Tuple[Response, int]]:
+    """ API to report the changes of several progress bars in a single request, without storing them into a database.
+      The body is a JSON object with the list "bars", where each element contains the bar_name and suffix of a progress
+      bar and its changed fields: n, total, elapsed, rate, initial, unit, unit_scale, unit_divisor, desc, colour, start
+      and, when the progress bar has finished, finished and end. The active progress bars are kept in memory and they
+      are only saved into the database when they finish or in the periodic checkpoints.
+    :return: A dict with the number of received updates.
+    """
+    global store
+    try:
+        updates = ingest_updates(request.get_json(silent=True))
+        updated, finished = live.update(updates)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    for bar in updated:
+        board.put(bar)
+        publish(BAR_EVENT, without_heartbeat(bar))
+    for bar in finished:
+        with persist_lock:
+            store.finish(bar)
+        board.remove(bar['bar_id'])
+        publish(REMOVE_EVENT, bar['bar_id'])
+    return jsonify(received=len(updates))
+
+
+def save_checkpoints(seconds: float) -> None:
+    """ Save periodically into the database the progress bars received by the ingest API which have changed.
+    :param seconds: The seconds between two checkpoints.
+    """
+    global store
+    while True:
+        sleep(seconds)
+        try:
+            with persist_lock:
+                store.save(live.dirty())
+        except Exception as e:
+            logger.warning(f'The progress bars could not be saved: {e}')
+
+
+def compact_stats(days: float) -> None:
+    """ Compact periodically the finished executions older than the retention days into daily rollups.
+    :param days: The days while the finished executions are kept.
+    """
+    global store
+    while True:
+        try:
+            compacted = store.compact(retention_limit(days))
+            if compacted:
+                logger.info(f'{compacted} finished progress bars have been compacted into daily rollups.')
+        except Exception as e:
+            logger.warning(f'The finished progress bars could not be compacted: {e}')
+        sleep(MAINTENANCE_INTERVAL)
+
+
+def reap_bars(timeout: float) -> None:
+    """ Archive periodically as aborted the progress bars without heartbeat during a timeout, because their process has
+      died without closing them, and remove them from the board. The progress bars received by the ingest API which
+      have not been updated during the timeout are also archived.
+    :param timeout: The seconds without heartbeat to consider that a progress bar is aborted.
+    """
+    global store
+    while True:
+        sleep(timeout / 2)
+        try:
+            with persist_lock:
+                expired = live.expire(time() - timeout)
+                for bar in expired:
+                    store.finish(aborted_bar(bar))
+                reaped = [bar['bar_id'] for bar in expired] + store.reap(time() - timeout)
+        except Exception as e:
+            logger.warning(f'The aborted progress bars could not be archived: {e}')
+            continue
+        for bar_id in reaped:
+            board.remove(bar_id)
+            publish(REMOVE_EVENT, bar_id)
+        if reaped:
+            cache.invalidate()
+            logger.info(f'{len(reaped)} progress bars without heartbeat have been archived as aborted.')
+
+
+def migrate_bars(seconds: float) -> None:
+    """ Migrate periodically the progress bars written with the old layout by the clients of previous versions, which
+      write them again in each update although they have already been migrated when the server started.
+    :param seconds: The seconds between two migrations.
+    """
+    global store
+    while True:
+        sleep(seconds)
+        try:
+            with persist_lock:
+                migrated = store.migrate()
+        except Exception as e:
+            logger.warning(f'The progress bars of previous versions could not be migrated: {e}')
+            continue
+        if migrated:
+            cache.invalidate()
+
+
+def publish(event: str, data: Union[dict, str]) -> None:
+    """ Send an event to the event streams, if there is any.
+    :param event: The event type.
+    :param data: The event data.
+    """
+    if feed is not None:
+        feed.publish(event, data)
+
+
+def conditional_response(data: Union[dict, list], etag: str) -> Response:
+    """ Create a JSON response with an ETag. If the request has the same ETag in its If-None-Match header, then
+      the response is empty with the status 304 and the data is not serialized.
+    :param data: The data to send.
+    :param etag: The data version.
+    :return: The response.
+    """
+    response = Response(status=304) if etag in request.if_none_match else jsonify(data)
+    response.set_etag(etag)
+    return response
+
+
+@app.route(STREAM_ROUTE, methods=['GET'])
+def stream() -> Response:
+    """ Stream of Server-Sent Events with the progress bar changes. First, a "snapshot" event is sent with the list of
+      all the active progress bars. Then, a "bar" event is sent each time a progress bar is changed and a "remove" event
+      with the bar id each time a progress bar is finished or removed. If the parameter "bar_id" is given, only the
+      events of that progress bar are sent.
+    :return: The event stream response.
+    """
+    bar_id = request.args.get('bar_id')
+    queue = get_feed().subscribe()
+
+    def events() -> Iterator[str]:
+        try:
+            yield sse(SNAPSHOT_EVENT, filter_bars(snapshot(), bar_id))
+            while True:
+                try:
+                    event, data = queue.get(timeout=KEEP_ALIVE)
+                except Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event == SNAPSHOT_EVENT:
+                    yield sse(event, filter_bars(snapshot(), bar_id))
+                elif event == BAR_EVENT and (bar_id is None or data['bar_id'] == bar_id):
+                    yield sse(event, data)
+                elif event == REMOVE_EVENT and (bar_id is None or data == bar_id):
+                    yield sse(event, data)
+        finally:
+            get_feed().unsubscribe(queue)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def get_feed() -> BarFeed:
+    """ Get the feed of progress bar changes, starting it the first time that it is used.
+    :return: The feed of progress bar changes.
+    """
+    global store, feed
+    with feed_lock:
+        if feed is None:
+            feed = BarFeed(store, min(interval / 1000, 1))
+            feed.start()
+        return feed
+
+
+def snapshot() -> list:
+    """
+    :return: The cached state of all the active progress bars.
+    """
+    cache.get()
+    return board.bars()
+
+
+def filter_bars(bars: list, bar_id: str = None) -> list:
+    """ Filter a list of progress bars by its id.
+    :param bars: The list of progress bars.
+    :param bar_id: The bar id to select. If None, all the progress bars are selected.
+    :return: The selected progress bars.
+    """
+    return bars if bar_id is None else [bar for bar in bars if bar['bar_id'] == bar_id]
+
+
+def sse(event: str, data: Union[dict, list, str]) -> str:
+    """ Format a Server-Sent Event.
+    :param event: The event type.
+    :param data: The event data, which is serialized to JSON.
+    :return: The formatted event.
+    """
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
 
 
 def start_server(title: str = DEF_TITLE, host: str = DEF_HOST, port: int = DEF_PORT,  db_host: str = DEF_DB_HOST,
                  db_port: int = DEF_DB_PORT, replicaset: str = None, db_name: str = DEF_DB_NAME,
-                 seconds_interval: int = DEF_INTERVAL * 1000) -> None:
+                 seconds_interval: int = DEF_INTERVAL * 1000, cache_ttl: float = DEF_CACHE_TTL,
+                 db_type: str = DEF_DB_TYPE, db_path: str = None, checkpoint: float = DEF_CHECKPOINT,
+                 retention: float = DEF_RETENTION, stale_timeout: float = DEF_STALE_TIMEOUT) -> None:
     """ Start the server.
     :param title: The web page title.
     :param host: The web page host.
@@ -114,19 +516,89 @@ def start_server(title: str = DEF_TITLE, host: str = DEF_HOST, port: int = DEF_P
     :param replicaset: The MongoDB replicaset.
     :param db_name: The database name.
     :param seconds_interval: The interval between the web page refreshing.
+    :param cache_ttl: The seconds while the snapshot of the active progress bars is reused by all the clients.
+    :param db_type: The database type, "mongo", "sqlite" or "shm".
+    :param db_path: Only for the database types "sqlite" and "shm". The database file path. By default, the same
+       default path than the progress bars.
+    :param checkpoint: The seconds between two saves of the progress bars received by the ingest API. If 0, they are
+       only saved when they finish.
+    :param retention: The days while the finished executions are kept. The older ones are compacted into daily rollups
+       each hour. If 0, they are kept forever.
+    :param stale_timeout: The seconds without heartbeat to archive a progress bar as aborted. If 0, they are never
+       archived.
     """
-    global db, web_title, interval
-    web_title, interval = title, seconds_interval
-    client = connect_db(db_host, db_port, replicaset)
-    db = client[db_name]
+    global store, web_title, interval, stale_seconds
+    web_title, interval, stale_seconds, cache.ttl = title, seconds_interval, stale_timeout, cache_ttl
+    store = MeteredStore(init_store(db_type, db_host, db_port, replicaset, db_name, db_path))
+    if checkpoint > 0:
+        Thread(target=save_checkpoints, args=(checkpoint,), name='dbtqdm-checkpoint', daemon=True).start()
+    if retention > 0:
+        Thread(target=compact_stats, args=(retention,), name='dbtqdm-retention', daemon=True).start()
+    if stale_timeout > 0:
+        Thread(target=reap_bars, args=(stale_timeout,), name='dbtqdm-reaper', daemon=True).start()
+    if db_type == 'mongo':
+        Thread(target=migrate_bars, args=(MIGRATION_INTERVAL,), name='dbtqdm-migration', daemon=True).start()
     app.run(host, port)
 
 
+def init_store(db_type: str = DEF_DB_TYPE, db_host: str = DEF_DB_HOST, db_port: int = DEF_DB_PORT,
+               replicaset: str = None, db_name: str = DEF_DB_NAME, db_path: str = None) -> BarStore:
+    """ Open the store of the progress bars for a database type.
+    :param db_type: The database type, "mongo", "sqlite" or "shm".
+    :param db_host: Only for MongoDB. The database host.
+    :param db_port: Only for MongoDB. The database port.
+    :param replicaset: Only for MongoDB. The replicaset.
+    :param db_name: Only for MongoDB. The database name.
+    :param db_path: Only for SQLite and shared memory. The database file path. By default, the same default path
+       than the progress bars.
+    :return: The progress bar store.
+    """
+    if db_type == 'sqlite':
+        from dbtqdm.sqlite import connect_db as connect_sqlite
+        from dbtqdm.sqlite.store import SQLiteStore
+        return SQLiteStore(connect_sqlite(db_path or DEF_DB_PATH))
+    if db_type == 'shm':
+        from dbtqdm.shm import open_table
+        from dbtqdm.shm.store import ShmStore
+        return ShmStore(open_table(db_path or DEF_SHM_PATH))
+    from dbtqdm.mongo.store import MongoStore
+    return MongoStore(init_db(db_host, db_port, replicaset, db_name))
+
+
+def init_db(db_host: str = DEF_DB_HOST, db_port: int = DEF_DB_PORT, replicaset: str = None,
+            db_name: str = DEF_DB_NAME) -> 'Database':
+    """ Connect with the database, creating its indexes and migrating the progress bars stored with the old layout.
+    :param db_host: The database host.
+    :param db_port: The database port.
+    :param replicaset: The MongoDB replicaset.
+    :param db_name: The database name.
+    :return: The database.
+    """
+    from dbtqdm.mongo.utils import connect_db, ensure_indexes, migrate_collections
+    db = connect_db(db_host, db_port, replicaset)[db_name]
+    ensure_indexes(db)
+    migrated = migrate_collections(db)
+    if migrated:
+        logger.info(f'{migrated} progress bars have been migrated to the collection "{ACTIVE_COLLECTION}".')
+    return db
+
+
 def main() -> None:
     """ The main function. """
     args = TqdmArgParser()
-    start_server(args.title, args.host, args.port, args.db_host, args.db_port, args.replicaset, args.database,
-                 args.interval)
+    if args.compact:
+        compacted = init_store(args.db_type, args.db_host, args.db_port, args.replicaset, args.database,
+                               args.db_path).compact(retention_limit(args.retention))
+        print(f'{compacted} finished progress bars have been compacted into daily rollups.')
+    elif args.server_mode == 'async':
+        from dbtqdm.aserver import start_server as start_async_server
+        start_async_server(args.title, args.host, args.port, args.db_host, args.db_port, args.replicaset,
+                           args.database, args.interval, args.cache_ttl, args.checkpoint, args.retention,
+                           args.stale_timeout)
+    else:
+        start_server(args.title, args.host, args.port, args.db_host, args.db_port, args.replicaset, args.database,
+                     args.interval, args.cache_ttl, args.db_type, args.db_path, args.checkpoint, args.retention,
+                     args.stale_timeout)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,2 @@
+from .shm import ShmTqdm as tqdm
+from .table import SlotTable, TableFullError, open_table
@@ -0,0 +1,152 @@
+from math import isnan
+from typing import List, Union, Tuple, Sequence
+
+from dbtqdm.consts import DEF_STATS_LIMIT
+from dbtqdm.shm.table import SlotTable, Numbers, Text, ACTIVE, FINISHED
+from dbtqdm.store import BarStore, StatsKey, select_stats
+from dbtqdm.utils import expand_bar
+
+
+def slot_bar(numbers: Numbers, text: Text, aborted: bool = False) -> dict:
+    """ Convert the fields of a slot into the progress bar information.
+    :param numbers: The numeric fields of the slot.
+    :param text: The text fields of the slot.
+    :param aborted: If True, the slot is active but its owner process has died, so it is converted into an execution
+       which has not finished and ends in the last write of the slot, like the aborted ones of the other databases.
+    :return: The progress bar information, with the same fields than the other databases.
+    """
+    _, status, n, total, initial, elapsed, rate, start, updated, end, unit_scale, unit_divisor = numbers
+    bar_name, suffix, unit, colour, desc = text
+    bar = expand_bar({
+        'bar_name': bar_name, 'suffix': suffix, 'n': n, 'total': None if isnan(total) else total, 'elapsed': elapsed,
+        'rate': None if isnan(rate) else rate, 'initial': initial, 'unit': unit,
+        'unit_scale': bool(unit_scale) if unit_scale in (0, 1) else unit_scale, 'unit_divisor': unit_divisor,
+        'desc': desc, 'colour': colour or None, 'start': start, 'end': updated if aborted else end,
+        'finished': status == FINISHED or aborted
+    })
+    if aborted:
+        bar.update(finished=False, aborted=True)
+    return bar
+
+
+class ShmStore(BarStore):
+    """ Access of the server to the progress bars stored in a memory-mapped slot table. The server maps the same file
+      than the progress bars, therefore, reading them does not need any query. The only system call is the check of
+      the owner process of each active slot, because a process killed without finishing its progress bars leaves
+      their slots active.
+    """
+
+    @property
+    def table(self) -> SlotTable:
+        """
+        :return: The slot table.
+        """
+        return self._table
+
+    def __init__(self, table: SlotTable) -> None:
+        """ Constructor.
+        :param table: The slot table.
+        """
+        self._table = table
+
+    def active(self) -> List[dict]:
+        """
+        :return: All the active progress bars whose owner process is still alive.
+        """
+        return [slot_bar(*content) for slot, content in self._slots(ACTIVE) if self._table.alive(slot)]
+
+    def last_stats(self, bar_id: str) -> Union[dict, None]:
+        """ Get the last finished or aborted execution of a progress bar, if its slot has not been reused yet.
+        :param bar_id: The bar id.
+        :return: The progress bar information or None if there is no finished progress bar with that id.
+        """
+        bars = [bar for bar in self._executions() if bar['bar_id'] == bar_id]
+        return max(bars, key=lambda bar: bar['end_time']) if bars else None
+
+    def stats(self, bar_name: str = None, suffix: str = None, since: float = None, until: float = None,
+              after: StatsKey = None, limit: int = DEF_STATS_LIMIT, fields: Sequence[str] = None) -> List[dict]:
+        """ Get the finished executions of the progress bars whose slots have not been reused yet. The slot table has
+          no indexes, but it has a fixed number of slots, so they are filtered and sorted in memory.
+        :param bar_name: If it is given, only the executions with this bar name.
+        :param suffix: If it is given, only the executions with this suffix.
+        :param since: If it is given, only the executions started at this timestamp or later.
+        :param until: If it is given, only the executions started before this timestamp.
+        :param after: If it is given, only the executions after this key of start time, bar name and suffix.
+        :param limit: The maximum number of executions.
+        :param fields: If it is given, only these fields and the key ones.
+        :return: The finished executions.
+        """
+        return select_stats(self._executions(), bar_name, suffix, since, until, after, limit, fields)
+
+    def compact(self, before: float) -> int:
+        """ The finished slots are reused by the next progress bars, so there is nothing to compact.
+        :param before: The timestamp.
+        :return: Always 0.
+        """
+        return 0
+
+    def rollups(self, bar_name: str = None, since: float = None, until: float = None,
+                limit: int = DEF_STATS_LIMIT) -> List[dict]:
+        """ The slot table does not record rollups.
+        :param bar_name: The bar name.
+        :param since: The start timestamp.
+        :param until: The end timestamp.
+        :param limit: The maximum number of rollups.
+        :return: Always an empty list.
+        """
+        return []
+
+    def history(self, bar_id: str) -> Union[dict, None]:
+        """ The slot table does not record the progress bar history.
+        :param bar_id: The bar id.
+        :return: Always None.
+        """
+        return None
+
+    def remove(self, bar_id: str) -> bool:
+        """ Remove an active progress bar, marking its slot as free.
+        :param bar_id: The bar id.
+        :return: True if the progress bar has been removed, False if it does not exist.
+        """
+        removed = False
+        for slot, (_, text) in self._slots(ACTIVE):
+            if text[0] + text[1] == bar_id:
+                self._table.release(slot)
+                removed = True
+        return removed
+
+    def save(self, bars: List[dict]) -> None:
+        """ The slots are only written by the progress bars of this host, therefore, the progress bars received by
+          other ways are not saved.
+        :param bars: The progress bars.
+        """
+        pass
+
+    def finish(self, bar: dict) -> None:
+        """ The slots are only written by the progress bars of this host, therefore, the progress bars received by
+          other ways are not saved.
+        :param bar: The finished progress bar.
+        """
+        pass
+
+    def _executions(self) -> List[dict]:
+        """ Read the finished executions, including the active slots whose owner process has died without finishing
+          them, for example, because it has been killed, which are returned as aborted. These slots are reused by the
+          next progress bars when there are no free ones.
+        :return: The finished and aborted executions.
+        """
+        return [slot_bar(*content) for _, content in self._slots(FINISHED)] + \
+            [slot_bar(*content, aborted=True) for slot, content in self._slots(ACTIVE) if not self._table.alive(slot)]
+
+    def _slots(self, status: int) -> List[Tuple[int, Tuple[Numbers, Text]]]:
+        """ Read the slots with a status.
+        :param status: The slot status.
+        :return: A list of pairs with the slot number and its content.
+        """
+        slots = []
+        for slot in range(self._table.slots):
+            if self._table.status(slot) == status:
+                content = self._table.read(slot)
+                if content is not None and content[0][1] == status:
+                    slots.append((slot, content))
+        return slots
@@ -0,0 +1,220 @@
+import mmap
+import os
+from contextlib import contextmanager
+from struct import Struct
+from threading import Lock
+from typing import Dict, Tuple, Union, Iterator
+
+try:
+    from fcntl import flock, LOCK_EX, LOCK_UN
+except ImportError:  # Windows
+    flock = None
+
+from dbtqdm.consts import DEF_SHM_PATH, DEF_SHM_SLOTS
+
+MAGIC = b'DBTQDM\x00\x01'
+FREE, ACTIVE, FINISHED = 0, 1, 2
+HEADER = Struct('=8sII')
+HEADER_SIZE = 64
+SEQUENCE = Struct('=Q')
+OWNER = Struct('=II')
+NUMBERS = Struct('=IIdddddddddd')
+TEXT = Struct('=64s32s16s16s128s')
+NUMBERS_OFFSET, TEXT_OFFSET, SLOT_SIZE = SEQUENCE.size, SEQUENCE.size + NUMBERS.size, 384
+MAX_RETRIES = 100
+
+Numbers = Tuple[int, int, float, float, float, float, float, float, float, float, float, float]
+Text = Tuple[str, str, str, str, str]
+
+
+class TableFullError(Exception):
+    """ There are no free slots in the table. """
+    pass
+
+
+class SlotTable(object):
+    """ Table of progress bars stored in a memory-mapped file, where each progress bar owns a fixed-size slot.
+      Each slot contains a sequence counter, the owner process id, the status, the numeric fields (n, total, initial,
+      elapsed, rate, start, updated, end, unit_scale and unit_divisor) and the bounded text fields (bar_name, suffix,
+      unit, colour and desc). The owner writes its slot in place, without locks nor system calls, increasing the
+      sequence counter before and after each write (seqlock), therefore, the readers detect and retry torn reads.
+      Only claiming a slot locks the file.
+    """
+
+    @property
+    def path(self) -> str:
+        """
+        :return: The table file path.
+        """
+        return self._path
+
+    @property
+    def slots(self) -> int:
+        """
+        :return: The number of slots of the table.
+        """
+        return self._slots
+
+    def __init__(self, path: str = DEF_SHM_PATH, slots: int = DEF_SHM_SLOTS) -> None:
+        """ Constructor. If the file does not exist, it is created.
+        :param path: The table file path.
+        :param slots: The number of slots if the file is created. If the file exists, its number of slots is used.
+        """
+        self._path, self._lock = path, Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        with self._locked():
+            if os.fstat(self._fd).st_size < HEADER_SIZE:
+                os.ftruncate(self._fd, HEADER_SIZE + slots * SLOT_SIZE)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, HEADER.pack(MAGIC, slots, SLOT_SIZE))
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            magic, self._slots, slot_size = HEADER.unpack(os.read(self._fd, HEADER.size))
+        if magic != MAGIC or slot_size != SLOT_SIZE:
+            os.close(self._fd)
+            raise ValueError(f'The file "{path}" is not a progress bar table.')
+        self._mm = mmap.mmap(self._fd, HEADER_SIZE + self._slots * SLOT_SIZE)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """ Lock the table file for this process and the other ones. """
+        with self._lock:
+            if flock is not None:
+                flock(self._fd, LOCK_EX)
+            try:
+                yield
+            finally:
+                if flock is not None:
+                    flock(self._fd, LOCK_UN)
+
+    def claim(self) -> Tuple[int, int]:
+        """ Claim a slot for a progress bar of this process. It uses a free slot if there is any, otherwise, the slot
+          of the oldest finished progress bar or the slot of a process which does not exist anymore.
+        :return: A tuple with the slot number and its sequence counter.
+        :raise TableFullError: If all the slots are used by active progress bars.
+        """
+        with self._locked():
+            finished, dead = None, None
+            for slot in range(self._slots):
+                pid, status = OWNER.unpack_from(self._mm, self._offset(slot) + NUMBERS_OFFSET)
+                if status == FREE and not _alive(pid):
+                    break
+                if status == FINISHED:
+                    end = NUMBERS.unpack_from(self._mm, self._offset(slot) + NUMBERS_OFFSET)[9]
+                    finished = (slot, end) if finished is None or end < finished[1] else finished
+                elif dead is None and not _alive(pid):
+                    dead = slot
+            else:
+                slot = finished[0] if finished is not None else dead
+                if slot is None:
+                    raise TableFullError(f'There are no free slots in the progress bar table "{self._path}".')
+            sequence = SEQUENCE.unpack_from(self._mm, self._offset(slot))[0]
+            sequence += sequence & 1
+            numbers = (os.getpid(), ACTIVE) + (0.0,) * 10
+            return slot, self.write(slot, sequence, numbers, ('', '', '', '', ''))
+
+    def write(self, slot: int, sequence: int, numbers: Numbers, text: Union[Text, None] = None) -> int:
+        """ Write a slot. Only the process which has claimed the slot can write it.
+        :param slot: The slot number.
+        :param sequence: The sequence counter returned by the previous write or claim.
+        :param numbers: The owner pid, the status and the numeric fields.
+        :param text: The text fields. If None, they are not changed.
+        :return: The new sequence counter.
+        """
+        offset = self._offset(slot)
+        SEQUENCE.pack_into(self._mm, offset, sequence + 1)
+        NUMBERS.pack_into(self._mm, offset + NUMBERS_OFFSET, *numbers)
+        if text is not None:
+            TEXT.pack_into(self._mm, offset + TEXT_OFFSET, *(value.encode('utf-8') for value in text))
+        SEQUENCE.pack_into(self._mm, offset, sequence + 2)
+        return sequence + 2
+
+    def read(self, slot: int) -> Union[Tuple[Numbers, Text], None]:
+        """ Read a consistent copy of a slot, retrying if it is being written.
+        :param slot: The slot number.
+        :return: A tuple with the numeric fields and the text fields, or None if the slot could not be read.
+        """
+        offset = self._offset(slot)
+        for _ in range(MAX_RETRIES):
+            data = self._mm[offset:offset + SLOT_SIZE]
+            sequence = SEQUENCE.unpack_from(data)[0]
+            if not sequence & 1 and sequence == SEQUENCE.unpack_from(self._mm, offset)[0]:
+                text = tuple(value.rstrip(b'\x00').decode('utf-8', 'ignore')
+                             for value in TEXT.unpack_from(data, TEXT_OFFSET))
+                return NUMBERS.unpack_from(data, NUMBERS_OFFSET), text
+        return None
+
+    def status(self, slot: int) -> int:
+        """
+        :param slot: The slot number.
+        :return: The slot status: FREE, ACTIVE or FINISHED.
+        """
+        return OWNER.unpack_from(self._mm, self._offset(slot) + NUMBERS_OFFSET)[1]
+
+    def release(self, slot: int) -> None:
+        """ Mark a slot as free without changing its owner. If the owner is still alive, the slot is not reused and
+          it will be marked as active again with the next write of its owner.
+        :param slot: The slot number.
+        """
+        OWNER.pack_into(self._mm, self._offset(slot) + NUMBERS_OFFSET, self.owner(slot), FREE)
+
+    def owner(self, slot: int) -> int:
+        """
+        :param slot: The slot number.
+        :return: The process id of the slot owner.
+        """
+        return OWNER.unpack_from(self._mm, self._offset(slot) + NUMBERS_OFFSET)[0]
+
+    def alive(self, slot: int) -> bool:
+        """
+        :param slot: The slot number.
+        :return: True if the process which owns the slot still exists, otherwise False.
+        """
+        return _alive(self.owner(slot))
+
+    def _offset(self, slot: int) -> int:
+        """
+        :param slot: The slot number.
+        :return: The position of the slot in the file.
+        """
+        return HEADER_SIZE + slot * SLOT_SIZE
+
+
+def _alive(pid: int) -> bool:
+    """ Check if a process exists.
+    :param pid: The process id.
+    :return: True if the process exists, otherwise False.
+    """
+    if not pid:
+        return False
+    if os.name == 'nt':  # The signal 0 is CTRL_C_EVENT in Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_tables: Dict[str, SlotTable] = {}
+_pid = os.getpid()
+_lock = Lock()
+
+
+def open_table(path: str = DEF_SHM_PATH, slots: int = DEF_SHM_SLOTS) -> SlotTable:
+    """ Open a table file. The tables are shared in the same process by file path. After a fork, the child process
+      opens the file again, because the file locks of the parent are shared with it.
+    :param path: The table file path.
+    :param slots: The number of slots if the file is created.
+    :return: The table.
+    """
+    global _pid
+    key = os.path.abspath(path)
+    with _lock:
+        if _pid != os.getpid():
+            _tables.clear()
+            _pid = os.getpid()
+        if key not in _tables:
+            _tables[key] = SlotTable(path, slots)
+        return _tables[key]
@@ -0,0 +1,9 @@
+from .sqlite import SQLiteTqdm as tqdm
+
+
+def __getattr__(name: str):
+    """ Import the database utilities only when they are used. """
+    if name in ['connect_db', 'release_db']:
+        from . import utils
+        return getattr(utils, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,208 @@
+from collections import deque
+from io import StringIO, TextIOWrapper
+from json import dumps
+from threading import Lock
+from time import time
+from typing import Tuple, Union, Any, Iterable, TYPE_CHECKING
+
+from dbtqdm import DatabaseTqdm
+from dbtqdm.consts import STATS_COLLECTION, ACTIVE_COLLECTION, HISTORY_COLLECTION, DEF_DB_NAME, DEF_DB_PATH, \
+    DEF_HISTORY_INTERVAL, HISTORY_SIZE
+from dbtqdm.utils import str2bool, json_default
+from dbtqdm.writer import get_writer
+
+if TYPE_CHECKING:
+    from dbtqdm.sqlite.utils import Statement
+
+UPSERT_BAR = f'INSERT OR REPLACE INTO "{ACTIVE_COLLECTION}" (bar_id, bar) VALUES (?, ?)'
+DELETE_BAR = f'DELETE FROM "{ACTIVE_COLLECTION}" WHERE bar_id = ?'
+UPSERT_STATS = f'INSERT OR REPLACE INTO "{STATS_COLLECTION}" (bar_id, bar_name, suffix, start_time, end_time, bar) ' \
+               f'VALUES (?, ?, ?, ?, ?, ?)'
+UPSERT_HISTORY = f'INSERT OR REPLACE INTO "{HISTORY_COLLECTION}" (bar_id, start, samples) VALUES (?, ?, ?)'
+
+
+class SQLiteTqdm(DatabaseTqdm):
+    """ Class to create a TQDM process bar based on a SQLite database file. """
+    def __init__(self, iterable: Iterable = None, desc: str = None, total: float = None, leave: bool = True,
+                 file: Union[TextIOWrapper, StringIO] = None, n_cols: int = None, min_interval: float = 0.1,
+                 max_interval: float = 10.0, miniters: Union[int, float] = None, ascii: Union[bool, str] = None,
+                 disable: bool = False, unit: str = 'it', unit_scale: Union[bool, int, float] = False,
+                 dynamic_n_cols: bool = False, smoothing: float = 0.3, bar_format: str = None,
+                 initial: Union[int, float] = 0, position: int = None, postfix: Union[dict, Any] = None,
+                 unit_divisor: float = 1000, write_bytes: bool = None, lock_args: Tuple = None,
+                 n_rows: int = None, colour: str = None, delay: float = 0, gui: bool = False,
+                 mode: str = 'auto', database: str = 'tqdm', name: str = None, suffix: str = None,
+                 path: str = None, asynchronous: bool = None, history_interval: float = None,
+                 max_writes: float = None, **kwargs) -> None:
+        """
+        :param iterable: Iterable to decorate with a progressbar. Leave blank to manually manage the updates.
+        :param desc: Prefix for the progressbar.
+        :param total: The number of expected iterations. If unspecified, len(iterable) is used if possible.
+           If float("inf") or as a last resort, only basic progress statistics are displayed (no ETA, no progressbar).
+           If `gui` is True and this parameter needs subsequent updating, specify an initial arbitrary large positive
+           number, e.g. 9e9.
+        :param leave: If [default: True], keeps all traces of the progressbar upon termination of iteration.
+           If `None`, will leave only if `position` is `0`.
+        :param file: Specifies where to output the progress messages (default: sys.stderr).
+           Uses `file.write(str)` and `file.flush()` methods.  For encoding, see `write_bytes`.
+        :param n_cols: The width of the entire output message. If specified, dynamically resizes the progressbar to stay
+           within this bound. If unspecified, attempts to use environment width. The fallback is a meter width of 10 and
+           no limit for the counter and statistics. If 0, will not print any meter (only stats).
+        :param min_interval: Minimum progress display update interval [default: 0.1] seconds.
+        :param max_interval: Maximum progress display update interval [default: 10] seconds. Automatically adjusts
+           `miniters` to correspond to `min_interval` after long display update lag. Only works if `dynamic_miniters`
+           or monitor thread is enabled.
+        :param miniters: Minimum progress display update interval, in iterations. If 0 and `dynamic_miniters`,
+           will automatically adjust to equal `mininterval` (more CPU efficient, good for tight loops).
+           If > 0, will skip display of specified number of iterations.
+           Tweak this and `mininterval` to get very efficient loops. If your progress is erratic with both fast and slow
+           iterations (network, skipping items, etc) you should set miniters=1.
+        :param ascii: If unspecified or False, use unicode (smooth blocks) to fill the meter.
+           The fallback is to use ASCII characters " 123456789#".
+        :param disable: Whether to disable the entire progressbar wrapper [default: False].
+           If set to None, disable on non-TTY.
+        :param unit: String that will be used to define the unit of each iteration [default: it].
+        :param unit_scale: If 1 or True, the number of iterations will be reduced/scaled automatically and a metric
+           prefix following the International System of Units standard will be added (kilo, mega, etc.)
+           [default: False]. If any other non-zero number, will scale `total` and `n`.
+        :param dynamic_n_cols: If set, constantly alters `ncols` and `nrows` to the environment
+           (allowing for window resizes) [default: False].
+        :param smoothing: Exponential moving average smoothing factor for speed estimates (ignored in GUI mode).
+           Ranges from 0 (average speed) to 1 (current/instantaneous speed) [default: 0.3].
+        :param bar_format: Specify a custom bar string formatting. May impact performance.
+           [default: '{l_bar}{bar}{r_bar}'], where l_bar='{desc}: {percentage:3.0f}%|' and
+           r_bar='| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, ' '{rate_fmt}{postfix}]'
+           Possible vars: l_bar, bar, r_bar, n, n_fmt, total, total_fmt, percentage, elapsed, elapsed_s, ncols, nrows,
+           desc, unit, rate, rate_fmt, rate_noinv, rate_noinv_fmt, rate_inv, rate_inv_fmt, postfix, unit_divisor,
+           remaining, remaining_s, eta.
+           Note that a trailing ": " is automatically removed after {desc} if the latter is empty.
+        :param initial: The initial counter value. Useful when restarting a progress bar [default: 0].
+           If using float, consider specifying `{n:.3f}` or similar in `bar_format`, or specifying `unit_scale`.
+        :param position: Specify the line offset to print this bar (starting from 0). Automatic if unspecified.
+           Useful to manage multiple bars at once (eg, from threads).
+        :param postfix: Specify additional stats to display at the end of the bar.
+           Calls `set_postfix(**postfix)` if possible (dict).
+        :param unit_divisor: [default: 1000], ignored unless `unit_scale` is True.
+        :param write_bytes: If (default: None) and `file` is unspecified, bytes will be written in Python 2.
+            If `True` will also write bytes. In all other cases will default to unicode.
+        :param lock_args: Passed to `refresh` for intermediate output (initialisation, iterating, and updating).
+        :param n_rows: The screen height. If specified, hides nested bars outside this bound.
+            If unspecified, attempts to use environment height. The fallback is 20.
+        :param colour: Bar colour (e.g. 'green', '#00ff00').
+        :param delay: Don't display until [default: 0] seconds have elapsed.
+        :param gui: WARNING: internal parameter - do not use. Use tqdm.gui.tqdm(...) instead.
+            If set, will attempt to use matplotlib animations for a graphical output [default: False].
+        :param mode: Two modes: auto (normal tqdm behavior), or sqlite (using a SQLite database file as bar progress).
+            If it is not set, this function will check if there is the environment variable TQDM_MODE. By default, auto.
+        :param path: Only for mode 'sqlite'. The database file path. Several processes of the same host can use the same
+           file, and the server can read it while they are writing. If it is not set, this function will check if there
+           is the environment variable TQDM_PATH. By default, tqdm.db in the current directory.
+        :param asynchronous: Only for mode 'sqlite'. If True, the changes are saved by a background thread, therefore,
+           the iteration thread never waits for the database, and the changes of all the progress bars of the process
+           are saved in the same transaction. If it is not set, this function will check if there is the environment
+           variable TQDM_ASYNC. By default, False.
+        :param history_interval: Only for mode 'sqlite'. The minimum seconds between two samples of the progress bar
+           history, which is used to draw the bar throughput. Only the last samples are kept. If 0, the history is not
+           recorded. If it is not set, this function will check if there is the environment variable
+           TQDM_HISTORY_INTERVAL. By default, 1 second.
+        :param max_writes: Only for mode 'sqlite'. The maximum number of database writes per second of the whole
+           process, which is shared fairly among all its active progress bars. The changes are only written if the
+           position, total, description, postfix or colour have changed, but the first and the final state are always
+           written. If it is not set, this function will check if there is the environment variable TQDM_MAX_WRITES.
+           By default, there is no limit.
+        :param database: The database name. It is ignored in mode 'sqlite', use the path instead.
+        :param bar_name: Only for mode 'sqlite'. The bar progress name. If it is not set, this function will check if
+           there is the environment variable TQDM_NAME. If it is not given, neither parameter o environment variable,
+           then an exception is raised.
+        :param suffix: Only for mode 'sqlite'. If it is set, the name is form concatenating the bar name with this suffix
+           (name + suffix). This method will use when the bar name is given by environment variable instead of
+           constructor parameter, in order to have several bar progress for the same name.
+
+        :return:  decorated iterator.
+        """
+        self.__db, self.__asynchronous, self.__history_interval = None, False, 0
+        self.__samples, self.__last_sample, self.__history_lock = deque(maxlen=HISTORY_SIZE), 0, Lock()
+        self._mode = self._db_property('mode', mode, 'TQDM_MODE', False, 'auto')
+        if self._mode == 'sqlite':
+            path = self._db_property('path', path, 'TQDM_PATH', default=DEF_DB_PATH)
+            database = self._db_property('db', database, 'TQDM_DB', default=DEF_DB_NAME)
+            bar_name = self._db_property('name', name, 'TQDM_NAME', required=True)
+            suffix = self._db_property('suffix', suffix, 'TQDM_SUFFIX', default='')
+            self.__asynchronous = str2bool(self._db_property('asynchronous', asynchronous, 'TQDM_ASYNC', default=False))
+            self.__history_interval = float(self._db_property('history_interval', history_interval,
+                                                              'TQDM_HISTORY_INTERVAL', default=DEF_HISTORY_INTERVAL))
+            self._database, self._bar_name, self._suffix = database, bar_name, suffix
+            from dbtqdm.sqlite.utils import connect_db, release_db
+            # Bound now because the progress bars may be closed at interpreter shutdown, when nothing can be imported
+            self.__release_db = release_db
+            self.__db = connect_db(path)
+
+        self.disable = disable
+        super(SQLiteTqdm, self).__init__(iterable=iterable, desc=desc, total=total, leave=leave, file=file,
+                                         n_cols=n_cols, min_interval=min_interval, max_interval=max_interval,
+                                         miniters=miniters, ascii=ascii, disable=disable, unit=unit,
+                                         unit_scale=unit_scale, dynamic_n_cols=dynamic_n_cols, smoothing=smoothing,
+                                         bar_format=bar_format, initial=initial, position=position, postfix=postfix,
+                                         unit_divisor=unit_divisor, write_bytes=write_bytes, lock_args=lock_args,
+                                         n_rows=n_rows, colour=colour, delay=delay, gui=gui,
+                                         mode=self.mode, database=database, name=name, suffix=suffix,
+                                         max_writes=max_writes, **kwargs)
+
+    def save_changes(self) -> bool:
+        """ Save the current data of the progress bar into the SQLite database.
+          In asynchronous mode, the changes are only scheduled to be saved by the background writer.
+        """
+        if self.__db is None:
+            return False
+        recorded = self.__record_sample()
+        statement = (UPSERT_BAR, (self.bar_id, dumps(self.meter_dict(**self.format_dict), default=json_default)))
+        if self.__asynchronous:
+            get_writer().submit(id(self), self.__db, statement)
+            if recorded:
+                get_writer().submit((id(self), HISTORY_COLLECTION), self.__db, self.__history_statement)
+            return True
+        return bool(self.__db.bulk_write([statement, self.__history_statement()] if recorded else [statement]))
+
+    def __record_sample(self, force: bool = False) -> bool:
+        """ Record a sample of the progress bar history with the timestamp, the position and the rate,
+          if the history interval has elapsed since the previous sample. Only the last samples are kept.
+        :param force: If True, record the sample even if the history interval has not elapsed.
+        :return: True if the sample has been recorded, otherwise False.
+        """
+        now = time()
+        if not self.__history_interval or (now - self.__last_sample < self.__history_interval and not force):
+            return False
+        self.__last_sample, n, elapsed = now, self.format_dict['n'], self.format_dict['elapsed']
+        rate = self.format_dict['rate']
+        rate = rate if rate is not None else (n - self.format_dict['initial']) / elapsed if elapsed else 0
+        with self.__history_lock:
+            self.__samples.append([now, n, rate])
+        return True
+
+    def __history_statement(self) -> 'Statement':
+        """ Create the statement to save the recorded samples into the history table. The history of previous
+          executions of the same progress bar is replaced.
+        :return: The statement with its parameters.
+        """
+        with self.__history_lock:
+            samples = dumps(list(self.__samples))
+        return UPSERT_HISTORY, (self.bar_id, self.start, samples)
+
+    def close_bar(self, bar: dict) -> None:
+        """ The  final action when the progress bar is finished.
+          It removes the progress bar from the active ones and stores it into the stats table in the same transaction.
+        :param bar: The progress bar information.
+        """
+        if self.__db is not None:
+            if self.__asynchronous:
+                get_writer().discard(id(self))
+                get_writer().discard((id(self), HISTORY_COLLECTION))
+            statements = [(DELETE_BAR, (self.bar_id,))]
+            if self.bar_name:
+                statements.append((UPSERT_STATS, (self.bar_id, self.bar_name, self.suffix, self.start,
+                                                  bar.get('end_time'), dumps(bar, default=json_default))))
+            if self.__record_sample(force=True):
+                statements.append(self.__history_statement())
+            db, self.__db = self.__db, None
+            db.bulk_write(statements)
+            self.__release_db(db)
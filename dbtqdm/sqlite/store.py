@@ -0,0 +1,178 @@
+from json import loads, dumps
+from typing import List, Union, Sequence, Tuple, Any
+
+from dbtqdm.consts import ACTIVE_COLLECTION, STATS_COLLECTION, HISTORY_COLLECTION, ROLLUP_COLLECTION, \
+    DEF_STATS_LIMIT
+from dbtqdm.sqlite.sqlite import UPSERT_BAR, DELETE_BAR, UPSERT_STATS
+from dbtqdm.sqlite.utils import SQLiteDatabase
+from dbtqdm.store import BarStore, StatsKey, DAY, project, day_start, daily_rollups, merge_rollups, aborted_bar
+from dbtqdm.utils import json_default
+
+SELECT_ACTIVE = f'SELECT bar FROM "{ACTIVE_COLLECTION}"'
+SELECT_LAST_STATS = f'SELECT bar FROM "{STATS_COLLECTION}" WHERE bar_id = ? ORDER BY start_time DESC LIMIT 1'
+SELECT_STATS = f'SELECT bar FROM "{STATS_COLLECTION}"{{}} ORDER BY start_time DESC, bar_name DESC, suffix DESC LIMIT ?'
+SELECT_OLDEST = f'SELECT MIN(start_time) FROM "{STATS_COLLECTION}" WHERE start_time < ?'
+SELECT_DAY = f'SELECT rowid, bar FROM "{STATS_COLLECTION}" WHERE start_time >= ? AND start_time < ?'
+DELETE_RUN = f'DELETE FROM "{STATS_COLLECTION}" WHERE rowid = ?'
+SELECT_ROLLUP = f'SELECT rollup FROM "{ROLLUP_COLLECTION}" WHERE bar_name = ? AND start_time = ?'
+UPSERT_ROLLUP = f'INSERT OR REPLACE INTO "{ROLLUP_COLLECTION}" (bar_name, start_time, rollup) VALUES (?, ?, ?)'
+SELECT_ROLLUPS = f'SELECT rollup FROM "{ROLLUP_COLLECTION}"{{}} ORDER BY start_time DESC, bar_name DESC LIMIT ?'
+SELECT_HISTORY = f'SELECT start, samples FROM "{HISTORY_COLLECTION}" WHERE bar_id = ?'
+SELECT_ACTIVE_ROWS = f'SELECT bar_id, bar FROM "{ACTIVE_COLLECTION}"'
+ARCHIVE_BAR = f'INSERT OR REPLACE INTO "{STATS_COLLECTION}" (bar_id, bar_name, suffix, start_time, end_time, bar) ' \
+              f'SELECT ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM "{ACTIVE_COLLECTION}" WHERE bar_id = ? AND bar = ?)'
+DELETE_SAME_BAR = f'DELETE FROM "{ACTIVE_COLLECTION}" WHERE bar_id = ? AND bar = ?'
+
+
+class SQLiteStore(BarStore):
+    """ Access of the server to the progress bars stored in a SQLite database file. The database is in WAL mode,
+      therefore, the server reads it while the progress bars are writing it.
+    """
+
+    @property
+    def db(self) -> SQLiteDatabase:
+        """
+        :return: The database.
+        """
+        return self._db
+
+    def __init__(self, db: SQLiteDatabase) -> None:
+        """ Constructor.
+        :param db: The database.
+        """
+        self._db = db
+
+    def active(self) -> List[dict]:
+        """
+        :return: All the active progress bars.
+        """
+        return [loads(bar) for bar, in self._db.query(SELECT_ACTIVE)]
+
+    def last_stats(self, bar_id: str) -> Union[dict, None]:
+        """ Get the last finished execution of a progress bar.
+        :param bar_id: The bar id.
+        :return: The progress bar information or None if that progress bar has never finished.
+        """
+        rows = self._db.query(SELECT_LAST_STATS, (bar_id,))
+        return loads(rows[0][0]) if rows else None
+
+    def stats(self, bar_name: str = None, suffix: str = None, since: float = None, until: float = None,
+              after: StatsKey = None, limit: int = DEF_STATS_LIMIT, fields: Sequence[str] = None) -> List[dict]:
+        """ Get the finished executions of the progress bars with an indexed query. The unique constraint of the stats
+          table is the sort key, so the query without filters reads its index backwards; the rest are served by
+          stats_name_ix, stats_suffix_ix or stats_bar_ix.
+        :param bar_name: If it is given, only the executions with this bar name.
+        :param suffix: If it is given, only the executions with this suffix.
+        :param since: If it is given, only the executions started at this timestamp or later.
+        :param until: If it is given, only the executions started before this timestamp.
+        :param after: If it is given, only the executions after this key of start time, bar name and suffix.
+        :param limit: The maximum number of executions.
+        :param fields: If it is given, only these fields and the key ones.
+        :return: The finished executions.
+        """
+        conditions: List[Tuple[str, Tuple[Any, ...]]] = []
+        if bar_name is not None and suffix is not None:
+            conditions.append(('bar_id = ?', (bar_name + suffix,)))
+        if bar_name is not None:
+            conditions.append(('bar_name = ?', (bar_name,)))
+        if suffix is not None:
+            conditions.append(('suffix = ?', (suffix,)))
+        if since is not None:
+            conditions.append(('start_time >= ?', (since,)))
+        if until is not None:
+            conditions.append(('start_time < ?', (until,)))
+        if after is not None:
+            conditions.append(('(start_time, bar_name, suffix) < (?, ?, ?)', tuple(after)))
+        where = ' WHERE ' + ' AND '.join(condition for condition, _ in conditions) if conditions else ''
+        params = tuple(param for _, values in conditions for param in values) + (limit,)
+        return [project(loads(bar), fields) for bar, in self._db.query(SELECT_STATS.format(where), params)]
+
+    def compact(self, before: float) -> int:
+        """ Compact the finished executions started before a timestamp into daily rollups, one day each time. The
+          rollups of a day are saved and its executions removed in the same transaction.
+        :param before: The timestamp.
+        :return: The number of compacted executions.
+        """
+        compacted = 0
+        while True:
+            oldest = self._db.query(SELECT_OLDEST, (before,))[0][0]
+            if oldest is None:
+                return compacted
+            day = day_start(oldest)
+            rows = self._db.query(SELECT_DAY, (day, min(day + DAY, before)))
+            statements = []
+            for new in daily_rollups(loads(bar) for _, bar in rows):
+                old = self._db.query(SELECT_ROLLUP, (new['bar_name'], new['start_time']))
+                merged = merge_rollups(loads(old[0][0]) if old else None, new)
+                statements.append((UPSERT_ROLLUP, (new['bar_name'], new['start_time'], dumps(merged))))
+            self._db.bulk_write(statements + [(DELETE_RUN, (rowid,)) for rowid, _ in rows])
+            compacted += len(rows)
+
+    def rollups(self, bar_name: str = None, since: float = None, until: float = None,
+                limit: int = DEF_STATS_LIMIT) -> List[dict]:
+        """ Get the daily rollups of the compacted executions with an indexed query.
+        :param bar_name: If it is given, only the rollups of this bar name.
+        :param since: If it is given, only the rollups of the days which start at this timestamp or later.
+        :param until: If it is given, only the rollups of the days which start before this timestamp.
+        :param limit: The maximum number of rollups.
+        :return: The rollups.
+        """
+        conditions = [(condition, param) for condition, param in [('bar_name = ?', bar_name),
+                                                                   ('start_time >= ?', since),
+                                                                   ('start_time < ?', until)] if param is not None]
+        where = ' WHERE ' + ' AND '.join(condition for condition, _ in conditions) if conditions else ''
+        params = tuple(param for _, param in conditions) + (limit,)
+        return [loads(rollup) for rollup, in self._db.query(SELECT_ROLLUPS.format(where), params)]
+
+    def history(self, bar_id: str) -> Union[dict, None]:
+        """ Get the history of the last execution of a progress bar.
+        :param bar_id: The bar id.
+        :return: A dict with the bar id, its start timestamp and the list of samples, or None if there is no history.
+        """
+        rows = self._db.query(SELECT_HISTORY, (bar_id,))
+        return {'bar_id': bar_id, 'start': rows[0][0], 'samples': loads(rows[0][1])} if rows else None
+
+    def remove(self, bar_id: str) -> bool:
+        """ Remove an active progress bar.
+        :param bar_id: The bar id.
+        :return: True if the progress bar has been removed, False if it does not exist.
+        """
+        return bool(self._db.execute(DELETE_BAR, (bar_id,)))
+
+    def save(self, bars: List[dict]) -> None:
+        """ Create or replace several active progress bars in a single transaction.
+        :param bars: The progress bars.
+        """
+        if bars:
+            self._db.bulk_write([(UPSERT_BAR, (bar['bar_id'], dumps(bar, default=json_default))) for bar in bars])
+
+    def finish(self, bar: dict) -> None:
+        """ Move a finished progress bar from the active progress bars to the stats table in a single transaction.
+        :param bar: The finished progress bar.
+        """
+        self._db.bulk_write([
+            (DELETE_BAR, (bar['bar_id'],)),
+            (UPSERT_STATS, (bar['bar_id'], bar['bar_name'], bar['suffix'], bar['start_time'], bar.get('end_time'),
+                            dumps(bar, default=json_default)))
+        ])
+
+    def reap(self, before: float) -> List[str]:
+        """ Archive as aborted the active progress bars whose last heartbeat is older than a timestamp. Only the
+          progress bars received by the ingest API and saved in the checkpoints have heartbeat. Each one is archived
+          and removed in a single transaction, only if it has not changed meanwhile.
+        :param before: The timestamp.
+        :return: The ids of the archived progress bars.
+        """
+        reaped = []
+        for bar_id, row in self._db.query(SELECT_ACTIVE_ROWS):
+            bar = loads(row)
+            if bar.get('heartbeat') is None or bar['heartbeat'] >= before:
+                continue
+            aborted = aborted_bar(bar)
+            if self._db.bulk_write([
+                (ARCHIVE_BAR, (bar_id, bar['bar_name'], bar['suffix'], aborted['start_time'], aborted['end_time'],
+                               dumps(aborted, default=json_default), bar_id, row)),
+                (DELETE_SAME_BAR, (bar_id, row))
+            ]):
+                reaped.append(bar_id)
+        return reaped
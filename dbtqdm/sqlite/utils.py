@@ -0,0 +1,134 @@
+import sqlite3
+from os import getpid
+from os.path import abspath
+from threading import Lock
+from typing import Dict, List, Tuple, Any, Iterable
+
+from dbtqdm.consts import ACTIVE_COLLECTION, STATS_COLLECTION, HISTORY_COLLECTION, ROLLUP_COLLECTION, DEF_DB_PATH, \
+    DEF_DB_TIMEOUT
+
+Statement = Tuple[str, Tuple]
+
+SCHEMA = [
+    f'CREATE TABLE IF NOT EXISTS "{ACTIVE_COLLECTION}" (bar_id TEXT PRIMARY KEY, bar TEXT NOT NULL)',
+    f'CREATE TABLE IF NOT EXISTS "{STATS_COLLECTION}" (bar_id TEXT NOT NULL, bar_name TEXT, suffix TEXT, '
+    f'start_time REAL NOT NULL, end_time REAL, bar TEXT NOT NULL, UNIQUE (start_time, bar_name, suffix))',
+    f'CREATE INDEX IF NOT EXISTS stats_bar_ix ON "{STATS_COLLECTION}" (bar_id, start_time DESC)',
+    f'CREATE INDEX IF NOT EXISTS stats_start_ix ON "{STATS_COLLECTION}" (start_time DESC)',
+    f'CREATE INDEX IF NOT EXISTS stats_name_ix ON "{STATS_COLLECTION}" (bar_name, start_time DESC, suffix DESC)',
+    f'CREATE INDEX IF NOT EXISTS stats_suffix_ix ON "{STATS_COLLECTION}" (suffix, start_time DESC, bar_name DESC)',
+    f'CREATE TABLE IF NOT EXISTS "{HISTORY_COLLECTION}" (bar_id TEXT PRIMARY KEY, start REAL NOT NULL, '
+    f'samples TEXT NOT NULL)',
+    f'CREATE TABLE IF NOT EXISTS "{ROLLUP_COLLECTION}" (bar_name TEXT NOT NULL, start_time REAL NOT NULL, '
+    f'rollup TEXT NOT NULL, PRIMARY KEY (bar_name, start_time))',
+    f'CREATE INDEX IF NOT EXISTS rollup_time_ix ON "{ROLLUP_COLLECTION}" (start_time DESC, bar_name DESC)'
+]
+
+
+class SQLiteDatabase(object):
+    """ SQLite database file in WAL mode shared by all the threads of the process. The readers, like the server,
+      do not block the writers, and the writers do not block the readers.
+    """
+
+    @property
+    def path(self) -> str:
+        """
+        :return: The database file path.
+        """
+        return self._path
+
+    def __init__(self, path: str = DEF_DB_PATH, timeout: float = DEF_DB_TIMEOUT) -> None:
+        """ Constructor. It creates the database tables and indexes if they do not exist.
+        :param path: The database file path.
+        :param timeout: The seconds to wait for the lock of other processes writing the same database.
+        """
+        self._path, self._lock = path, Lock()
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self.bulk_write([(statement, ()) for statement in SCHEMA])
+
+    def bulk_write(self, statements: Iterable[Statement], ordered: bool = False) -> int:
+        """ Execute several write statements in a single transaction. The statements are prepared once and reused.
+        :param statements: The pairs of SQL statement and parameters.
+        :param ordered: Ignored, the statements are always executed in order. It exists to be used as target of
+           the background writer.
+        :return: The number of modified rows.
+        """
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                rows = sum(max(self._connection.execute(sql, params).rowcount, 0) for sql, params in statements)
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+            return rows
+
+    def execute(self, sql: str, params: Tuple = ()) -> int:
+        """ Execute a write statement in its own transaction.
+        :param sql: The SQL statement.
+        :param params: The statement parameters.
+        :return: The number of modified rows.
+        """
+        return self.bulk_write([(sql, params)])
+
+    def query(self, sql: str, params: Tuple = ()) -> List[Tuple[Any, ...]]:
+        """ Execute a query.
+        :param sql: The SQL query.
+        :param params: The query parameters.
+        :return: The result rows.
+        """
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        """ Close the database connection. """
+        with self._lock:
+            self._connection.close()
+
+
+_databases: Dict[str, List[Any]] = {}
+_pid = getpid()
+_lock = Lock()
+
+
+def _check_fork() -> None:
+    """ Forget the connections created by the parent process, because SQLite connections are not fork-safe. """
+    global _pid
+    if _pid != getpid():
+        _databases.clear()
+        _pid = getpid()
+
+
+def connect_db(path: str = DEF_DB_PATH, timeout: float = DEF_DB_TIMEOUT) -> SQLiteDatabase:
+    """ Open a database file. The connections are shared in the same process by file path.
+      Each call increases the reference counter of the connection, which is decreased with release_db().
+    :param path: The database file path.
+    :param timeout: The seconds to wait for the lock of other processes writing the same database.
+    :return: The database.
+    """
+    key = abspath(path)
+    with _lock:
+        _check_fork()
+        if key not in _databases:
+            _databases[key] = [SQLiteDatabase(path, timeout), 0]
+        _databases[key][1] += 1
+        return _databases[key][0]
+
+
+def release_db(db: SQLiteDatabase, close: bool = False) -> None:
+    """ Decrease the reference counter of a shared connection. The connection is kept open to be reused by the next
+      progress bars, unless close is True and nobody else is using it.
+    :param db: The database obtained with connect_db().
+    :param close: If True, close the connection when its reference counter reaches 0.
+    """
+    key = abspath(db.path)
+    with _lock:
+        _check_fork()
+        if key not in _databases or _databases[key][0] is not db:
+            return
+        _databases[key][1] = max(_databases[key][1] - 1, 0)
+        if close and not _databases[key][1]:
+            del _databases[key]
+            db.close()
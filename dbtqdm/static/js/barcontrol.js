@@ -1,298 +1,502 @@
-/** Show a specific bar. If it does not exist yet, then the function creates one, otherwise updates it.
+/** The board version of the last response of the server, used to ask only for the changes. */
+var $VERSION = null;
+/** The filters, the sort key and the size of the page shown in the home page, the bar name of the group whose
+ *  members are shown and if the progress bars are shown grouped by bar name. */
+var $PAGE = {prefix: '', status: '', sort: '-start', limit: 500, bar_name: '', grouped: false};
+/** The cursors of the pages shown until the current one (empty in the first page) and the cursor of the next one. */
+var $CURSORS = [], $NEXT = null;
+/** The keyed model of the progress bars: for each bar id, its last data, if it is shown alone, the references to the
+ *  elements of its card (null until the card is built) and the values already written into them. */
+var $BARS = new Map();
+/** The bar ids in the order they are shown. */
+var $ORDER = [];
+/** The bar ids whose card must be updated in the next frame. */
+var $DIRTY = new Set();
+/** The cards which are in the page, by bar id. The rest are kept detached until they enter into the viewport. */
+var $ATTACHED = new Map();
+/** If the bars or their order have changed since the last frame, or the viewport has been scrolled or resized. */
+var $LAYOUT = false;
+/** The id of the scheduled animation frame or null if there is no one. */
+var $FRAME = null;
+/** The height in pixels of a row of cards, measured from the rendered cards, and the rows rendered out of the viewport
+ *  in each direction. */
+var $ROW_HEIGHT = 360, $OVERSCAN = 2;
+/** The media type of the compact responses of /tqdm, with the bars in columns of raw values. */
+var COLUMNAR_TYPE = 'application/vnd.dbtqdm.columnar+json';
+
+/** Show a specific bar. If it does not exist yet, then it is added to the model, otherwise updated. The changes are
+ *  written into the page in the next animation frame.
  *
  * @param {Object} bar - The bar object with its information.
  * @param {boolean} only - If the bar appears alone or together other progress bars.
  */
 function show_bar(bar, only=false) {
-	let bar_id = bar.bar_name + bar.suffix
-	// console.log(bar);
-	if($('#' + bar_id).length) {
-		change_bar(bar_id, bar, only);
+	let bar_id = bar.bar_name + bar.suffix;
+	let entry = $BARS.get(bar_id);
+	if(entry) {
+		entry.bar = bar;
 	} else {
-		create_bar(bar_id, bar, only);
+		$BARS.set(bar_id, {bar: bar, only: only, refs: null, shown: {}});
+		$ORDER.unshift(bar_id);
+		$LAYOUT = true;
 	}
+	$DIRTY.add(bar_id);
+	schedule_render();
 }
 
-/** Update a given bar.
+/** Remove a bar from the model. Its card is removed from the page in the next animation frame.
  *
- * @param {string} bar_id - The bar id (usually concatenating the bar name and the suffix.
- * @param {Object} bar - The object with the bar information.
- * @param {boolean} only - If the bar appears alone or together other progress bars.
+ * @param {string} bar_id - The bar id.
  */
-function change_bar(bar_id, bar, only) {
-	let bar_desc = $('#' + bar_id + '-desc');
-	if(bar_desc.text() !== bar.desc)
-		bar_desc.text(bar.desc);
-	let progress_bar = document.getElementById(bar_id + '-progress');
-	update_progress(progress_bar, bar.n, bar.initial, bar.total, bar.percentage, bar.colour);
-	let rate = document.getElementById(bar_id + '-speed');
-	update_rate(rate, bar_id, bar.rate, bar.primary_unit, bar.secondary_unit);
-	let bar_position = $('#' + bar_id + '-position');
-	if(bar_position.text() !== bar.n)
-		bar_position.text(bar.n);
-	let bar_total = $('#' + bar_id + '-total');
-	if(bar_total.text() !== bar.total)
-		bar_total.text(bar.total);
-	let bar_elapsed = $('#' + bar_id + '-elapsed');
-	if(bar_elapsed.text() !== bar.elapsed_str)
-		bar_elapsed.text(bar.elapsed_str);
-	let bar_remaining = $('#' + bar_id + '-remain');
-	if(bar_remaining.text() !== bar.remaining_str)
-		bar_remaining.text(bar.remaining_str);
-	let bar_eta = $('#' + bar_id + '-eta');
-	if(bar_eta.text() !== bar.eta)
-		bar_eta.text(bar.eta);
-	if(only) {
-		let start = $('#' + bar_id + '-start')
-		if(start.text() !== bar.start_time_str)
-			start.text(bar.start_time_str);
+function forget_bar(bar_id) {
+	if($BARS.delete(bar_id)) {
+		$DIRTY.delete(bar_id);
+		$LAYOUT = true;
+		schedule_render();
+	}
+}
+
+/** Show a list of bars, removing the rest of them.
+ *
+ * @param {array} bars - The list of object with the bar information
+ */
+function show_bars(bars) {
+	let bar_ids = new Set();
+	bars.forEach(function(bar) {
+		bar_ids.add(bar.bar_name + bar.suffix);
+		show_bar(bar);
+	});
+	$BARS.forEach(function(entry, bar_id) {
+		if(!bar_ids.has(bar_id))
+			forget_bar(bar_id);
+	});
+}
+
+/**
+ * Schedule the rendering of the pending changes in the next animation frame, if it is not scheduled yet.
+ */
+function schedule_render() {
+	if($FRAME === null)
+		$FRAME = window.requestAnimationFrame(render);
+}
+
+/**
+ * Write all the pending changes into the page at once: first, the cards which have to be shown and their order,
+ * and then, the changed values of the shown cards.
+ */
+function render() {
+	$FRAME = null;
+	if($LAYOUT)
+		layout();
+	$DIRTY.forEach(function(bar_id) {
+		let entry = $BARS.get(bar_id);
+		if($ATTACHED.has(bar_id))
+			patch_bar(entry);
+	});
+	$DIRTY.clear();
+}
+
+/**
+ * Attach only the cards which are inside the viewport, or near it, and replace the rest of them by two spacers with
+ * their height, so the scroll bar is the same than with all the cards.
+ */
+function layout() {
+	$LAYOUT = false;
+	if($ORDER.length !== $BARS.size)
+		$ORDER = $ORDER.filter(bar_id => $BARS.has(bar_id));
+	let meters = document.getElementById('meters');
+	let spacers = get_spacers(meters);
+	// Read the layout before writing
+	let columns = count_columns(meters);
+	let top = meters.getBoundingClientRect().top;
+	let first = Math.max(0, Math.floor(-top / $ROW_HEIGHT) - $OVERSCAN);
+	let last = Math.max(first, Math.ceil((window.innerHeight - top) / $ROW_HEIGHT) + $OVERSCAN);
+	let start = Math.min(first * columns, $ORDER.length), end = Math.min(last * columns, $ORDER.length);
+	let visible = $ORDER.slice(start, end);
+	// Detach the cards out of the viewport
+	let keep = new Set(visible);
+	$ATTACHED.forEach(function(col, bar_id) {
+		if(!keep.has(bar_id)) {
+			col.remove();
+			$ATTACHED.delete(bar_id);
+		}
+	});
+	// Attach the visible cards in order between the spacers
+	spacers[0].style.height = Math.ceil(start / columns) * $ROW_HEIGHT + 'px';
+	if(meters.firstChild !== spacers[0])
+		meters.insertBefore(spacers[0], meters.firstChild);
+	let next = spacers[0].nextSibling;
+	visible.forEach(function(bar_id) {
+		let entry = $BARS.get(bar_id);
+		if(!entry.refs)
+			entry.refs = create_card(bar_id, entry.only);
+		patch_bar(entry);
+		if(next !== entry.refs.col)
+			meters.insertBefore(entry.refs.col, next);
+		else
+			next = next.nextSibling;
+		$ATTACHED.set(bar_id, entry.refs.col);
+	});
+	spacers[1].style.height = (Math.ceil($ORDER.length / columns) - Math.ceil(end / columns)) * $ROW_HEIGHT + 'px';
+	if(meters.lastChild !== spacers[1])
+		meters.append(spacers[1]);
+	// Measure the real size of the cards and lay them out again if the estimation was wrong
+	let height = visible.length ? $ATTACHED.get(visible[0]).offsetHeight : 0;
+	if(height && (Math.abs(height - $ROW_HEIGHT) > 1 || count_columns(meters) !== columns)) {
+		$ROW_HEIGHT = height;
+		$LAYOUT = true;
+		schedule_render();
 	}
-	if(only && bar.finished) {
-		$('#' + bar_id + '-eta-li').remove();
-		create_finished($('#' + bar_id + '-ulist'), bar_id, bar.end_time_str);
-	} else if(only) {
-		create_eta($('#' + bar_id + '-ulist'), bar_id, bar.eta);
-		$('#' + bar_id + '-end-li').remove();
-		$('#' + bar_id + '-end-msg-li').remove();
+}
+
+/** Get the spacers before and after the cards, creating them the first time.
+ *
+ * @param {HTMLElement} meters - The container of the cards.
+ * @returns {array} - The two spacers.
+ */
+function get_spacers(meters) {
+	if(!meters.spacers) {
+		meters.spacers = [0, 1].map(function() {
+			let spacer = document.createElement('div');
+			spacer.setAttribute('aria-hidden', 'true');
+			spacer.style.cssText = 'flex: 0 0 100%; width: 100%; max-width: 100%; padding: 0; height: 0;';
+			return spacer;
+		});
 	}
+	return meters.spacers;
 }
 
-/** Create a progress bar.
+/** Get the number of cards of each row.
+ *
+ * @param {HTMLElement} meters - The container of the cards.
+ * @returns {int} - The number of columns.
+ */
+function count_columns(meters) {
+	let col = $ATTACHED.values().next().value;
+	return col && col.offsetWidth ? Math.max(1, Math.round(meters.clientWidth / col.offsetWidth)) : 1;
+}
+
+/** Create an HTML element.
+ *
+ * @param {HTMLElement} parent - The element where the new element is appended.
+ * @param {string} tag - The tag name.
+ * @param {string} cls - The class attribute.
+ * @param {string} text - The text content.
+ * @returns {HTMLElement} - The new element.
+ */
+function element(parent, tag, cls = '', text = '') {
+	let elem = document.createElement(tag);
+	if(cls)
+		elem.setAttribute('class', cls);
+	if(text)
+		elem.textContent = text;
+	parent.append(elem);
+	return elem;
+}
+
+/** Create a list item with a bold label and an empty value.
+ *
+ * @param {HTMLElement} ulist - The unordered list to add the element.
+ * @param {string} label - The label.
+ * @returns {array} - The list item and the element of its value.
+ */
+function list_item(ulist, label) {
+	let item = element(ulist, 'li');
+	element(item, 'b', '', label + ':');
+	item.append(' ');
+	return [item, element(item, 'span')];
+}
+
+/** Create the empty card of a progress bar. Its values are written by patch_bar().
  *
  * @param {string} bar_id - The bar id (usually concatenating the bar name and the suffix.
- * @param {Object} bar - The object with the bar information.
  * @param {boolean} only - If the bar appears alone or together other progress bars.
+ * @returns {Object} - The references to the card elements.
  */
-function create_bar(bar_id, bar, only = false) {
-	// The card
-	let col = document.createElement('div');
-	col.setAttribute('id', bar_id);
-	col.setAttribute('class', 'col');
-	let card = document.createElement('div');
-	card.setAttribute('class', 'card mb-4 rounded-3 shadow-sm');
-	col.append(card);
-	if(!only) {
-		// The card header
-		let header_card = document.createElement('div');
-		header_card.setAttribute('class', 'card-header py-3');
-		card.append(header_card);
-		let header = document.createElement('h4');
-		header.setAttribute('id', bar_id + '-title');
-		header.setAttribute('class', 'my-0 fw-normal');
-		header.textContent = bar_id;
-		header_card.append(header);
-	}
-	// The card body
-	let body = document.createElement('div');
-	body.setAttribute('class', 'card-body');
-	card.append(body);
-	// The bar description
-	let desc = document.createElement('p');
-	desc.setAttribute('id', bar_id + '-desc');
-	desc.textContent = bar.desc;
-	body.append(desc);
+function create_card(bar_id, only = false) {
+	let refs = {col: document.createElement('div')};
+	refs.col.setAttribute('id', bar_id);
+	refs.col.setAttribute('class', 'col');
+	let card = element(refs.col, 'div', 'card mb-4 rounded-3 shadow-sm');
+	if(!only)
+		element(element(card, 'div', 'card-header py-3'), 'h4', 'my-0 fw-normal', bar_id);
+	let body = element(card, 'div', 'card-body');
+	refs.desc = element(body, 'p');
 	// The bar progress
-	let progress_div = document.createElement('div');
-	progress_div.setAttribute('class', 'progress');
+	let progress_div = element(body, 'div', 'progress');
 	progress_div.style.height = '30px';
-	body.append(progress_div);
-	let progress_bar = document.createElement('div');
-	progress_bar.setAttribute('id', bar_id + '-progress');
-	progress_bar.setAttribute('class', 'progress-bar progress-bar-striped');
-	progress_bar.setAttribute('role', 'progressbar');
-	progress_bar.setAttribute('role', 'progressbar');
-	update_progress(progress_bar, bar.n, bar.initial, bar.total, bar.percentage, bar.colour);
-	progress_div.append(progress_bar);
+	refs.progress = element(progress_div, 'div', 'progress-bar progress-bar-striped');
+	refs.progress.setAttribute('role', 'progressbar');
 	// The speed info
-	let speed = document.createElement('h2');
-	create_rate(speed, bar_id, bar.rate, bar.primary_unit, bar.secondary_unit);
-	body.append(speed);
+	let speed = element(body, 'h2', 'card-title pricing-card-title');
+	refs.rate = document.createTextNode('');
+	speed.append(refs.rate);
+	refs.primary_unit = element(speed, 'span');
+	refs.secondary_unit = element(speed, 'small', 'text-muted fw-light');
 	// The position, elapsed and remain information
-	let ulist = document.createElement('ul');
-	ulist.setAttribute('id', bar_id + '-ulist');
-	ulist.setAttribute('class', 'list-unstyled mt-3 mb-4');
-	body.append(ulist);
-	let position = document.createElement('li');
-	position.innerHTML = '<b>Position:</b> <span id="' + bar_id + '-position">' + bar.n + '</span>/<span id="' + bar_id + '-total">' + bar.total + '</span>';
-	ulist.append(position);
-	let elapsed = document.createElement('li');
-	elapsed.innerHTML = '<b>Elapsed:</b> <span id="' + bar_id + '-elapsed">' + bar.elapsed_str + '</span>';
-	ulist.append(elapsed);
-	let remain = document.createElement('li');
-	remain.innerHTML = '<b>Remain:</b> <span id="' + bar_id + '-remain">' + bar.remaining_str + '</span>';
-	ulist.append(remain);
+	let ulist = element(body, 'ul', 'list-unstyled mt-3 mb-4');
+	let position = element(ulist, 'li');
+	element(position, 'b', '', 'Position:');
+	position.append(' ');
+	refs.position = element(position, 'span');
+	position.append('/');
+	refs.total = element(position, 'span');
+	refs.elapsed = list_item(ulist, 'Elapsed')[1];
+	refs.remain = list_item(ulist, 'Remain')[1];
 	if(only) {
-		let start = document.createElement('li');
-		start.innerHTML = '<b>Started:</b> <span id="' + bar_id + '-start">' + bar.start_time_str + '</span>';
-		ulist.append(start);
-		if(bar.finished) {
-			create_finished(ulist, bar_id, bar.end_time_str);
-		} else {
-			create_eta(ulist, bar_id, bar.eta);
-		}
-	}
-	// The buttons
-	if(!only) {
+		refs.start = list_item(ulist, 'Started')[1];
+		[refs.eta_li, refs.eta] = list_item(ulist, 'ETA');
+		[refs.end_li, refs.end] = list_item(ulist, 'Finished');
+		refs.end_msg_li = element(ulist, 'li');
+		element(refs.end_msg_li, 'h2', '', 'Finished');
+	} else {
 		// The button to a specific bar progress
-		let see_btn = document.createElement('a');
+		let see_btn = element(body, 'a', 'w-100 btn btn-lg btn-outline-success', 'Details');
 		see_btn.setAttribute('type', 'button');
-		see_btn.setAttribute('class', 'w-100 btn btn-lg btn-outline-success');
 		see_btn.setAttribute('href', $SCRIPT_ROOT + '/bar/' + bar_id);
-		see_btn.textContent = 'Details';
-		body.append(see_btn);
 		// The close button
-		let close_btn = document.createElement('a');
-		close_btn.setAttribute('onclick', 'remove_bar("' + bar_id + '")');
+		let close_btn = element(body, 'a', 'btn p-0 position-absolute top-0 right-4');
 		close_btn.setAttribute('type', 'button');
-		close_btn.setAttribute('class', 'btn p-0 position-absolute top-0 right-4');
-		close_btn.innerHTML = '<span>&times;</span>';
-		body.append(close_btn);
+		close_btn.addEventListener('click', () => remove_bar(bar_id));
+		element(close_btn, 'span', '', '×');
 	}
-	$('#meters').prepend(col);
+	return refs;
 }
 
-/** Create the finished date HTML elements.
+/** Write the values of a progress bar into its card, only the ones which have changed since the last time.
  *
- * @param {HTMLElement} ulist - The unordered list to add the element.
- * @param {string} bar_id - The bar id (usually concatenating the bar name and the suffix.
- * @param {string} end_time_str - The finished date to show.
- */
-function create_finished(ulist, bar_id, end_time_str) {
-	if(!$('#' + bar_id + '-end-msg').length) {
-		let end = document.createElement('li');
-		end.setAttribute('id', bar_id + '-end-li');
-		end.innerHTML = '<b>Finished:</b> <span id="' + bar_id + '-end">' + end_time_str + '</span>';
-		ulist.append(end);
-		let finished = document.createElement('li');
-		finished.setAttribute('id', bar_id + '-end-msg-li');
-		finished.innerHTML = '<h2 id="' + bar_id + '-end-msg">Finished</h2>';
-		ulist.append(finished);
+ * @param {Object} entry - The model entry of the progress bar.
+ */
+function patch_bar(entry) {
+	let bar = entry.bar, refs = entry.refs, shown = entry.shown;
+	let percentage = Math.round(bar.percentage || 0);
+	set_text(shown, 'desc', refs.desc, bar.desc);
+	set_value(shown, 'aria-valuenow', bar.n, v => refs.progress.setAttribute('aria-valuenow', v));
+	set_value(shown, 'aria-valuemin', bar.initial, v => refs.progress.setAttribute('aria-valuemin', v));
+	set_value(shown, 'aria-valuemax', bar.total, v => refs.progress.setAttribute('aria-valuemax', v));
+	set_value(shown, 'width', percentage, function(v) {
+		refs.progress.style.width = v + '%';
+		refs.progress.textContent = v + '%';
+	});
+	if(bar.colour)
+		set_value(shown, 'colour', bar.colour, v => refs.progress.style.backgroundColor = v);
+	set_text(shown, 'rate', refs.rate, Math.round((bar.rate || 0) * 100) / 100);
+	set_text(shown, 'primary_unit', refs.primary_unit, bar.primary_unit);
+	set_text(shown, 'secondary_unit', refs.secondary_unit, '/' + bar.secondary_unit);
+	set_text(shown, 'position', refs.position, bar.n);
+	set_text(shown, 'total', refs.total, bar.total);
+	set_text(shown, 'elapsed', refs.elapsed, bar.elapsed_str);
+	set_text(shown, 'remain', refs.remain, bar.remaining_str);
+	if(entry.only) {
+		let finished = Boolean(bar.finished);
+		set_text(shown, 'start', refs.start, bar.start_time_str);
+		set_text(shown, 'eta', refs.eta, bar.eta);
+		set_text(shown, 'end', refs.end, bar.end_time_str);
+		set_value(shown, 'finished', finished, function(v) {
+			refs.eta_li.hidden = v;
+			refs.end_li.hidden = !v;
+			refs.end_msg_li.hidden = !v;
+		});
 	}
 }
 
-/** Create the ETA date HTML elements.
+/** Call a function to write a value only if it is different from the last written one.
  *
- * @param {HTMLElement} ulist - The unordered list to add the element.
- * @param {string} bar_id - The bar id (usually concatenating the bar name and the suffix.
- * @param {string} eta_time_str - The ETA date to show.
- */
-function create_eta(ulist, bar_id, eta_time_str) {
-	if(!$('#' + bar_id + '-eta').length) {
-		let eta = document.createElement('li');
-		eta.setAttribute('id', bar_id + '-eta-li');
-		eta.innerHTML = '<b>ETA:</b> <span id="' + bar_id +'-eta">' + eta_time_str + '</span>';
-		ulist.append(eta);
+ * @param {Object} shown - The values already written.
+ * @param {string} key - The key of the value.
+ * @param {*} value - The new value.
+ * @param {function} write - The function which writes the value.
+ */
+function set_value(shown, key, value, write) {
+	if(shown[key] !== value) {
+		shown[key] = value;
+		write(value);
 	}
 }
 
-/** Update the progress bar.
+/** Write the text of an element only if it is different from the last written one.
  *
- * @param {HTMLElement} progress_bar - The progress bar HTML element to update.
- * @param {int} n - The current bar position.
- * @param {int} initial - The initial bar position.
- * @param {int} total - The final bar position.
- * @param {float} percentage - The percentage of the bar that has been completed.
- * @param {string} colour - The bar colour.
- */
-function update_progress(progress_bar, n, initial, total, percentage, colour) {
-	percentage = Math.round(percentage);
-	if(progress_bar.getAttribute("aria-valuenow") !== n.toString())
-		progress_bar.setAttribute('aria-valuenow', n.toString());
-	if(progress_bar.getAttribute("aria-valuemin") !== initial.toString())
-		progress_bar.setAttribute('aria-valuemin', initial.toString());
-	if(progress_bar.getAttribute("aria-valuemax") !== total.toString())
-		progress_bar.setAttribute('aria-valuemax', total.toString());
-	if(progress_bar.style.width !== percentage + '%')
-		progress_bar.style.width = percentage + '%';
-	if(progress_bar.textContent !== percentage + '%')
-		progress_bar.textContent = percentage + '%';
-	if(colour && progress_bar.style.backgroundColor !== colour) {
-		progress_bar.style.backgroundColor = colour;
-	}
+ * @param {Object} shown - The values already written.
+ * @param {string} key - The key of the value.
+ * @param {Node} elem - The element.
+ * @param {*} value - The new text. If it is null or undefined, the element is empty.
+ */
+function set_text(shown, key, elem, value) {
+	set_value(shown, key, value === null || value === undefined ? '' : value.toString(), v => elem.textContent = v);
 }
 
-/** Create the speed rate HTML elements.
- *
- * @param {HTMLElement} elem - The HTML element where the rate elements will be added.
- * @param {string} bar_name - The bar progress name.
- * @param {float} rate_value - The rate value.
- * @param {string} primary_unit_value - The primary unit value.
- * @param {string} secondary_unit_value - The secondary unit value.
- */
-function create_rate(elem, bar_name, rate_value, primary_unit_value, secondary_unit_value) {
-	elem.setAttribute('id', bar_name + '-speed');
-	elem.setAttribute('class', 'card-title pricing-card-title');
-	elem.textContent = Math.round(rate_value * 100) / 100;
-	let primary_unit = document.createElement('span');
-	primary_unit.setAttribute('id', bar_name + '-primary-unit');
-	primary_unit.textContent = primary_unit_value
-	elem.append(primary_unit);
-	let secondary_unit = document.createElement('small');
-	secondary_unit.setAttribute('id', bar_name + '-secondary-unit');
-	secondary_unit.setAttribute('class', 'text-muted fw-light');
-	secondary_unit.textContent = '/' + secondary_unit_value;
-	elem.append(secondary_unit);
-}
-
-/** Update the speed rate HTML element.
- *
- * @param {HTMLElement} elem - The HTML element to update.
- * @param {string} bar_name - The bar progress name.
- * @param {float} rate_value - The rate value.
- * @param {string} primary_unit - The primary unit value.
- * @param {string} secondary_unit - The secondary unit value.
- */
-function update_rate(elem, bar_name, rate_value, primary_unit, secondary_unit) {
-	let rate = (Math.round(rate_value * 100) / 100).toString();
-	if(elem.childNodes[0].textContent !== rate)
-		elem.childNodes[0].textContent = rate;
-	if(elem.childNodes[1].textContent !== primary_unit)
-		elem.childNodes[1].textContent = primary_unit;
-	if(elem.childNodes[2].textContent !== '/' + secondary_unit)
-		elem.childNodes[2].textContent = '/' + secondary_unit;
-}
-
-/** Show a list of bars.
- *
- * @param {array} bars - The list of object with the bar information
+window.addEventListener('scroll', function() {
+	$LAYOUT = true;
+	schedule_render();
+}, {passive: true});
+window.addEventListener('resize', function() {
+	$LAYOUT = true;
+	schedule_render();
+});
+
+/**
+ * Get the information and update or create all the bars.
  */
-function show_bars(bars) {
-	// Update or create the bars
-    bars.forEach(e => show_bar(e));
-    // Remove the completed bars
-	let cards = $('#meters').children();
-	for(let i=0; i < cards.length; i++) {
-		if(!exist_bar(cards[i].getAttribute('id'), bars)) {
-			cards[i].remove();
+function update_bars() {
+    $.ajax({
+    	url: $SCRIPT_ROOT + "/tqdm",
+    	data: $VERSION ? {since: $VERSION} : {},
+    	headers: {Accept: COLUMNAR_TYPE},
+    	dataType: 'json',
+    	ifModified: true,
+    	success: function(data, status) {
+    		hide_error();
+    		if(status !== 'notmodified') {
+    			if(data.removed) {
+    				expand_bars(data.bars).forEach(e => show_bar(e));
+    				data.removed.forEach(bar_id => forget_bar(bar_id));
+    			} else {
+    				show_bars(expand_bars(data.bars));
+    			}
+    			$VERSION = data.version;
+    		}
+    		hide_loading();
+    	},
+    	error: function(jqXHR, textStatus, errorThrown) {
+    		hide_loading();
+    		show_error(jqXHR.responseText);
+    	}
+    });
+}
+
+/**
+ * Bind the filters and the page buttons of the home page. Each change of the filters goes back to the first page.
+ */
+function init_page() {
+	let timeout = null;
+	$('#filter-prefix').on('input', function() {
+		clearTimeout(timeout);
+		timeout = setTimeout(apply_filters, 300);
+	});
+	$('#filter-status, #sort-key, #group-bars').on('change', apply_filters);
+	$('#clear-group').on('click', () => show_group(''));
+	$('#previous-page').on('click', function() {
+		$CURSORS.pop();
+		update_page();
+	});
+	$('#next-page').on('click', function() {
+		if($NEXT) {
+			$CURSORS.push($NEXT);
+			update_page();
 		}
-	}
+	});
+}
+
+/**
+ * Read the filters of the home page and show the first page with them.
+ */
+function apply_filters() {
+	$PAGE.prefix = $('#filter-prefix').val();
+	$PAGE.status = $('#filter-status').val();
+	$PAGE.sort = $('#sort-key').val();
+	$PAGE.grouped = $('#group-bars').prop('checked');
+	$CURSORS = [];
+	toggle_groups();
+	update_page();
 }
 
-/** Check if a any bar has the id.
+/** Show the members of a group, or all the progress bars.
  *
- * @param {string} id - The id to check.
- * @param {array} bars - The list of bars.
- * @returns {boolean} - true if the bar id exists in the list.
- */
-function exist_bar(id, bars) {
-	for(i=0; i < bars.length; i++) {
-		let bar_id = bars[i].bar_name + bars[i].suffix;
-		if(id === bar_id) {
-		 	return true
+ * @param {string} bar_name - The bar name of the group or an empty string to show all the progress bars.
+ */
+function show_group(bar_name) {
+	$PAGE.bar_name = bar_name;
+	$PAGE.grouped = false;
+	$('#group-bars').prop('checked', false);
+	$CURSORS = [];
+	toggle_groups();
+	update_page();
+}
+
+/**
+ * Show the table of groups or the cards of the progress bars, depending on the page mode.
+ */
+function toggle_groups() {
+	$('#groups').toggleClass('d-none', !$PAGE.grouped);
+	$('#meters, #pages').toggleClass('d-none', $PAGE.grouped);
+	$('#group-filter').toggleClass('d-none', !$PAGE.bar_name || $PAGE.grouped);
+	$('#group-name').text($PAGE.bar_name);
+	$LAYOUT = true;
+	schedule_render();
+}
+
+/**
+ * Get the progress bars aggregated by bar name and show them in the table of groups.
+ */
+function update_groups() {
+	$.ajax({
+		url: $SCRIPT_ROOT + "/groups",
+		data: $PAGE.prefix ? {prefix: $PAGE.prefix} : {},
+		success: function(data) {
+			hide_error();
+			show_groups(data.groups);
+			hide_loading();
+		},
+		error: function(jqXHR, textStatus, errorThrown) {
+			hide_loading();
+			show_error(jqXHR.responseText);
 		}
-	}
-	return false;
+	});
+}
+
+/** Show the groups of progress bars, one row by group. Clicking a row shows the members of that group.
+ *
+ * @param {array} groups - The list of groups.
+ */
+function show_groups(groups) {
+	let rows = groups.map(function(group) {
+		let row = document.createElement('tr'), percentage = Math.round(group.percentage || 0);
+		row.style.cursor = 'pointer';
+		row.addEventListener('click', () => show_group(group.bar_name));
+		element(row, 'td', 'fw-bold', group.bar_name);
+		let progress = element(element(element(row, 'td'), 'div', 'progress'), 'div', 'progress-bar progress-bar-striped');
+		progress.style.width = percentage + '%';
+		progress.textContent = group.percentage === null ? '?' : percentage + '%';
+		element(row, 'td', '', group.n + '/' + (group.total === null ? '?' : group.total));
+		element(row, 'td', '', Math.round(group.rate * 100) / 100 + '/s');
+		element(row, 'td', '', group.remaining === null ? '?' : format_interval(group.remaining) || '0s');
+		element(row, 'td', '', group.members + ' (' + group.running + ' running, ' + group.finished + ' finished, ' +
+			group.stale + ' stale)');
+		return row;
+	});
+	document.querySelector('#groups tbody').replaceChildren(...rows);
 }
 
 /**
- * Get the information and update or create all the bars.
+ * Get only the progress bars of the visible page, with the current filters and sort key, and show them. If they are
+ * grouped by bar name, get the groups instead.
  */
-function update_bars() {
+function update_page() {
+	if($PAGE.grouped)
+		return update_groups();
+	let params = {sort: $PAGE.sort, limit: $PAGE.limit};
+	if($PAGE.prefix)
+		params.prefix = $PAGE.prefix;
+	if($PAGE.bar_name)
+		params.bar_name = $PAGE.bar_name;
+	if($PAGE.status)
+		params.status = $PAGE.status;
+	if($CURSORS.length)
+		params.after = $CURSORS[$CURSORS.length - 1];
     $.ajax({
     	url: $SCRIPT_ROOT + "/tqdm",
-    	success: function(data){
+    	data: params,
+    	headers: {Accept: COLUMNAR_TYPE},
+    	dataType: 'json',
+    	ifModified: true,
+    	success: function(data, status) {
     		hide_error();
-    		show_bars(data.bars);
+    		if(status !== 'notmodified') {
+    			show_page(expand_bars(data.bars));
+    			$NEXT = data.next;
+    			$('#previous-page').prop('disabled', !$CURSORS.length);
+    			$('#next-page').prop('disabled', !$NEXT);
+    		}
     		hide_loading();
     	},
     	error: function(jqXHR, textStatus, errorThrown) {
@@ -302,6 +506,69 @@ function update_bars() {
     });
 }
 
+/** Convert the bars of a compact response, in columns of raw values, into bar objects with the same formatted
+ *  fields than the default JSON response.
+ *
+ * @param {Object} columns - The list of values of each field.
+ * @returns {array} - The list of objects with the bar information.
+ */
+function expand_bars(columns) {
+	let bars = [], fields = Object.keys(columns);
+	for(let i = 0; i < columns.bar_id.length; i++) {
+		let bar = {};
+		fields.forEach(field => bar[field] = columns[field][i]);
+		bars.push(meter_bar(bar));
+	}
+	return bars;
+}
+
+/** Calculate the percentage, the units and the formatted times of a bar, like meter_stats() in the server.
+ *
+ * @param {Object} bar - The bar with raw values and its rate in iterations per second.
+ * @returns {Object} - The same bar with the calculated fields.
+ */
+function meter_bar(bar) {
+	let rate = bar.rate || 0, n = bar.n || 0, total = bar.total;
+	let remaining = rate && total ? (total - n) / rate : 0;
+	bar.percentage = total ? 100 * n / total : 0;
+	bar.remaining = remaining;
+	bar.elapsed_str = bar.elapsed ? format_interval(bar.elapsed) : '0s';
+	bar.remaining_str = rate ? format_interval(remaining) : '?';
+	bar.eta = rate && total ? new Date(Date.now() + remaining * 1000).toUTCString() : '';
+	bar.start_time_str = bar.start ? new Date(bar.start * 1000).toUTCString() : '';
+	if(rate && rate <= 1)
+		[bar.rate, bar.primary_unit, bar.secondary_unit] = [1 / rate, 's', bar.unit];
+	else
+		[bar.rate, bar.primary_unit, bar.secondary_unit] = [rate, bar.unit, 's'];
+	return bar;
+}
+
+/** Format an interval of time, like format_interval() in the server.
+ *
+ * @param {float} interval - The seconds.
+ * @returns {string} - The formatted interval in this format: ?w ?d ?h ?m ?s.
+ */
+function format_interval(interval) {
+	let seconds = Math.round(interval), parts = [];
+	[[604800, 'w'], [86400, 'd'], [3600, 'h'], [60, 'm'], [1, 's']].forEach(function([size, unit]) {
+		if(seconds >= size)
+			parts.push(Math.floor(seconds / size) + unit);
+		seconds %= size;
+	});
+	return parts.join(' ');
+}
+
+/** Show a page of bars in the same order than they are received.
+ *
+ * @param {array} bars - The list of object with the bar information
+ */
+function show_page(bars) {
+	show_bars(bars);
+	$ORDER = bars.map(bar => bar.bar_name + bar.suffix);
+	$LAYOUT = true;
+	schedule_render();
+}
+
 /** Get the information and update or create only the specific bar progress.
  *
  * @param {string} bar_id - The bar id.
@@ -310,9 +577,11 @@ function update_bars() {
 function update_bar(bar_id, only = false) {
     $.ajax({
     	url: $SCRIPT_ROOT + "/tqdm/" + bar_id,
-    	success: function(data) {
+    	ifModified: true,
+    	success: function(data, status) {
     		hide_error();
-    		show_bar(data, only);
+    		if(status !== 'notmodified')
+    			show_bar(data, only);
     		hide_loading();
     	},
     	error: function(jqXHR, textStatus, errorThrown){
@@ -322,6 +591,112 @@ function update_bar(bar_id, only = false) {
     });
 }
 
+/** Receive the changes of all the progress bars as Server-Sent Events instead of polling the server.
+ *
+ * @returns {boolean} - false if the browser does not support Server-Sent Events.
+ */
+function stream_bars() {
+	if(typeof(EventSource) === 'undefined')
+		return false;
+	let source = new EventSource($SCRIPT_ROOT + "/stream");
+	source.addEventListener('snapshot', function(e) {
+		hide_error();
+		show_bars(JSON.parse(e.data));
+		hide_loading();
+	});
+	source.addEventListener('bar', function(e) {
+		show_bar(JSON.parse(e.data));
+	});
+	source.addEventListener('remove', function(e) {
+		forget_bar(JSON.parse(e.data));
+	});
+	source.onerror = function() {
+		show_error('The connection with the server has been lost. Reconnecting...');
+	};
+	return true;
+}
+
+/** Receive the changes of a specific progress bar as Server-Sent Events instead of polling the server.
+ *
+ * @param {string} bar_id - The bar id.
+ * @returns {boolean} - false if the browser does not support Server-Sent Events.
+ */
+function stream_bar(bar_id) {
+	if(typeof(EventSource) === 'undefined')
+		return false;
+	let source = new EventSource($SCRIPT_ROOT + "/stream?bar_id=" + encodeURIComponent(bar_id));
+	source.addEventListener('snapshot', function(e) {
+		let bars = JSON.parse(e.data);
+		if(bars.length) {
+			hide_error();
+			show_bar(bars[0], true);
+			hide_loading();
+		} else {
+			// The bar is not active, therefore, get the last finished one
+			update_bar(bar_id, true);
+		}
+	});
+	source.addEventListener('bar', function(e) {
+		show_bar(JSON.parse(e.data), true);
+	});
+	source.addEventListener('remove', function(e) {
+		update_bar(bar_id, true);
+	});
+	source.onerror = function() {
+		show_error('The connection with the server has been lost. Reconnecting...');
+	};
+	return true;
+}
+
+/** Get the history of a progress bar and draw its throughput chart.
+ *
+ * @param {string} bar_id - The bar id.
+ */
+function update_history(bar_id) {
+	let canvas = document.getElementById('history-chart');
+	$.ajax({
+		url: $SCRIPT_ROOT + "/tqdm/" + bar_id + "/history",
+		data: {points: canvas.clientWidth || 200},
+		ifModified: true,
+		success: function(data, status) {
+			if(status !== 'notmodified')
+				draw_history(canvas, data.samples);
+		}
+	});
+}
+
+/** Draw the throughput chart of a progress bar.
+ *
+ * @param {HTMLCanvasElement} canvas - The canvas where the chart is drawn.
+ * @param {array} samples - The list of samples, each one with the timestamp, the position and the rate.
+ * @param {string} colour - The line colour.
+ */
+function draw_history(canvas, samples, colour = '#198754') {
+	canvas.width = canvas.clientWidth;
+	let ctx = canvas.getContext('2d');
+	ctx.clearRect(0, 0, canvas.width, canvas.height);
+	if(samples.length < 2)
+		return;
+	let start = samples[0][0], duration = (samples[samples.length - 1][0] - start) || 1;
+	let max_rate = Math.max(...samples.map(sample => sample[2])) || 1;
+	let top = 20;
+	ctx.strokeStyle = colour;
+	ctx.lineWidth = 2;
+	ctx.beginPath();
+	samples.forEach(function(sample, i) {
+		let x = (sample[0] - start) / duration * canvas.width;
+		let y = canvas.height - sample[2] / max_rate * (canvas.height - top);
+		if(i === 0)
+			ctx.moveTo(x, y);
+		else
+			ctx.lineTo(x, y);
+	});
+	ctx.stroke();
+	ctx.fillStyle = '#6c757d';
+	ctx.font = '12px sans-serif';
+	ctx.fillText('Max: ' + Math.round(max_rate * 100) / 100 + ' it/s', 4, 14);
+}
+
 /** Remove a bar.
  *
  * @param {string} bar_id - The bar id to remove.
@@ -331,7 +706,7 @@ function remove_bar(bar_id) {
     	url: $SCRIPT_ROOT + "/remove/" + bar_id,
     	success: function(data) {
     		hide_error();
-			$("#" + bar_id).remove();
+			forget_bar(bar_id);
     	},
     	error: function(jqXHR, textStatus, errorThrown) {
     		show_error(jqXHR.responseText);
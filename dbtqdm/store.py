@@ -0,0 +1,547 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter, time
+from typing import List, Union, Iterator, Tuple, Any, Sequence, Iterable, Mapping, Dict, Callable
+
+from dbtqdm.consts import DEF_STATS_LIMIT, MAX_STATS_LIMIT
+from dbtqdm.metrics import store_seconds
+from dbtqdm.utils import percentile, shared_meter, pack_cursor, unpack_cursor, iteration_rate, bar_status
+
+Event = Tuple[str, Any]
+StatsKey = Tuple[float, str, str]
+SNAPSHOT_EVENT, BAR_EVENT, REMOVE_EVENT = 'snapshot', 'bar', 'remove'
+STATS_KEY = ('start_time', 'bar_name', 'suffix')
+RUN_FIELDS = ('bar_name', 'start_time', 'end_time', 'elapsed', 'n', 'initial', 'aborted')
+DAY = 86400
+
+
+class ChangesNotAvailable(Exception):
+    """ The database is not able to notify the progress bar changes. """
+    pass
+
+
+class BarStore(ABC):
+    """ Access of the server to the progress bars stored in a database. """
+
+    @abstractmethod
+    def active(self) -> List[dict]:
+        """
+        :return: All the active progress bars.
+        """
+        pass
+
+    @abstractmethod
+    def last_stats(self, bar_id: str) -> Union[dict, None]:
+        """ Get the last finished execution of a progress bar.
+        :param bar_id: The bar id.
+        :return: The progress bar information or None if that progress bar has never finished.
+        """
+        pass
+
+    @abstractmethod
+    def stats(self, bar_name: str = None, suffix: str = None, since: float = None, until: float = None,
+              after: StatsKey = None, limit: int = DEF_STATS_LIMIT, fields: Sequence[str] = None) -> List[dict]:
+        """ Get the finished executions of the progress bars, sorted by start time, bar name and suffix in descending
+          order. This sort key is unique, so the next page starts after the key of the last execution (keyset
+          pagination) and it is not needed to skip the previous ones.
+        :param bar_name: If it is given, only the executions with this bar name.
+        :param suffix: If it is given, only the executions with this suffix.
+        :param since: If it is given, only the executions started at this timestamp or later.
+        :param until: If it is given, only the executions started before this timestamp.
+        :param after: If it is given, only the executions after this key of start time, bar name and suffix.
+        :param limit: The maximum number of executions.
+        :param fields: If it is given, only these fields and the key ones (bar_id, bar_name, suffix and start_time).
+        :return: The finished executions.
+        """
+        pass
+
+    @abstractmethod
+    def compact(self, before: float) -> int:
+        """ Compact the finished executions started before a timestamp into daily rollups by bar name, and remove
+          them. If there is already a rollup of the same day and bar name, both are merged.
+        :param before: The timestamp.
+        :return: The number of compacted executions.
+        """
+        pass
+
+    @abstractmethod
+    def rollups(self, bar_name: str = None, since: float = None, until: float = None,
+                limit: int = DEF_STATS_LIMIT) -> List[dict]:
+        """ Get the daily rollups of the compacted executions, sorted by day and bar name in descending order.
+        :param bar_name: If it is given, only the rollups of this bar name.
+        :param since: If it is given, only the rollups of the days which start at this timestamp or later.
+        :param until: If it is given, only the rollups of the days which start before this timestamp.
+        :param limit: The maximum number of rollups.
+        :return: The rollups with the bar name, the day, its start timestamp, the number of finished executions, their
+           mean, median and 95th percentile duration in seconds, their mean rate and the number of aborted executions.
+        """
+        pass
+
+    @abstractmethod
+    def history(self, bar_id: str) -> Union[dict, None]:
+        """ Get the history of the last execution of a progress bar.
+        :param bar_id: The bar id.
+        :return: A dict with the bar id, its start timestamp and the list of samples, or None if there is no history.
+        """
+        pass
+
+    @abstractmethod
+    def remove(self, bar_id: str) -> bool:
+        """ Remove an active progress bar.
+        :param bar_id: The bar id.
+        :return: True if the progress bar has been removed, False if it does not exist.
+        """
+        pass
+
+    @abstractmethod
+    def save(self, bars: List[dict]) -> None:
+        """ Create or replace several active progress bars.
+        :param bars: The progress bars.
+        """
+        pass
+
+    @abstractmethod
+    def finish(self, bar: dict) -> None:
+        """ Move a finished progress bar from the active progress bars to the finished ones.
+        :param bar: The finished progress bar.
+        """
+        pass
+
+    def reap(self, before: float) -> List[str]:
+        """ Archive as aborted the active progress bars whose last heartbeat is older than a timestamp, because their
+          process has died without closing them. They are moved to the finished ones with finished=False and
+          aborted=True. The progress bars without heartbeat are never archived.
+        :param before: The timestamp.
+        :return: The ids of the archived progress bars.
+        """
+        return []
+
+    def migrate(self) -> int:
+        """ Move the progress bars written by the clients of previous versions with an old layout to the active ones.
+          Only MongoDB has an old layout.
+        :return: The number of migrated progress bars.
+        """
+        return 0
+
+    def groups(self, stale_before: float = None, exclude: Sequence[str] = ()) -> List[dict]:
+        """ Aggregate the active progress bars by bar name, see group_bars().
+        :param stale_before: The progress bars whose heartbeat is older than this timestamp are stale. If None, no
+           progress bar is stale.
+        :param exclude: The ids of the progress bars which must not be aggregated.
+        :return: The partial groups, which can be merged with merge_groups().
+        """
+        excluded = set(exclude)
+        return group_bars([bar for bar in self.active() if bar['bar_id'] not in excluded], stale_before)
+
+    def changes(self) -> Iterator[Event]:
+        """ Watch the changes of the active progress bars. The first event is always a snapshot event, then, a bar event
+          with the progress bar each time that it is created or updated, and a remove event with the bar id each time
+          that it is removed. The iterator finishes if the database stops notifying the changes.
+        :return: An iterator of pairs with the event type and its data.
+        :raise ChangesNotAvailable: If the database is not able to notify the changes.
+        """
+        raise ChangesNotAvailable(f'{type(self).__name__} does not notify the progress bar changes.')
+
+
+class MeteredStore(BarStore):
+    """ Store which measures the time of the operations of other store. """
+
+    @property
+    def store(self) -> BarStore:
+        """
+        :return: The measured store.
+        """
+        return self._store
+
+    def __init__(self, store: BarStore) -> None:
+        """ Constructor.
+        :param store: The measured store.
+        """
+        self._store = store
+
+    def active(self) -> List[dict]:
+        """
+        :return: All the active progress bars.
+        """
+        with _timed('active'):
+            return self._store.active()
+
+    def last_stats(self, bar_id: str) -> Union[dict, None]:
+        """ Get the last finished execution of a progress bar.
+        :param bar_id: The bar id.
+        :return: The progress bar information or None if that progress bar has never finished.
+        """
+        with _timed('last_stats'):
+            return self._store.last_stats(bar_id)
+
+    def stats(self, bar_name: str = None, suffix: str = None, since: float = None, until: float = None,
+              after: StatsKey = None, limit: int = DEF_STATS_LIMIT, fields: Sequence[str] = None) -> List[dict]:
+        """ Get the finished executions of the progress bars.
+        :param bar_name: If it is given, only the executions with this bar name.
+        :param suffix: If it is given, only the executions with this suffix.
+        :param since: If it is given, only the executions started at this timestamp or later.
+        :param until: If it is given, only the executions started before this timestamp.
+        :param after: If it is given, only the executions after this key of start time, bar name and suffix.
+        :param limit: The maximum number of executions.
+        :param fields: If it is given, only these fields and the key ones.
+        :return: The finished executions.
+        """
+        with _timed('stats'):
+            return self._store.stats(bar_name, suffix, since, until, after, limit, fields)
+
+    def compact(self, before: float) -> int:
+        """ Compact the finished executions started before a timestamp into daily rollups.
+        :param before: The timestamp.
+        :return: The number of compacted executions.
+        """
+        with _timed('compact'):
+            return self._store.compact(before)
+
+    def rollups(self, bar_name: str = None, since: float = None, until: float = None,
+                limit: int = DEF_STATS_LIMIT) -> List[dict]:
+        """ Get the daily rollups of the compacted executions.
+        :param bar_name: If it is given, only the rollups of this bar name.
+        :param since: If it is given, only the rollups of the days which start at this timestamp or later.
+        :param until: If it is given, only the rollups of the days which start before this timestamp.
+        :param limit: The maximum number of rollups.
+        :return: The rollups.
+        """
+        with _timed('rollups'):
+            return self._store.rollups(bar_name, since, until, limit)
+
+    def history(self, bar_id: str) -> Union[dict, None]:
+        """ Get the history of the last execution of a progress bar.
+        :param bar_id: The bar id.
+        :return: A dict with the bar id, its start timestamp and the list of samples, or None if there is no history.
+        """
+        with _timed('history'):
+            return self._store.history(bar_id)
+
+    def remove(self, bar_id: str) -> bool:
+        """ Remove an active progress bar.
+        :param bar_id: The bar id.
+        :return: True if the progress bar has been removed, False if it does not exist.
+        """
+        with _timed('remove'):
+            return self._store.remove(bar_id)
+
+    def save(self, bars: List[dict]) -> None:
+        """ Create or replace several active progress bars.
+        :param bars: The progress bars.
+        """
+        with _timed('save'):
+            self._store.save(bars)
+
+    def finish(self, bar: dict) -> None:
+        """ Move a finished progress bar from the active progress bars to the finished ones.
+        :param bar: The finished progress bar.
+        """
+        with _timed('finish'):
+            self._store.finish(bar)
+
+    def reap(self, before: float) -> List[str]:
+        """ Archive as aborted the active progress bars whose last heartbeat is older than a timestamp.
+        :param before: The timestamp.
+        :return: The ids of the archived progress bars.
+        """
+        with _timed('reap'):
+            return self._store.reap(before)
+
+    def migrate(self) -> int:
+        """ Move the progress bars written with an old layout to the active ones.
+        :return: The number of migrated progress bars.
+        """
+        with _timed('migrate'):
+            return self._store.migrate()
+
+    def groups(self, stale_before: float = None, exclude: Sequence[str] = ()) -> List[dict]:
+        """ Aggregate the active progress bars by bar name.
+        :param stale_before: The progress bars whose heartbeat is older than this timestamp are stale.
+        :param exclude: The ids of the progress bars which must not be aggregated.
+        :return: The partial groups.
+        """
+        with _timed('groups'):
+            return self._store.groups(stale_before, exclude)
+
+    def changes(self) -> Iterator[Event]:
+        """ Watch the changes of the active progress bars of the measured store, without measuring them.
+        :return: An iterator of pairs with the event type and its data.
+        :raise ChangesNotAvailable: If the database is not able to notify the changes.
+        """
+        return self._store.changes()
+
+
+@contextmanager
+def _timed(operation: str) -> Iterator[None]:
+    """ Measure the time of a store operation. """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        store_seconds.observe(perf_counter() - start, operation)
+
+
+def stats_key(bar: dict) -> StatsKey:
+    """
+    :param bar: A finished execution of a progress bar.
+    :return: Its sort key, the start time, the bar name and the suffix.
+    """
+    return bar['start_time'], bar['bar_name'], bar['suffix']
+
+
+def encode_cursor(bar: dict) -> str:
+    """ Create the cursor to get the page after a finished execution.
+    :param bar: The last finished execution of a page.
+    :return: The cursor, an URL-safe string.
+    """
+    return pack_cursor(stats_key(bar))
+
+
+def decode_cursor(cursor: str) -> StatsKey:
+    """ Read the key of a cursor created by encode_cursor().
+    :param cursor: The cursor.
+    :return: The start time, the bar name and the suffix of the last execution of the previous page.
+    :raise ValueError: If the cursor is not valid.
+    """
+    key = unpack_cursor(cursor)
+    if len(key) != 3 or not isinstance(key[0], (int, float)) or not all(isinstance(value, str) for value in key[1:]):
+        raise ValueError(f'The cursor "{cursor}" is not valid.')
+    return key[0], key[1], key[2]
+
+
+def stats_params(args: Mapping[str, str]) -> dict:
+    """ Read the parameters of the stats API: "bar_name", "suffix", "since" and "until" as timestamps, "after" with the
+      cursor of the previous page, "limit" (100 by default and 1000 at most) and "fields" as a comma separated list.
+    :param args: The query string arguments.
+    :return: The keyword arguments of BarStore.stats().
+    :raise ValueError: If any parameter is not valid.
+    """
+    return {'bar_name': args.get('bar_name'), 'suffix': args.get('suffix'), 'since': _timestamp(args, 'since'),
+            'until': _timestamp(args, 'until'), 'after': decode_cursor(args['after']) if args.get('after') else None,
+            'limit': _limit(args),
+            'fields': [field for field in args['fields'].split(',') if field] if args.get('fields') else None}
+
+
+def rollup_params(args: Mapping[str, str]) -> dict:
+    """ Read the parameters of the rollups API: "bar_name", "since" and "until" as timestamps and "limit" (100 by
+      default and 1000 at most).
+    :param args: The query string arguments.
+    :return: The keyword arguments of BarStore.rollups().
+    :raise ValueError: If any parameter is not valid.
+    """
+    return {'bar_name': args.get('bar_name'), 'since': _timestamp(args, 'since'), 'until': _timestamp(args, 'until'),
+            'limit': _limit(args)}
+
+
+def _timestamp(args: Mapping[str, str], name: str) -> Union[float, None]:
+    """ Read a timestamp parameter. """
+    try:
+        return float(args[name]) if args.get(name) else None
+    except ValueError:
+        raise ValueError(f'The parameter "{name}" must be a timestamp, not "{args[name]}".')
+
+
+def _limit(args: Mapping[str, str]) -> int:
+    """ Read the parameter "limit". """
+    try:
+        return min(max(int(args['limit']), 1), MAX_STATS_LIMIT) if args.get('limit') else DEF_STATS_LIMIT
+    except ValueError:
+        raise ValueError(f'The parameter "limit" must be an integer, not "{args["limit"]}".')
+
+
+def stats_page(bars: List[dict], limit: int) -> dict:
+    """ Create a page of the stats API.
+    :param bars: The finished executions, at most one more than the limit to know if there is a next page.
+    :param limit: The page size.
+    :return: A dict with the "stats" of this page and the cursor of the "next" one, or None if it is the last page.
+    """
+    return {'stats': bars[:limit], 'next': encode_cursor(bars[limit - 1]) if len(bars) > limit else None}
+
+
+def project(bar: dict, fields: Union[Sequence[str], None]) -> dict:
+    """ Select some fields of a finished execution.
+    :param bar: The finished execution.
+    :param fields: The fields to select, besides the key ones. If None, all the fields are selected.
+    :return: The finished execution with only the selected fields.
+    """
+    if fields is None:
+        return bar
+    return {key: value for key, value in bar.items() if key in fields or key in STATS_KEY or key == 'bar_id'}
+
+
+def select_stats(bars: Iterable[dict], bar_name: str = None, suffix: str = None, since: float = None,
+                 until: float = None, after: StatsKey = None, limit: int = DEF_STATS_LIMIT,
+                 fields: Sequence[str] = None) -> List[dict]:
+    """ Implement BarStore.stats() in memory, for the stores which cannot query their finished executions.
+    :param bars: All the finished executions.
+    :param bar_name: If it is given, only the executions with this bar name.
+    :param suffix: If it is given, only the executions with this suffix.
+    :param since: If it is given, only the executions started at this timestamp or later.
+    :param until: If it is given, only the executions started before this timestamp.
+    :param after: If it is given, only the executions after this key of start time, bar name and suffix.
+    :param limit: The maximum number of executions.
+    :param fields: If it is given, only these fields and the key ones.
+    :return: The selected executions.
+    """
+    selected = [bar for bar in bars if (bar_name is None or bar['bar_name'] == bar_name) and
+                (suffix is None or bar['suffix'] == suffix) and (since is None or bar['start_time'] >= since) and
+                (until is None or bar['start_time'] < until) and (after is None or stats_key(bar) < after)]
+    selected.sort(key=stats_key, reverse=True)
+    return [project(bar, fields) for bar in selected[:limit]]
+
+
+def aborted_bar(bar: dict) -> dict:
+    """ Convert an active progress bar whose process has died into a finished execution which has not finished.
+    :param bar: The active progress bar, with its last heartbeat.
+    :return: The execution to store with the finished ones, which ends in the last heartbeat.
+    """
+    end = bar['heartbeat']
+    return dict(shared_meter(bar, end), start_time=bar['start'], end_time=end,
+                end_time_str=datetime.utcfromtimestamp(end), finished=False, aborted=True)
+
+
+def group_bars(bars: Iterable[dict], stale_before: float = None) -> List[dict]:
+    """ Aggregate the active progress bars by bar name, for example, the progress bars of the shards of a task, which
+      only differ in their suffix.
+    :param bars: The active progress bars.
+    :param stale_before: The progress bars whose heartbeat is older than this timestamp are stale. If None, no progress
+       bar is stale.
+    :return: The partial groups, with the bar_name, the number of "members", the number of "running", "finished" and
+       "stale" members, the sum of their positions "n", totals "total" and rates "rate" in iterations per second, the
+       number of members without total "no_total", the "remaining" seconds of the slowest member and the first "start".
+    """
+    groups: Dict[str, dict] = {}
+    for bar in bars:
+        bar = shared_meter(bar)
+        status, rate, total, n = bar_status(bar, stale_before), iteration_rate(bar), bar.get('total'), bar.get('n', 0)
+        remaining = (total - n) / rate if rate and total else None
+        merge_groups([{'bar_name': bar.get('bar_name', ''), 'members': 1, 'running': int(status == 'running'),
+                       'finished': int(status == 'finished'), 'stale': int(status == 'stale'), 'n': n,
+                       'total': total or 0, 'no_total': int(not total), 'rate': rate, 'remaining': remaining,
+                       'start': bar.get('start')}], groups)
+    return list(groups.values())
+
+
+def merge_groups(partials: Iterable[dict], groups: Dict[str, dict] = None) -> Dict[str, dict]:
+    """ Merge partial groups of the same bar names, for example, the ones of the database and the ones of the progress
+      bars received by the ingest API.
+    :param partials: The partial groups.
+    :param groups: The groups where the partial ones are merged, by bar name. By default, a new dict.
+    :return: The merged groups, by bar name.
+    """
+    groups = {} if groups is None else groups
+    for partial in partials:
+        group = groups.get(partial['bar_name'])
+        if group is None:
+            groups[partial['bar_name']] = dict(partial)
+            continue
+        for field in ('members', 'running', 'finished', 'stale', 'n', 'total', 'no_total', 'rate'):
+            group[field] += partial[field]
+        group['remaining'] = _optional(max, group['remaining'], partial['remaining'])
+        group['start'] = _optional(min, group['start'], partial['start'])
+    return groups
+
+
+def group_summary(group: dict) -> dict:
+    """ Complete a merged group with its "percentage" and "eta" timestamp of the slowest member. If any member has no
+      total, the total and the percentage of the group are unknown (None).
+    :param group: The group.
+    :return: The group to send to the clients.
+    """
+    total = group['total'] if not group['no_total'] else None
+    remaining = group['remaining']
+    summary = {field: value for field, value in group.items() if field != 'no_total'}
+    summary.update(total=total, percentage=100 * group['n'] / total if total else None,
+                   eta=time() + remaining if remaining is not None else None)
+    return summary
+
+
+def _optional(function: Callable[[float, float], float], a: Union[float, None], b: Union[float, None]
+              ) -> Union[float, None]:
+    """ Apply max() or min() to two values which can be None. """
+    return b if a is None else a if b is None else function(a, b)
+
+
+def retention_limit(days: float, now: float = None) -> float:
+    """ Calculate the timestamp before which the finished executions are compacted. It is the start of a UTC day, so
+      each compaction processes whole days.
+    :param days: The days while the finished executions are kept.
+    :param now: The current timestamp. By default, the current time.
+    :return: The timestamp.
+    """
+    return day_start((time() if now is None else now) - days * DAY)
+
+
+def day_start(timestamp: float) -> float:
+    """
+    :param timestamp: A timestamp.
+    :return: The timestamp of the start of its UTC day.
+    """
+    return timestamp - timestamp % DAY
+
+
+def daily_rollups(runs: Iterable[dict]) -> List[dict]:
+    """ Compact finished executions into rollups by bar name and UTC day of their start time.
+    :param runs: The finished executions, with at least the fields of RUN_FIELDS.
+    :return: The rollups.
+    """
+    groups: Dict[Tuple[str, float], List[dict]] = {}
+    for run in runs:
+        groups.setdefault((run['bar_name'], day_start(run['start_time'])), []).append(run)
+    return [rollup(bar_name, day, group) for (bar_name, day), group in groups.items()]
+
+
+def rollup(bar_name: str, day: float, runs: List[dict]) -> dict:
+    """ Compact the finished executions of a bar name in a day. The aborted executions are only counted, because
+      their durations and rates would distort the ones of the executions which have really finished.
+    :param bar_name: The bar name.
+    :param day: The timestamp of the start of the day.
+    :param runs: The finished executions.
+    :return: The rollup.
+    """
+    completed = [run for run in runs if not run.get('aborted')]
+    durations = sorted(run_duration(run) for run in completed)
+    rates = [rate for rate in (run_rate(run) for run in completed) if rate is not None]
+    return {'bar_name': bar_name, 'start_time': day, 'day': datetime.utcfromtimestamp(day).strftime('%Y-%m-%d'),
+            'count': len(durations), 'aborted': len(runs) - len(durations),
+            'mean_duration': sum(durations) / len(durations) if durations else None,
+            'p50_duration': percentile(durations, 50), 'p95_duration': percentile(durations, 95),
+            'mean_rate': sum(rates) / len(rates) if rates else None, 'rate_count': len(rates)}
+
+
+def merge_rollups(old: Union[dict, None], new: dict) -> dict:
+    """ Merge two rollups of the same bar name and day. The counts and means are exact, but the percentiles of both
+      rollups cannot be combined without the durations, so they are approximated with their weighted mean.
+    :param old: The stored rollup, or None if there is no one.
+    :param new: The new rollup.
+    :return: The merged rollup.
+    """
+    if old is None:
+        return new
+    count, rate_count = old['count'] + new['count'], old['rate_count'] + new['rate_count']
+    merged = dict(new, count=count, aborted=old.get('aborted', 0) + new['aborted'], rate_count=rate_count,
+                  mean_rate=None)
+    for field in ['mean_duration', 'p50_duration', 'p95_duration']:
+        merged[field] = ((old[field] or 0) * old['count'] + (new[field] or 0) * new['count']) / count if count else None
+    if rate_count:
+        merged['mean_rate'] = ((old['mean_rate'] or 0) * old['rate_count'] +
+                               (new['mean_rate'] or 0) * new['rate_count']) / rate_count
+    return merged
+
+
+def run_duration(run: dict) -> float:
+    """
+    :param run: A finished execution.
+    :return: Its duration in seconds.
+    """
+    return run['end_time'] - run['start_time'] if run.get('end_time') is not None else run.get('elapsed') or 0
+
+
+def run_rate(run: dict) -> Union[float, None]:
+    """
+    :param run: A finished execution.
+    :return: Its mean rate in iterations per second, or None if it has no duration.
+    """
+    elapsed = run.get('elapsed') or run_duration(run)
+    return ((run.get('n') or 0) - (run.get('initial') or 0)) / elapsed if elapsed > 0 else None
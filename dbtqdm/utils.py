@@ -1,4 +1,11 @@
-from typing import Tuple
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from binascii import Error as Base64Error
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from json import dumps, loads
+from math import ceil
+from time import time
+from typing import Tuple, Union, List, Sequence, Any
 
 
 def split_interval(t: float) -> Tuple[int, int, int, int, int]:
@@ -42,3 +49,214 @@ def format_interval(interval: float) -> str:
        and s are seconds
     """
     return interval2str(*split_interval(interval))
+
+
+def meter_stats(n: float, total: float, elapsed: float, unit: str = 'it', unit_scale: Union[bool, int, float] = False,
+                rate: float = None, unit_divisor: float = 1000, initial: float = 0) -> dict:
+    """ Calculate the statistics of a progress bar meter.
+    :param n: Number of finished iterations.
+    :param total: The expected total number of iterations. If meaningless (None), there is no ETA.
+    :param elapsed: Number of seconds passed since start.
+    :param unit: The iteration unit [default: 'it'].
+    :param unit_scale: If any other non-zero number than 1 or True, it will scale `total` and `n`.
+    :param rate: Manual override for iteration rate. If [default: None], uses n/elapsed.
+    :param unit_divisor: [default: 1000], ignored unless `unit_scale` is True.
+    :param initial: The initial counter value [default: 0].
+    :return: A dictionary with the position, total, units, rate, elapsed and remaining times, ETA and percentage.
+    """
+    # sanity check: total
+    total = None if total and n >= (total + 0.5) else total  # allow float imprecision (#849)
+
+    # apply custom scale if necessary
+    if unit_scale and unit_scale not in (True, 1):
+        total = total * unit_scale if total else total
+        n *= unit_scale
+        rate = rate * unit_scale if rate else rate  # by default rate = self.avg_dn / self.avg_dt
+
+    elapsed_str = format_interval(elapsed) if elapsed else '0s'
+
+    # if unspecified, attempt to use rate = average speed
+    # (we allow manual override since predicting time is an arcane art)
+    rate = (n - initial) / elapsed if rate is None and elapsed else rate
+    remaining = (total - n) / rate if rate and total else 0
+    rate, primary_unit, secondary_unit = (1 / rate, 's', unit) if rate and rate <= 1 else (rate, unit, 's')
+    remaining_str = format_interval(remaining) if rate else '?'
+    percentage = 100 * n / total if total else 0
+    try:
+        eta = datetime.now() + timedelta(seconds=remaining) if rate and total else datetime.utcfromtimestamp(0)
+    except OverflowError:
+        eta = datetime.max
+
+    return dict(
+        n=n, initial=initial, total=total, unit=unit, primary_unit=primary_unit, secondary_unit=secondary_unit,
+        unit_scale=unit_scale, unit_divisor=unit_divisor,
+        rate=rate, elapsed=elapsed, elapsed_str=elapsed_str, remaining=remaining, remaining_str=remaining_str,
+        eta=eta, percentage=percentage)
+
+
+def expand_bar(bar: dict) -> dict:
+    """ Complete a progress bar given only with its basic fields (bar_name, suffix, n, total, elapsed, rate, initial,
+      unit, unit_scale, unit_divisor, desc, colour, start and, if it is finished, end) with the rest of the fields
+      stored by the progress bars.
+    :param bar: The basic fields of the progress bar.
+    :return: The progress bar information.
+    """
+    start, finished = bar.get('start', 0), bool(bar.get('finished'))
+    stats = meter_stats(bar.get('n', 0), bar.get('total'), bar.get('elapsed', 0), bar.get('unit', 'it'),
+                        bar.get('unit_scale', False), bar.get('rate'), bar.get('unit_divisor', 1000),
+                        bar.get('initial', 0))
+    expanded = dict(stats, desc=bar.get('desc') or '', colour=bar.get('colour'), bar_name=bar.get('bar_name', ''),
+                    suffix=bar.get('suffix', ''), bar_id=bar.get('bar_name', '') + bar.get('suffix', ''), start=start,
+                    finished=finished, start_time_str=datetime.utcfromtimestamp(start))
+    if finished:
+        end = bar.get('end', start)
+        expanded.update(start_time=start, end_time=end, end_time_str=datetime.utcfromtimestamp(end))
+    return expanded
+
+
+def str2bool(value: Union[str, bool, None]) -> bool:
+    """ Convert a parameter or environment variable value into a boolean.
+    :param value: The value to convert. It can be a boolean or a string like "true", "yes", "1", "false", "no" or "0".
+    :return: True if the value represents a true value, otherwise False.
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+    return bool(value)
+
+
+def lttb(samples: List[Sequence[float]], points: int, x: int = 0, y: int = 1) -> List[Sequence[float]]:
+    """ Downsample a time series with the Largest-Triangle-Three-Buckets algorithm, which keeps the visual shape of
+      the series selecting, for each bucket, the sample which forms the largest triangle with its neighbours.
+    :param samples: The samples sorted by the x value. Each sample is a sequence of numbers.
+    :param points: The maximum number of samples to return.
+    :param x: The position of the x value in each sample.
+    :param y: The position of the y value in each sample.
+    :return: The selected samples. The first and the last samples are always selected.
+    """
+    if points >= len(samples):
+        return samples
+    if points < 3:
+        return [samples[0], samples[-1]][:max(points, 0)]
+    selected, every, a = [samples[0]], (len(samples) - 2) / (points - 2), 0
+    for i in range(points - 2):
+        start, end = int((i + 1) * every) + 1, min(int((i + 2) * every) + 1, len(samples))
+        avg_x = sum(sample[x] for sample in samples[start:end]) / (end - start)
+        avg_y = sum(sample[y] for sample in samples[start:end]) / (end - start)
+        a_x, a_y = samples[a][x], samples[a][y]
+        max_area, max_index = -1, start
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((a_x - avg_x) * (samples[j][y] - a_y) - (a_x - samples[j][x]) * (avg_y - a_y))
+            if area > max_area:
+                max_area, max_index = area, j
+        selected.append(samples[max_index])
+        a = max_index
+    selected.append(samples[-1])
+    return selected
+
+
+def percentile(values: Sequence[float], p: float) -> Union[float, None]:
+    """ Calculate a percentile with the nearest-rank method.
+    :param values: The values, sorted in increasing order.
+    :param p: The percentile, between 0 and 100.
+    :return: The smallest value which is greater or equal than the p percent of the values, or None if there are no
+       values.
+    """
+    if not values:
+        return None
+    return values[min(max(ceil(p / 100 * len(values)) - 1, 0), len(values) - 1)]
+
+
+def shared_meter(bar: dict, now: float = None) -> dict:
+    """ Derive the aggregated position, rate, elapsed time, remaining time, percentage and ETA of a progress bar shared
+      by several processes, from the position and the rate of each shard.
+    :param bar: The progress bar information. If it is not a shared progress bar, it is returned without changes.
+    :param now: The current timestamp. If None, the current time is used.
+    :return: The progress bar information with the derived fields.
+    """
+    if not bar.get('shared'):
+        return bar
+    now = time() if now is None else now
+    shards = bar.get('shards', {}).values()
+    rate = sum(shard.get('rate') or 0 for shard in shards if not shard.get('closed'))
+    n = sum(shard.get('n') or 0 for shard in shards) if shards else bar.get('n', 0)
+    total, unit = bar.get('total'), bar.get('unit', 'it')
+    elapsed = max(now - bar['start'], 0) if 'start' in bar else 0
+    remaining = (total - n) / rate if rate and total else 0
+    try:
+        eta = datetime.now() + timedelta(seconds=remaining) if rate and total else datetime.utcfromtimestamp(0)
+    except OverflowError:
+        eta = datetime.max
+    rate, primary_unit, secondary_unit = (1 / rate, 's', unit) if rate and rate <= 1 else (rate, unit, 's')
+    return dict(bar, n=n, rate=rate, primary_unit=primary_unit, secondary_unit=secondary_unit, elapsed=elapsed,
+                elapsed_str=format_interval(elapsed) if elapsed else '0s', remaining=remaining,
+                remaining_str=format_interval(remaining) if rate else '?', eta=eta,
+                percentage=100 * n / total if total else 0)
+
+
+def iteration_rate(bar: dict) -> float:
+    """ Get the rate of a progress bar in iterations per second, even if it is stored as seconds per iteration.
+    :param bar: The progress bar information.
+    :return: The iterations per second or 0 if it is unknown.
+    """
+    rate = bar.get('rate') or 0
+    return 1 / rate if rate and bar.get('primary_unit') == 's' else rate
+
+
+def bar_status(bar: dict, stale_before: float = None, heartbeat: float = None) -> str:
+    """ Get the status of an active progress bar.
+    :param bar: The progress bar information.
+    :param stale_before: The progress bars whose heartbeat is older than this timestamp are stale. If None, no progress
+       bar is stale.
+    :param heartbeat: The last heartbeat of the progress bar, if it is kept apart. By default, the one of the progress
+       bar information.
+    :return: "stale" if its heartbeat is older than stale_before, "finished" if it has done all its iterations but it
+       has not been closed yet, or "running".
+    """
+    heartbeat = bar.get('heartbeat') if heartbeat is None else heartbeat
+    if stale_before is not None and heartbeat is not None and heartbeat < stale_before:
+        return 'stale'
+    if bar.get('finished') or bar.get('total') and bar.get('n', 0) >= bar['total']:
+        return 'finished'
+    return 'running'
+
+
+def without_heartbeat(bar: dict) -> dict:
+    """ Remove the heartbeat of a progress bar, which is written periodically even if the progress bar has not changed,
+      so it must not be compared nor sent to the clients as a change.
+    :param bar: The progress bar information.
+    :return: The same progress bar if it has no heartbeat, otherwise, a copy without it.
+    """
+    return {field: value for field, value in bar.items() if field != 'heartbeat'} if 'heartbeat' in bar else bar
+
+
+def json_default(obj: Any) -> str:
+    """ Serialize the dates with the same format than the Flask server, as HTTP dates in UTC.
+    :param obj: The object to serialize.
+    :return: The serialized object.
+    """
+    if isinstance(obj, datetime):
+        return format_datetime(obj.replace(tzinfo=timezone.utc), usegmt=True)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def pack_cursor(key: Sequence[Any]) -> str:
+    """ Encode the key of the last element of a page as an opaque cursor to get the next page.
+    :param key: The key values, which must be serializable to JSON.
+    :return: The cursor, an URL-safe string.
+    """
+    return urlsafe_b64encode(dumps(list(key)).encode('utf-8')).decode('ascii')
+
+
+def unpack_cursor(cursor: str) -> list:
+    """ Decode a cursor created by pack_cursor().
+    :param cursor: The cursor.
+    :return: The key values.
+    :raise ValueError: If the cursor is not valid.
+    """
+    try:
+        key = loads(urlsafe_b64decode(cursor.encode('ascii')))
+    except (Base64Error, UnicodeError, TypeError, ValueError) as e:
+        raise ValueError(f'The cursor "{cursor}" is not valid.') from e
+    if not isinstance(key, list):
+        raise ValueError(f'The cursor "{cursor}" is not valid.')
+    return key
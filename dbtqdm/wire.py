@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from gzip import compress as gzip_compress
+from importlib.util import find_spec
+from json import dumps
+from threading import Lock
+from typing import Dict, List, Tuple, Union, Sequence, Mapping
+
+from dbtqdm.consts import JSON_TYPE, COLUMNAR_TYPE, MSGPACK_TYPE, MIN_COMPRESS_SIZE
+from dbtqdm.utils import json_default, iteration_rate
+
+COMPACT_FIELDS = ('bar_id', 'bar_name', 'suffix', 'desc', 'colour', 'unit', 'n', 'initial', 'total', 'rate', 'elapsed',
+                  'start', 'status')
+WIRE_TAGS = {COLUMNAR_TYPE: 'columnar', MSGPACK_TYPE: 'msgpack'}
+COMPRESSIBLE_TYPES = {JSON_TYPE, COLUMNAR_TYPE, MSGPACK_TYPE, 'text/html', 'text/css', 'application/javascript',
+                      'text/javascript', 'text/plain'}
+
+
+def media_types() -> List[str]:
+    """
+    :return: The media types which can be sent by the API of the active progress bars, in order of preference when the
+       client accepts any of them. MessagePack is only available if the module msgpack is installed.
+    """
+    return [JSON_TYPE, COLUMNAR_TYPE] + ([MSGPACK_TYPE] if find_spec('msgpack') else [])
+
+
+def encodings() -> List[str]:
+    """
+    :return: The content encodings which can be used to compress the responses, in order of preference. Brotli is only
+       available if the module brotli is installed.
+    """
+    return (['br'] if find_spec('brotli') else []) + ['gzip']
+
+
+def compact_bars(bars: Sequence[dict]) -> Dict[str, list]:
+    """ Convert a list of progress bars into columns with their raw values only. The formatted fields, like elapsed_str
+      or eta, are not sent and the rate is always in iterations per second, so the client formats them.
+    :param bars: The progress bars.
+    :return: A dict with a list of values for each field of COMPACT_FIELDS.
+    """
+    columns: Dict[str, list] = {field: [] for field in COMPACT_FIELDS}
+    for bar in bars:
+        rate = iteration_rate(bar)
+        for field in COMPACT_FIELDS:
+            columns[field].append(rate if field == 'rate' else bar.get(field))
+    return columns
+
+
+def encode(data: dict, media_type: str) -> bytes:
+    """ Serialize the data of the API of the active progress bars.
+    :param data: The response data, with the list of progress bars in "bars".
+    :param media_type: The media type: JSON_TYPE, COLUMNAR_TYPE or MSGPACK_TYPE. The last two ones send the progress
+       bars in columns with compact_bars().
+    :return: The serialized data.
+    """
+    if media_type == JSON_TYPE:
+        return dumps(data, default=json_default).encode('utf-8')
+    data = dict(data, bars=compact_bars(data['bars']))
+    if media_type == MSGPACK_TYPE:
+        from msgpack import packb
+        return packb(data, use_bin_type=True)
+    return dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def representation_etag(etag: str, media_type: str) -> str:
+    """ Create the ETag of a representation of the data, because each media type has a different body.
+    :param etag: The ETag of the data.
+    :param media_type: The media type.
+    :return: The same ETag for JSON_TYPE, otherwise, the ETag with a suffix for that media type.
+    """
+    return etag if media_type == JSON_TYPE else f'{etag}-{WIRE_TAGS[media_type]}'
+
+
+def choose_media_type(accept: str) -> str:
+    """ Choose the media type of a response of the API of the active progress bars.
+    :param accept: The Accept header of the request.
+    :return: The available media type with the highest quality for the client, JSON_TYPE if there are several ones with
+       the same quality or the client does not accept any of them.
+    """
+    qualities = _qualities(accept)
+    best, best_quality = JSON_TYPE, 0.0
+    for media_type in media_types():
+        quality = qualities.get(media_type, qualities.get(media_type.split('/')[0] + '/*', qualities.get('*/*', 0)))
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def choose_encoding(accept_encoding: str) -> Union[str, None]:
+    """ Choose the content encoding of a response.
+    :param accept_encoding: The Accept-Encoding header of the request.
+    :return: The best encoding accepted by the client, or None if it does not accept any of them.
+    """
+    qualities = _qualities(accept_encoding)
+    for encoding in encodings():
+        if qualities.get(encoding, qualities.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def etag_matches(etag: str, if_none_match: Union[str, None]) -> bool:
+    """ Check if an If-None-Match header contains an ETag.
+    :param etag: The ETag, without quotes.
+    :param if_none_match: The If-None-Match header of the request.
+    :return: True if the header contains the ETag, weak or strong, or "*".
+    """
+    tags = [tag.strip() for tag in (if_none_match or '').split(',')]
+    return '*' in tags or any((tag[2:] if tag.startswith('W/') else tag) == f'"{etag}"' for tag in tags)
+
+
+def response_encoding(content_type: str, size: int, accept_encoding: str) -> Union[str, None]:
+    """ Choose the content encoding to compress a response which is not compressed yet.
+    :param content_type: The content type of the response.
+    :param size: The body size in bytes.
+    :param accept_encoding: The Accept-Encoding header of the request.
+    :return: The content encoding or None if the response must not be compressed.
+    """
+    return choose_encoding(accept_encoding) if compressible(content_type, size) else None
+
+
+def _qualities(header: str) -> Dict[str, float]:
+    """ Read the quality of each value of an Accept or Accept-Encoding header. The invalid ones are ignored. """
+    qualities = {}
+    for item in (header or '').split(','):
+        value, *params = [part.strip() for part in item.split(';')]
+        quality = next((param[2:] for param in params if param.startswith('q=')), '1')
+        try:
+            qualities[value.lower()] = float(quality)
+        except ValueError:
+            continue
+    return qualities
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """ Compress the body of a response.
+    :param body: The body.
+    :param encoding: The content encoding returned by choose_encoding().
+    :return: The compressed body.
+    """
+    if encoding == 'br':
+        from brotli import compress as brotli_compress
+        return brotli_compress(body, quality=5)
+    return gzip_compress(body, compresslevel=5)
+
+
+def compressible(content_type: str, size: int) -> bool:
+    """ Check if it is worth to compress a response.
+    :param content_type: The content type of the response, with or without parameters.
+    :param size: The body size in bytes.
+    :return: True if the content type is compressible and the body is not too small.
+    """
+    return size >= MIN_COMPRESS_SIZE and (content_type or '').split(';')[0].strip() in COMPRESSIBLE_TYPES
+
+
+class BodyCache(object):
+    """ The last serialized and compressed bodies of the API responses, by request, ETag, media type and encoding.
+      All the clients which poll the same version of the board receive the same body, so it is only serialized and
+      compressed once.
+    """
+
+    def __init__(self, size: int = 64) -> None:
+        """ Constructor.
+        :param size: The maximum number of bodies.
+        """
+        self._size = size
+        self._bodies: 'OrderedDict[Tuple, Tuple[bytes, Union[str, None]]]' = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Tuple, data: dict, media_type: str, encoding: Union[str, None]
+            ) -> Tuple[bytes, Union[str, None]]:
+        """ Get a body, serializing and compressing the data if it is not cached.
+        :param key: The key which identifies the data, for example, the query string and the ETag.
+        :param data: The data.
+        :param media_type: The media type.
+        :param encoding: The content encoding or None to not compress it.
+        :return: A tuple with the body and its content encoding, or None if it is not compressed because it is too
+           small.
+        """
+        key = key + (media_type, encoding)
+        with self._lock:
+            if key in self._bodies:
+                self._bodies.move_to_end(key)
+                return self._bodies[key]
+        body = encode(data, media_type)
+        encoding = encoding if encoding and len(body) >= MIN_COMPRESS_SIZE else None
+        value = (compress(body, encoding) if encoding else body, encoding)
+        with self._lock:
+            self._bodies[key] = value
+            while len(self._bodies) > self._size:
+                self._bodies.popitem(last=False)
+        return value
+
+
+def bars_representation(bodies: BodyCache, key: Tuple, data: dict, etag: str, headers: Mapping[str, str]
+                        ) -> Tuple[int, bytes, Dict[str, str]]:
+    """ Create the response of the API of the active progress bars in the media type chosen by the Accept header:
+      JSON, columnar JSON or MessagePack. The body is compressed with the best encoding accepted by the client and
+      cached, so it is only serialized and compressed once for all the clients. If the If-None-Match header contains
+      the ETag of the representation, then the response is empty with the status 304 and the data is not serialized.
+    :param bodies: The cache of bodies.
+    :param key: The key which identifies the data in the cache, for example, the query string.
+    :param data: The data to send.
+    :param etag: The data version.
+    :param headers: The request headers.
+    :return: A tuple with the status, the body and the response headers.
+    """
+    media_type = choose_media_type(headers.get('Accept'))
+    etag = representation_etag(etag, media_type)
+    response_headers = {'ETag': f'"{etag}"', 'Vary': 'Accept, Accept-Encoding'}
+    if etag_matches(etag, headers.get('If-None-Match')):
+        return 304, b'', response_headers
+    body, encoding = bodies.get(key + (etag,), data, media_type, choose_encoding(headers.get('Accept-Encoding')))
+    response_headers['Content-Type'] = media_type
+    if encoding:
+        response_headers['Content-Encoding'] = encoding
+    return 200, body, response_headers
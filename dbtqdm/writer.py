@@ -0,0 +1,149 @@
+import atexit
+from collections import defaultdict
+from logging import getLogger
+from os import getpid, environ
+from threading import Thread, Condition, Lock
+from time import sleep
+from typing import Callable, Any, Dict, Hashable, Set, Union, Tuple, List
+
+from dbtqdm.consts import DEF_BATCH_WINDOW
+from dbtqdm.metrics import coalesced_updates, background_writes, write_failures
+
+logger = getLogger(__name__)
+
+Operation = Union[Any, Callable[[], Any]]
+
+
+class BackgroundWriter(Thread):
+    """ Daemon thread which executes the database writes of the progress bars out of the iteration thread.
+      Only the latest pending write of each progress bar is kept, therefore, the newest state always wins.
+      The pending writes of all the progress bars of the process are gathered during a short window and sent
+      as a single unordered bulk write for each target collection.
+    """
+
+    @property
+    def pid(self) -> int:
+        """
+        :return: The process id where this writer was created.
+        """
+        return self._pid
+
+    def __init__(self, window: float = DEF_BATCH_WINDOW) -> None:
+        """ Constructor.
+        :param window: The seconds to gather pending writes before sending them.
+        """
+        super(BackgroundWriter, self).__init__(name='dbtqdm-writer', daemon=True)
+        self._pid, self.window = getpid(), window
+        self._pending: Dict[Hashable, Tuple[Any, Operation]] = {}
+        self._busy: Set[Hashable] = set()
+        self._condition = Condition()
+
+    def submit(self, key: Hashable, target: Any, operation: Operation) -> None:
+        """ Schedule a write. If there is a previous pending write with the same key, it is replaced.
+        :param key: The key which identifies the progress bar.
+        :param target: The object where the write is sent. It must have the method bulk_write(operations, ordered),
+           like pymongo collections.
+        :param operation: The write operation or a function without arguments which returns it when the write is sent.
+           If that function returns None, nothing is written.
+        """
+        with self._condition:
+            if key in self._pending:
+                coalesced_updates.inc()
+            self._pending[key] = (target, operation)
+            self._condition.notify_all()
+
+    def discard(self, key: Hashable, timeout: float = None) -> bool:
+        """ Remove the pending write of a progress bar and wait until its running write, if any, has finished.
+        :param key: The key which identifies the progress bar.
+        :param timeout: The maximum number of seconds to wait. If None, wait without limit.
+        :return: True if there are no pending or running writes for that key, otherwise False.
+        """
+        with self._condition:
+            self._pending.pop(key, None)
+            return self._condition.wait_for(lambda: key not in self._busy, timeout)
+
+    def flush(self, key: Hashable = None, timeout: float = None) -> bool:
+        """ Wait until the pending writes have been executed.
+        :param key: The key which identifies the progress bar. If None, wait for all the progress bars.
+        :param timeout: The maximum number of seconds to wait. If None, wait without limit.
+        :return: True if there are no pending or running writes for that key, otherwise False.
+        """
+        with self._condition:
+            if key is None:
+                return self._condition.wait_for(lambda: not self._pending and not self._busy, timeout)
+            return self._condition.wait_for(lambda: key not in self._pending and key not in self._busy, timeout)
+
+    def run(self) -> None:
+        """ Execute the pending writes while the process is alive. """
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+            sleep(self.window)
+            with self._condition:
+                pending, self._pending = self._pending, {}
+                self._busy = set(pending)
+            for target, operations in self._group(pending.values()):
+                try:
+                    target.bulk_write(operations, ordered=False)
+                    background_writes.inc(amount=len(operations))
+                except Exception as e:
+                    write_failures.inc('background')
+                    logger.warning(f'The progress bar changes could not be saved: {e}')
+            with self._condition:
+                self._busy = set()
+                self._condition.notify_all()
+
+    @staticmethod
+    def _group(writes: Any) -> List[Tuple[Any, List[Any]]]:
+        """ Group the write operations by target.
+        :param writes: The pairs of target and operation.
+        :return: A list of pairs with a target and its list of operations.
+        """
+        targets, groups = {}, defaultdict(list)
+        for target, operation in writes:
+            try:
+                operation = operation() if callable(operation) else operation
+            except Exception as e:
+                logger.warning(f'The progress bar changes could not be prepared: {e}')
+                continue
+            if operation is not None:
+                key = _target_key(target)
+                targets[key] = target
+                groups[key].append(operation)
+        return [(targets[key], operations) for key, operations in groups.items()]
+
+
+def _target_key(target: Any) -> Hashable:
+    """ Identify a write target. Different instances of the same collection of the same client are the same target.
+    :param target: The write target.
+    :return: The target identifier.
+    """
+    database = getattr(target, 'database', None)
+    if database is not None and hasattr(target, 'full_name'):
+        return id(database.client), target.full_name
+    return id(target)
+
+
+_writer: Union[BackgroundWriter, None] = None
+_writer_lock = Lock()
+
+
+def get_writer() -> BackgroundWriter:
+    """ Get the background writer of this process, creating and starting it if it does not exist yet.
+      If the process has been forked, a new writer is created for the child process.
+      The batch window can be configured with the environment variable TQDM_BATCH_WINDOW.
+    :return: The background writer.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.pid != getpid():
+            _writer = BackgroundWriter(float(environ.get('TQDM_BATCH_WINDOW', DEF_BATCH_WINDOW)))
+            _writer.start()
+        return _writer
+
+
+@atexit.register
+def _drain() -> None:
+    """ Save the pending changes before the process exits. """
+    if _writer is not None and _writer.pid == getpid():
+        _writer.flush(timeout=10)
@@ -64,9 +64,13 @@ setuptools.setup(
     install_requires=[
         "tqdm==4.60.0"
     ],
+    extras_require={
+        'wire': ['msgpack', 'brotli']
+    },
     entry_points={
         'console_scripts': [
-            'dbtqdm=dbtqdm.server:main'
+            'dbtqdm=dbtqdm.server:main',
+            'dbtqdm-agent=dbtqdm.agent.daemon:main'
         ]
     }
 )